@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks for fintec. Run the modules from the repository root with `python -m benchmarks.<module>`. """
@@ -0,0 +1,50 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Time `import fintec` in a fresh interpreter, with the visualization and networking dependencies loaded
+lazily as they are now and loaded eagerly as they were before.
+
+Run from the repository root:
+```
+python -m benchmarks.bench_import [repeat]
+```
+"""
+import os
+import subprocess
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_CODE = '''
+import resource, sys, time
+t0 = time.perf_counter()
+{imports}
+seconds = time.perf_counter() - t0
+print(seconds, len(sys.modules), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+_CASES = (('import fintec', 'import fintec'),
+          ('eager dependencies', 'import fintec, plotly.graph_objs, plotly.offline, ipywidgets, IPython.display, '
+                                 'requests'))
+
+
+def measure(imports: str) -> (float, int, int):
+    """
+    Import in a new interpreter.
+    :param imports: the import statement
+    :return: seconds, number of loaded modules and max resident memory in KiB
+    """
+    env = dict(os.environ, PYTHONPATH=_ROOT)
+    out = subprocess.run([sys.executable, '-c', _CODE.format(imports=imports)], env=env, capture_output=True,
+                         text=True, check=True).stdout.split()
+    return float(out[0]), int(out[1]), int(out[2])
+
+
+def main(repeat: int = 5) -> None:
+    print('best of {}'.format(repeat))
+    print('{:<20} {:>10} {:>8} {:>10}'.format('case', 'seconds', 'modules', 'max rss'))
+    for name, imports in _CASES:
+        seconds, modules, rss = min(measure(imports) for _ in range(repeat))
+        print('{:<20} {:>8.3f} s {:>8} {:>7} MiB'.format(name, seconds, modules, rss // 1024))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
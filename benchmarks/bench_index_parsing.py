@@ -0,0 +1,78 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Compare per-cell converters with vectorized parsing of investing.com 'Vol.' and 'Change %' columns.
+
+Run from the repository root:
+```
+python -m benchmarks.bench_index_parsing [rows]
+```
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from fintec import data
+
+
+def write_synthetic_index(filename: str, rows: int = 1000000) -> None:
+    """
+    Write a synthetic investing.com index history with rows rows.
+    :param filename: file to write
+    :param rows: number of rows
+    :return: None
+    """
+    rng = np.random.default_rng(42)
+    price = 500 + rng.standard_normal(rows).cumsum()
+    volume = rng.uniform(1, 999, rows).round(2).astype(str)
+    suffix = rng.choice(['K', 'M', 'B', ''], rows)
+    volume = np.where(rng.uniform(size=rows) < 0.01, '-', np.char.add(volume, suffix))
+    change = np.char.add((rng.standard_normal(rows)).round(2).astype(str), '%')
+    pd.DataFrame({'Date': pd.date_range('1990-01-01', periods=rows, freq='min'),
+                  'Price': price.round(2), 'Open': price.round(2), 'High': price.round(2), 'Low': price.round(2),
+                  'Vol.': volume, 'Change %': change}).to_csv(filename, index=False)
+
+
+def read_with_converters(filename: str) -> pd.DataFrame:
+    converters = {'Vol.': data.__convert_volume__, 'Change %': data.__convert_change__}
+    return pd.read_csv(filename, index_col=0, converters=converters)
+
+
+def read_vectorized(filename: str) -> pd.DataFrame:
+    df = pd.read_csv(filename, index_col=0)
+    df['Vol.'] = data._parse_volume(df['Vol.'])
+    df['Change %'] = data._parse_change(df['Change %'])
+    return df
+
+
+def parse_with_converters(df: pd.DataFrame) -> pd.DataFrame:
+    return df.assign(**{'Vol.': df['Vol.'].map(data.__convert_volume__),
+                        'Change %': df['Change %'].map(data.__convert_change__)})
+
+
+def parse_vectorized(df: pd.DataFrame) -> pd.DataFrame:
+    return df.assign(**{'Vol.': data._parse_volume(df['Vol.']), 'Change %': data._parse_change(df['Change %'])})
+
+
+def _best(func, arg, repeat: int) -> float:
+    return min(timeit.repeat(lambda: func(arg), number=1, repeat=repeat))
+
+
+def main(rows: int = 1000000, repeat: int = 3) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'index.csv')
+        write_synthetic_index(filename, rows)
+        pd.testing.assert_frame_equal(read_with_converters(filename), read_vectorized(filename))
+        raw = pd.read_csv(filename, index_col=0)
+        print('rows={:,}, best of {}'.format(rows, repeat))
+        for func, arg in ((read_with_converters, filename), (read_vectorized, filename),
+                          (parse_with_converters, raw), (parse_vectorized, raw)):
+            print('{:<24} {:8.3f} s'.format(func.__name__, _best(func, arg, repeat)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,60 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Compare merging N date-indexed series one by one with `pd.merge` to `merge_frames`.
+
+Run from the repository root:
+```
+python -m benchmarks.bench_merge [years]
+```
+"""
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from fintec import merge_frames
+
+
+def synthetic_series(n: int, years: int = 10, seed: int = 42) -> [pd.DataFrame]:
+    """
+    n single column frames of business day prices over years years. Every series starts at a random
+    date and misses 2% of its days, so the indexes differ.
+    :param n: number of series
+    :param years: number of years
+    :param seed: random seed
+    :return: list of DataFrames
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2000-01-03', periods=years * 261, name='Date')
+    frames = []
+    for i in range(n):
+        start = rng.integers(0, len(dates) // 4)
+        keep = rng.uniform(size=len(dates) - start) > 0.02
+        prices = 100 + rng.standard_normal(len(dates) - start).cumsum()
+        frames.append(pd.DataFrame({'s{}'.format(i): prices[keep]}, index=dates[start:][keep]))
+    return frames
+
+
+def merge_loop(frames: [pd.DataFrame]) -> pd.DataFrame:
+    dfm = frames[0]
+    for df in frames[1:]:
+        dfm = pd.merge(dfm, df, how='outer', left_index=True, right_index=True)
+    return dfm
+
+
+def main(years: int = 10, sizes=(10, 30, 100, 300, 1000)) -> None:
+    print('years={}'.format(years))
+    print('{:>6} {:>12} {:>14} {:>8}'.format('N', 'merge loop', 'merge_frames', 'speedup'))
+    for n in sizes:
+        frames = synthetic_series(n, years)
+        pd.testing.assert_frame_equal(merge_loop(frames), merge_frames(frames))
+        repeat = 3 if n <= 300 else 1
+        t_loop = min(timeit.repeat(lambda: merge_loop(frames), number=1, repeat=repeat))
+        t_bulk = min(timeit.repeat(lambda: merge_frames(frames), number=1, repeat=repeat))
+        print('{:>6} {:>10.3f} s {:>12.3f} s {:>7.1f}x'.format(n, t_loop, t_bulk, t_loop / t_bulk))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
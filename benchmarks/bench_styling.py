@@ -0,0 +1,62 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Compare the per-cell `currency` and `percentage` stylers with their vectorized versions.
+
+Run from the repository root:
+```
+python -m benchmarks.bench_styling [rows]
+```
+"""
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from fintec import currency, percentage
+
+
+def synthetic_frame(rows: int = 5000, columns: int = 10, seed: int = 42) -> pd.DataFrame:
+    """
+    Daily changes of columns series over rows days, 5% missing.
+    :param rows: number of rows
+    :param columns: number of columns
+    :param seed: random seed
+    :return: DataFrame with date index
+    """
+    rng = np.random.default_rng(seed)
+    values = rng.standard_normal((rows, columns)) * 1000
+    values[rng.uniform(size=values.shape) < 0.05] = np.nan
+    return pd.DataFrame(values, index=pd.date_range('2000-01-01', periods=rows, name='Date'),
+                        columns=['s{}'.format(i) for i in range(columns)])
+
+
+def _style(styler, df: pd.DataFrame, vectorized: bool):
+    dfs = styler(df, 2, vectorized=vectorized)
+    dfs._compute()
+    return dfs
+
+
+def _render(styler, df: pd.DataFrame, vectorized: bool) -> str:
+    return styler(df, 2, vectorized=vectorized).render()
+
+
+def _best(func, repeat: int) -> float:
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main(rows: int = 5000, repeat: int = 3) -> None:
+    df = synthetic_frame(rows)
+    print('rows={:,}, columns={}, best of {}'.format(rows, df.shape[1], repeat))
+    print('{:<12} {:<8} {:>10} {:>10} {:>8}'.format('styler', 'stage', 'per cell', 'vectorized', 'speedup'))
+    for styler in (currency, percentage):
+        for stage in (_style, _render):
+            t_cell = _best(lambda: stage(styler, df, False), repeat)
+            t_vec = _best(lambda: stage(styler, df, True), repeat)
+            print('{:<12} {:<8} {:>8.3f} s {:>8.3f} s {:>7.1f}x'
+                  .format(styler.__name__, stage.__name__[1:], t_cell, t_vec, t_cell / t_vec))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,103 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Run the benchmark suite in benchmarks/test_scaling.py and compare it with a stored baseline.
+
+Needs pytest-benchmark and openpyxl. Run from the repository root:
+```
+python -m benchmarks.compare --save                  # run and store the result as baseline
+python -m benchmarks.compare                         # run and compare with the baseline
+python -m benchmarks.compare --years 30 --instruments 100 --baseline large
+```
+Baselines are kept per machine in benchmarks/baselines/<name>.json. Only compare a run with a baseline of
+the same machine and scale.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+BASELINES = os.path.join(BENCHMARKS, 'baselines')
+
+
+def run(json_file: str, years: int = 10, instruments: int = 20, extra=()) -> int:
+    """
+    Run the suite and write the results of pytest-benchmark to json_file.
+    :param json_file: file for the results
+    :param years: years of synthetic data
+    :param instruments: number of synthetic instruments
+    :param extra: extra pytest arguments
+    :return: pytest exit code
+    """
+    return pytest.main([BENCHMARKS, '-q', '-p', 'no:cacheprovider', '--benchmark-json', json_file,
+                        '--years', str(years), '--instruments', str(instruments), *extra])
+
+
+def load(json_file: str) -> (pd.DataFrame, dict):
+    """
+    Load the results of a run.
+    :param json_file: file with the results of pytest-benchmark
+    :return: DataFrame with a row per benchmark and the statistics in seconds, and the scale of the run
+    """
+    with open(json_file, 'r', encoding='utf-8') as f:
+        results = json.load(f)
+    df = pd.DataFrame({b['name']: b['stats'] for b in results['benchmarks']}).T
+    df.index.name = 'benchmark'
+    return df[['min', 'median', 'mean', 'stddev', 'rounds']], results.get('fintec', {})
+
+
+def report(baseline: pd.DataFrame, current: pd.DataFrame, threshold: float = 1.2) -> pd.DataFrame:
+    """
+    Compare the median times of current with baseline.
+    :param baseline: statistics of the baseline, see `load`
+    :param current: statistics of the current run
+    :param threshold: ratio of current to baseline above which a benchmark is 'slower', below 1 / threshold 'faster'
+    :return: DataFrame with columns 'baseline', 'current', 'ratio' and 'status'
+    """
+    df = pd.DataFrame({'baseline': baseline['median'], 'current': current['median']})
+    df['ratio'] = df.current / df.baseline
+    df['status'] = np.select([df.baseline.isna(), df.current.isna(), df.ratio > threshold, df.ratio < 1 / threshold],
+                             ['new', 'missing', 'slower', 'faster'], 'same')
+    return df.sort_values('ratio', ascending=False)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--save', action='store_true', help='store the run as baseline')
+    parser.add_argument('--baseline', default='baseline', help='name of the baseline, default baseline')
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--instruments', type=int, default=20)
+    parser.add_argument('--threshold', type=float, default=1.2, help='slower above this ratio, default 1.2')
+    args = parser.parse_args(argv)
+    baseline_file = os.path.join(BASELINES, '{}.json'.format(args.baseline))
+    with tempfile.TemporaryDirectory() as tmp:
+        json_file = os.path.join(tmp, 'current.json')
+        exit_code = run(json_file, args.years, args.instruments)
+        if exit_code != 0:
+            return exit_code
+        if args.save:
+            os.makedirs(BASELINES, exist_ok=True)
+            os.replace(json_file, baseline_file)
+            print('Saved baseline {}'.format(baseline_file))
+            return 0
+        current, scale = load(json_file)
+    if not os.path.exists(baseline_file):
+        print('No baseline {}, run with --save first'.format(baseline_file))
+        return 2
+    baseline, baseline_scale = load(baseline_file)
+    if scale != baseline_scale:
+        print('Warning: baseline scale {} differs from current scale {}'.format(baseline_scale, scale))
+    df = report(baseline, current, args.threshold)
+    with pd.option_context('display.float_format', '{:.6f}'.format, 'display.width', 120):
+        print(df)
+    return 1 if (df.status == 'slower').any() else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pytest
+
+import fintec as ft
+from benchmarks.synthetic import write_indices, write_rates
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('fintec', 'fintec benchmarks')
+    group.addoption('--years', type=int, default=10, help='years of synthetic data, default 10')
+    group.addoption('--instruments', type=int, default=20,
+                    help='number of synthetic rates, default 20. Indices are limited to the members of Idx')
+
+
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    output_json['fintec'] = {'years': config.getoption('--years'), 'instruments': config.getoption('--instruments')}
+
+
+@pytest.fixture(scope='session')
+def data_dir(tmp_path_factory, request):
+    years, instruments = request.config.getoption('--years'), request.config.getoption('--instruments')
+    directory = str(tmp_path_factory.mktemp('data'))
+    write_rates(directory, years, instruments)
+    write_indices(directory, years, min(instruments, len(ft.Idx)))
+    return directory
+
+
+@pytest.fixture(autouse=True)
+def environment(data_dir, monkeypatch):
+    monkeypatch.setenv(ft.U_FIN_DATA_BASE, data_dir)
+    monkeypatch.setenv(ft.U_FIN_CACHE, '0')
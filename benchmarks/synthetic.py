@@ -0,0 +1,75 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Synthetic data in the layout of the fintec data directory, for benchmarks at scale. """
+import os
+
+import numpy as np
+import pandas as pd
+
+from fintec import Idx
+
+
+def prices(years: int = 10, instruments: int = 20, seed: int = 42) -> pd.DataFrame:
+    """
+    Business day prices of instruments over years years. Every instrument starts at a random date in the
+    first quarter of the period and misses 2% of its days.
+    :param years: number of years
+    :param instruments: number of instruments
+    :param seed: random seed
+    :return: DataFrame with date index and a column per instrument
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2000-01-03', periods=years * 261)
+    values = 100 * np.exp(rng.normal(0.0002, 0.01, (len(dates), instruments)).cumsum(axis=0))
+    values[rng.uniform(size=values.shape) < 0.02] = np.nan
+    for i, start in enumerate(rng.integers(0, len(dates) // 4, instruments)):
+        values[:start, i] = np.nan
+    return pd.DataFrame(values.round(2), index=dates, columns=['f{}'.format(i) for i in range(instruments)])
+
+
+def write_rates(directory: str, years: int = 10, instruments: int = 20, excel: bool = True) -> pd.DataFrame:
+    """
+    Write rates like 'rates.csv' and, if excel, like sheet 'koersen' of 'fondsen.xlsx' in directory.
+    :param directory: the data base directory
+    :param years: number of years
+    :param instruments: number of instruments
+    :param excel: also write 'fondsen.xlsx'
+    :return: the rates written
+    """
+    df = prices(years, instruments)
+    df.index.name = 'datum'
+    os.makedirs(directory, exist_ok=True)
+    df.to_csv(os.path.join(directory, 'rates.csv'))
+    if excel:
+        df.to_excel(os.path.join(directory, 'fondsen.xlsx'), sheet_name='koersen')
+    return df
+
+
+def _investing_format(close: pd.Series, rng: np.random.Generator) -> pd.DataFrame:
+    close = close.dropna()
+    spread = close * rng.uniform(0, 0.01, len(close))
+    volume = np.char.add(rng.uniform(1, 999, len(close)).round(2).astype(str), rng.choice(['K', 'M', 'B'], len(close)))
+    change = np.char.add((close.pct_change().fillna(0) * 100).round(2).to_numpy().astype(str), '%')
+    return pd.DataFrame({'Price': close, 'Open': (close - spread / 2).round(2), 'High': (close + spread).round(2),
+                         'Low': (close - spread).round(2), 'Vol.': volume, 'Change %': change},
+                        index=pd.Index(close.index, name='Date'))
+
+
+def write_indices(directory: str, years: int = 10, instruments: int = len(Idx)) -> [Idx]:
+    """
+    Write index histories in the investing.com layout of 'indices/<name>.csv' in directory, for the first
+    instruments members of Idx.
+    :param directory: the data base directory
+    :param years: number of years
+    :param instruments: number of indices, at most len(Idx)
+    :return: the indices written
+    """
+    indices = list(Idx)[:instruments]
+    df = prices(years, len(indices), seed=7) * 50
+    rng = np.random.default_rng(7)
+    os.makedirs(os.path.join(directory, 'indices'), exist_ok=True)
+    for idx, column in zip(indices, df.columns):
+        filename = os.path.join(directory, 'indices', '{}.csv'.format(idx.name.lower()))
+        _investing_format(df[column].round(2), rng).to_csv(filename)
+    return indices
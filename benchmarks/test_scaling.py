@@ -0,0 +1,89 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Benchmarks of loading, merging, analytics and styling on synthetic data, see `benchmarks.compare`. """
+import os
+
+import pytest
+
+import fintec as ft
+
+
+@pytest.fixture(scope='module')
+def indices(data_dir):
+    return [idx for idx in ft.Idx if os.path.exists(os.path.join(data_dir, 'indices', idx.name.lower() + '.csv'))]
+
+
+@pytest.fixture(scope='module')
+def rates(data_dir):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv(ft.U_FIN_DATA_BASE, data_dir)
+        return ft.df_rates('rates.csv')
+
+
+@pytest.fixture(scope='module')
+def frames(rates):
+    return [rates[[column]].dropna() for column in rates.columns]
+
+
+def test_df_rates_csv(benchmark):
+    df = benchmark(ft.df_rates, 'rates.csv')
+    assert len(df.columns) > 0
+
+
+def test_df_rates_xlsx(benchmark):
+    df = benchmark.pedantic(ft.df_rates, rounds=3)
+    assert len(df.columns) > 0
+
+
+def test_df_rates_cached(benchmark, monkeypatch):
+    monkeypatch.setenv(ft.U_FIN_CACHE, '1')
+    ft.df_rates('rates.csv')
+    df = benchmark(ft.df_rates, 'rates.csv')
+    assert len(df.columns) > 0
+
+
+def test_df_index(benchmark):
+    df = benchmark(ft.df_index, ft.Idx.DOW)
+    assert len(df) > 0
+
+
+def test_df_indices(benchmark, indices):
+    df = benchmark(ft.df_indices, indices, start='2000-01-01')
+    assert len(df.columns) == len(indices)
+
+
+def test_value_frame(benchmark, rates):
+    vf = benchmark(ft.ValueFrame, rates)
+    assert len(vf.columns) == len(rates.columns)
+
+
+def test_value_frame_merge(benchmark, frames):
+    def merge():
+        vf = ft.ValueFrame(frames[0])
+        vf.merge(frames[1:])
+        return vf
+
+    vf = benchmark(merge)
+    assert len(vf.columns) == len(frames)
+
+
+def test_rel_change(benchmark, rates):
+    vf = ft.ValueFrame(rates)
+    df = benchmark.pedantic(vf.rel_change, args=('2000-01-01',), setup=vf.cache.clear, rounds=20)
+    assert len(df) == len(rates)
+
+
+def test_window_changes(benchmark, rates):
+    vf = ft.ValueFrame(rates)
+    windows = ft.period_windows(rates.index[-1], ('1M', '3M', 'YTD', '1Y', '3Y', '5Y'))
+    df = benchmark(vf.window_changes, windows)
+    assert len(df) == len(windows)
+
+
+@pytest.mark.parametrize('vectorized', [True, False], ids=['vectorized', 'per_cell'])
+@pytest.mark.parametrize('styler', [ft.currency, ft.percentage], ids=lambda styler: styler.__name__)
+def test_render(benchmark, rates, styler, vectorized):
+    df = rates.tail(250)
+    html = benchmark(lambda: styler(df, 2, vectorized=vectorized).to_html())
+    assert df.columns[-1] in html
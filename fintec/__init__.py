@@ -9,5 +9,9 @@ __version__ = version.__version__
 __release_date__ = version.__release_date__
 #
 from fintec.styling import *
+from fintec.timing import *
+from fintec.compact import *
 from fintec.data import *
+from fintec.dates import *
+from fintec.store import *
 from fintec.calc import *
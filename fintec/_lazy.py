@@ -0,0 +1,56 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Lazy loading of the visualization and networking dependencies, so `import fintec` only loads the compute core. """
+import importlib
+import types
+
+# distribution to install for a top level module, if it differs
+_DISTRIBUTIONS = {'IPython': 'ipython'}
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stands in for a module that is imported on first attribute access. Missing modules raise an ImportError
+    at that point, so functions that do not need them keep working.
+    """
+
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self.__dict__['_module'] = None
+
+    def _load(self) -> types.ModuleType:
+        if self.__dict__['_module'] is None:
+            try:
+                self.__dict__['_module'] = importlib.import_module(self.__name__)
+            except ImportError as err:
+                top = self.__name__.split('.')[0]
+                raise ImportError('{} is needed for this function, install it with: pip install {}'
+                                  .format(self.__name__, _DISTRIBUTIONS.get(top, top))) from err
+        return self.__dict__['_module']
+
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return '<lazy module {!r}, {}>'.format(self.__name__, state)
+
+
+def lazy_module(name: str) -> LazyModule:
+    """
+    A module that is imported on first use.
+    :param name: full name of the module, like 'plotly.graph_objs'
+    :return: LazyModule
+    """
+    return LazyModule(name)
+
+
+_ipython_display = lazy_module('IPython.display')
+
+
+def display(*objs, **kwargs) -> None:
+    """
+    `IPython.display.display`, imported on first use.
+    """
+    _ipython_display.display(*objs, **kwargs)
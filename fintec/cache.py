@@ -0,0 +1,241 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Transparent on-disk cache for parsed, date-indexed data files. """
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+import zipfile
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+_log = logging.getLogger(__name__)
+
+U_FIN_CACHE = 'U_FIN_CACHE'
+""" The environment variable name to switch the cache off. Set it to one of '0', 'false', 'no' or 'off'. """
+
+_CACHE_DIR = '.cache'
+_CACHE_EXT = '.npz'
+
+
+def cache_enabled() -> bool:
+    """
+    Is the on-disk cache enabled? It is, unless the environment variable 'U_FIN_CACHE' says otherwise.
+    :return: True if the cache is enabled, False otherwise
+    """
+    return os.getenv(U_FIN_CACHE, '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def _key_repr(value) -> str:
+    """
+    Stable representation of a reader argument. Functions are represented by their qualified name.
+    :param value: the argument
+    :return: string representation of the argument
+    """
+    if callable(value):
+        return '{}.{}'.format(getattr(value, '__module__', ''), getattr(value, '__qualname__', repr(value)))
+    if isinstance(value, dict):
+        return '{' + ', '.join('{}: {}'.format(_key_repr(k), _key_repr(v))
+                               for k, v in sorted(value.items(), key=lambda kv: repr(kv[0]))) + '}'
+    if isinstance(value, (list, tuple)):
+        return '(' + ', '.join(_key_repr(v) for v in value) + ')'
+    return repr(value)
+
+
+def _cache_file(filename: str, key_args: tuple) -> str:
+    """
+    Path of the cache file for the given source and reader arguments. The cache file lives in a directory
+    '.cache' next to the source file.
+
+    :param filename: the source file
+    :param key_args: the reader arguments
+    :return: path to the cache file
+    """
+    path = os.path.abspath(filename)
+    key = hashlib.sha1('{}|{}'.format(path, _key_repr(key_args)).encode('utf-8')).hexdigest()[:16]
+    directory, base = os.path.split(path)
+    return os.path.join(directory, _CACHE_DIR, '{}.{}{}'.format(base, key, _CACHE_EXT))
+
+
+def _source_stamp(filename: str) -> (int, int):
+    """
+    The modification time in nanoseconds and the size of the source file.
+    :param filename: the source file
+    :return: (mtime_ns, size)
+    """
+    st = os.stat(filename)
+    return st.st_mtime_ns, st.st_size
+
+
+def _cacheable(df: pd.DataFrame) -> bool:
+    """
+    Can the frame be stored as plain NumPy columns? Needs a naive DatetimeIndex, unique string column names
+    and numeric or boolean columns only.
+    :param df: the frame to check
+    :return: True if the frame can be cached, False otherwise
+    """
+    return isinstance(df.index, pd.DatetimeIndex) and df.index.tz is None \
+        and df.columns.is_unique and all(isinstance(c, str) for c in df.columns) \
+        and all(dt.kind in 'biuf' for dt in df.dtypes)
+
+
+def _read_rows(f, info: zipfile.ZipInfo, rows: slice) -> np.ndarray:
+    """
+    Read rows of a one dimensional array in an uncompressed npz file, without reading the other rows.
+    :param f: the npz file, opened binary
+    :param info: the zip entry of the array
+    :param rows: slice with start and stop
+    :return: the rows
+    """
+    f.seek(info.header_offset)
+    name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+    f.seek(info.header_offset + 30 + name_length + extra_length)
+    version = np.lib.format.read_magic(f)
+    read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+    _, _, dtype = read_header(f)
+    f.seek(rows.start * dtype.itemsize, os.SEEK_CUR)
+    return np.frombuffer(f.read((rows.stop - rows.start) * dtype.itemsize), dtype=dtype)
+
+
+def load(filename: str, key_args: tuple, window: Callable[[np.ndarray], slice] = None) -> Optional[pd.DataFrame]:
+    """
+    Load the cached frame for the given source and reader arguments. With a window only the rows in the window
+    are read from the cache file.
+
+    :param filename: the source file
+    :param key_args: the reader arguments
+    :param window: function of the index as int64 nanoseconds that gives the rows to load, default all rows
+    :return: the cached DataFrame or None if there is no valid cache entry
+    """
+    cache_file = _cache_file(filename, key_args)
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with np.load(cache_file, allow_pickle=False) as z:
+            meta = json.loads(str(z['__meta__']))
+            if (meta['mtime_ns'], meta['size']) != _source_stamp(filename):
+                _log.debug('Cache stale. filename={}'.format(filename))
+                return None
+            nanos = z['__index__']
+            names = ['c{}'.format(i) for i in range(len(meta['columns']))]
+            if window is None:
+                columns = [z[name] for name in names]
+            else:
+                rows = window(nanos)
+                nanos = nanos[rows]
+                infos = [z.zip.getinfo('{}.npy'.format(name)) for name in names]
+                if all(info.compress_type == zipfile.ZIP_STORED for info in infos):
+                    with open(cache_file, 'rb') as f:
+                        columns = [_read_rows(f, info, rows) for info in infos]
+                else:
+                    columns = [z[name][rows] for name in names]
+            index = pd.DatetimeIndex(nanos, name=meta['index_name'])
+            df = pd.DataFrame(dict(zip(meta['columns'], columns)), index=index, columns=meta['columns'])
+    except (OSError, ValueError, KeyError, EOFError, struct.error, zipfile.BadZipFile) as err:
+        _log.warning('Unreadable cache file {}: {}'.format(cache_file, err))
+        return None
+    _log.debug('Cache hit. filename={}'.format(filename))
+    return df
+
+
+def store(filename: str, key_args: tuple, df: pd.DataFrame, stamp: (int, int)) -> None:
+    """
+    Store the frame for the given source and reader arguments. Frames that cannot be stored column wise
+    are silently skipped. The cache file is written to a temporary file first and then renamed.
+
+    :param filename: the source file
+    :param key_args: the reader arguments
+    :param df: the frame to store
+    :param stamp: (mtime_ns, size) of the source file at the time it was read
+    :return: None
+    """
+    if not _cacheable(df):
+        _log.debug('Not caching, frame is not columnar numeric. filename={}'.format(filename))
+        return
+    cache_file = _cache_file(filename, key_args)
+    meta = {'mtime_ns': stamp[0], 'size': stamp[1], 'index_name': df.index.name, 'columns': list(df.columns)}
+    arrays = {'c{}'.format(i): df[name].to_numpy() for i, name in enumerate(df.columns)}
+    arrays['__index__'] = df.index.asi8
+    arrays['__meta__'] = np.array(json.dumps(meta))
+    tmp_file = '{}.{}.{}.tmp'.format(cache_file, os.getpid(), threading.get_ident())
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_file, cache_file)
+    except OSError as err:
+        _log.warning('Could not write cache file {}: {}'.format(cache_file, err))
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def cached(filename: str, key_args: tuple, reader: Callable[[], pd.DataFrame],
+           window: Callable[[np.ndarray], slice] = None) -> pd.DataFrame:
+    """
+    Return the frame for filename from cache or, if not cached or the source has changed, call reader
+    and cache its result. The cache entry always holds the complete frame, with a window only its rows
+    in the window are returned.
+
+    :param filename: the source file
+    :param key_args: the reader arguments that, together with filename, identify the cache entry
+    :param reader: callable without arguments that reads and returns the frame
+    :param window: function of the index as int64 nanoseconds that gives the rows to return, default all rows.
+            Needs a reader that returns a frame with a DatetimeIndex
+    :return: pandas.DataFrame
+    """
+    if not cache_enabled():
+        df = reader()
+    else:
+        df = load(filename, key_args, window)
+        if df is not None:
+            return df
+        stamp = _source_stamp(filename)
+        df = reader()
+        store(filename, key_args, df, stamp)
+    return df if window is None else df.iloc[window(df.index.asi8)]
+
+
+def cached_many(filename: str, keys: Sequence[tuple], reader: Callable[[list], list]) -> list:
+    """
+    Like `cached` for several frames from one source, for instance the sheets of a workbook. The frames that
+    are not cached are read with one call of reader.
+
+    :param filename: the source file
+    :param keys: the reader arguments of every frame
+    :param reader: callable that takes a list of positions in keys and returns a list of frames for them
+    :return: list of pandas.DataFrame, one for every key
+    """
+    if not cache_enabled():
+        return reader(list(range(len(keys))))
+    frames = [load(filename, key_args) for key_args in keys]
+    missing = [i for i, df in enumerate(frames) if df is None]
+    if missing:
+        stamp = _source_stamp(filename)
+        for i, df in zip(missing, reader(missing)):
+            store(filename, keys[i], df, stamp)
+            frames[i] = df
+    return frames
+
+
+def clear(directory: str) -> int:
+    """
+    Remove cache files. Walks directory and removes all cache files found in '.cache' directories.
+
+    :param directory: the directory to clear
+    :return: number of cache files removed
+    """
+    count = 0
+    for root, dirs, files in os.walk(directory):
+        if os.path.basename(root) != _CACHE_DIR:
+            continue
+        for file in files:
+            if file.endswith(_CACHE_EXT):
+                os.remove(os.path.join(root, file))
+                count += 1
+    _log.debug('Cleared {} cache files from {}'.format(count, directory))
+    return count
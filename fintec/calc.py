@@ -2,115 +2,720 @@
 # -*- coding: utf-8 -*-
 
 """ Calculating data. """
-from typing import Union, Sequence
+from __future__ import annotations
 
+import functools
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, Iterator, Union, Sequence
+
+import numpy as np
 import pandas as pd
-import plotly.graph_objs as go
-from IPython.core.display import display
-from plotly.offline import iplot
-import ipywidgets as widgets
 
-from fintec import currency, percentage
+from fintec import currency, percentage, display_paged
+from fintec._lazy import display, lazy_module
+from fintec.compact import compact_frame, dense_frame
+from fintec.data import merge_frames
+from fintec.dates import DateLookup
+from fintec.store import SeriesStore
+from fintec.timing import timed
+
+go = lazy_module('plotly.graph_objs')
+offline = lazy_module('plotly.offline')
+widgets = lazy_module('ipywidgets')
+
+__all__ = ['clamp', 'period_windows', 'downsample', 'ChangeTracker', 'stream_abs_change', 'stream_rel_change',
+           'ValueFrame']
 
-__all__ = ['clamp', 'ValueFrame']
+# plot width in pixels that downsampling assumes when a figure has no width
+_PLOT_WIDTH = 1000
 
 
 def clamp(n, minn, maxn):
     return max(min(maxn, n), minn)
 
 
+def period_windows(end: Union[str, pd.Timestamp] = None,
+                   periods: Sequence[str] = ('1M', '3M', 'YTD', '1Y', '3Y')) -> OrderedDict:
+    """
+    Windows for the given periods ending at end, as input for `ValueFrame.window_changes`.
+    A period is 'YTD' or a number followed by 'D' (days), 'W' (weeks), 'M' (months) or 'Y' (years).
+
+    :param end: end date of the windows, default today
+    :param periods: the periods, default ('1M', '3M', 'YTD', '1Y', '3Y')
+    :return: OrderedDict of period to (start, end)
+    """
+    end = pd.Timestamp.today().normalize() if end is None else pd.Timestamp(end)
+    units = {'D': 'days', 'W': 'weeks', 'M': 'months', 'Y': 'years'}
+    windows = OrderedDict()
+    for period in periods:
+        p = period.upper()
+        if p == 'YTD':
+            start = pd.Timestamp(year=end.year, month=1, day=1)
+        elif len(p) > 1 and p[-1] in units and p[:-1].isdigit():
+            start = end - pd.DateOffset(**{units[p[-1]]: int(p[:-1])})
+        else:
+            raise ValueError('Unknown period: {}'.format(period))
+        windows[period] = (start, end)
+    return windows
+
+
+def _minmax_indices(y: np.ndarray, buckets: int) -> np.ndarray:
+    """
+    Positions of the first, the last and the minimum and maximum of each of buckets equal buckets of y.
+    :param y: values without NaN
+    :param buckets: number of buckets
+    :return: sorted array of positions, at most 2 * buckets + 2
+    """
+    edges = np.linspace(0, len(y), buckets + 1).astype(int)[:-1]
+    bucket = np.repeat(np.arange(buckets), np.diff(np.append(edges, len(y))))
+    selected = [np.array([0, len(y) - 1])]
+    for reduce in (np.minimum, np.maximum):
+        extreme = reduce.reduceat(y, edges)
+        hits = np.flatnonzero(y == extreme[bucket])
+        selected.append(hits[np.unique(bucket[hits], return_index=True)[1]])
+    return np.unique(np.concatenate(selected))
+
+
+def _lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Positions of the points selected by largest-triangle-three-buckets: the first and the last point and from
+    each bucket in between the point that spans the largest triangle with the point selected before it and
+    the average of the next bucket.
+    :param x: increasing x values
+    :param y: values without NaN
+    :param points: number of points to select
+    :return: sorted array of points positions
+    """
+    size = len(y)
+    edges = np.linspace(1, size - 1, points - 1).astype(int)
+    selected = np.empty(points, dtype=int)
+    selected[0], selected[-1] = 0, size - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else size
+        avg_x, avg_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample(s: pd.Series, points: int, method: str = 'minmax') -> pd.Series:
+    """
+    Reduce a date-indexed series to about points points for plotting. Missing values are dropped.
+
+    - 'minmax' keeps the minimum and maximum of points / 2 buckets, so every visible extreme stays.
+    - 'lttb' keeps the most visually significant point per bucket with largest-triangle-three-buckets.
+
+    :param s: Series with date index
+    :param points: maximum number of points to return
+    :param method: 'minmax' or 'lttb', default 'minmax'
+    :return: Series with at most points values, s itself without NaN if it is short enough
+    """
+    if method not in ('minmax', 'lttb'):
+        raise ValueError('method should be one of {}, not {}'.format(['minmax', 'lttb'], method))
+    s = s.dropna()
+    if len(s) <= points or points < 4:
+        return s
+    y = s.to_numpy(dtype=float)
+    if method == 'minmax':
+        selected = _minmax_indices(y, (points - 2) // 2)
+    else:
+        x = np.asarray(s.index.asi8 - s.index.asi8[0], dtype=float)
+        selected = _lttb_indices(x, y, points)
+    return s.iloc[selected]
+
+
+class WindowCache(object):
+    """
+    Bounded least-recently-used cache for the window analytics of a ValueFrame, with hit and miss counters.
+
+    """
+    def __init__(self, maxsize: int = 32) -> None:
+        """
+        Construct an empty cache.
+
+        :param maxsize: max number of results kept. 0 disables caching
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key: Hashable, compute: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """
+        The result for key. Calls compute on a miss and keeps its result, evicting the least recently used
+        result when the cache is full. Returns a copy, so callers can not change the cached result.
+
+        :param key: the key of the result
+        :param compute: callable without arguments that computes the result
+        :return: copy of the result
+        """
+        if key in self._results:
+            self.hits += 1
+            self._results.move_to_end(key)
+            return self._results[key].copy()
+        self.misses += 1
+        result = compute()
+        if self.maxsize > 0:
+            self._results[key] = result
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return result.copy()
+
+    def clear(self) -> None:
+        """
+        Remove all results. The counters are kept.
+        :return: None
+        """
+        self._results.clear()
+
+    def info(self) -> dict:
+        """
+        Statistics of this cache.
+        :return: dict with 'hits', 'misses', 'size' and 'maxsize'
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._results), 'maxsize': self.maxsize}
+
+
+def _memoized(method):
+    """
+    Memoize a window analytic of ValueFrame. The key is the name of the method, the resolved window positions,
+    the columns and the data version of the frame.
+    """
+    @functools.wraps(method)
+    def wrapper(self, start: Union[str, pd.Timestamp] = None, end: Union[str, pd.Timestamp] = None,
+                columns: Sequence[str] = None) -> pd.DataFrame:
+        first, last = self._positions(start, end)
+        key = (method.__name__, first, last, None if columns is None else tuple(columns), self.version)
+        return self.cache.get(key, lambda: method(self, start, end, columns))
+
+    return wrapper
+
+
+class ChangeTracker(object):
+    """
+    Running state of the change analytics of a ValueFrame from a fixed start row up to the last row.
+    Rows that are appended to the frame are processed in O(new rows), with results identical to
+    `ValueFrame.abs_change`, `rel_change`, `abs_daily_change` and `rel_daily_change`.
+
+    Per column the tracker keeps the last valid value, the number of trailing missing values after it and the
+    running sum of daily changes. Like `interpolate(method='zero')`, trailing missing values stay NaN until a
+    later valid value arrives; then they are filled in retroactively.
+
+    """
+    def __init__(self, columns: Sequence[str]) -> None:
+        """
+        Construct an empty tracker.
+
+        :param columns: the columns to track
+        """
+        self.columns = list(columns)
+        self.rows = 0
+        self._started = False
+        n = len(self.columns)
+        self._dates = np.empty(0, dtype=np.int64)
+        self._abs = np.empty((0, n))
+        self._abs_daily = np.empty((0, n))
+        self._rel_daily = np.empty((0, n))
+        self._base = np.full(n, np.nan)
+        self._last_valid = np.full(n, np.nan)
+        self._trailing = np.zeros(n, dtype=np.int64)
+        self._total = np.zeros(n)
+
+    def _reserve(self, rows: int) -> None:
+        if rows <= len(self._dates):
+            return
+        capacity = max(rows, 2 * len(self._dates), 16)
+
+        def grow(array: np.ndarray) -> np.ndarray:
+            grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.rows] = array[:self.rows]
+            return grown
+
+        self._dates, self._abs, self._abs_daily, self._rel_daily = \
+            grow(self._dates), grow(self._abs), grow(self._abs_daily), grow(self._rel_daily)
+
+    def update(self, df: pd.DataFrame) -> None:
+        """
+        Process rows appended to the tracked frame.
+
+        :param df: the new rows, with dates after the last processed date and the tracked columns
+        :return: None
+        """
+        k = len(df)
+        if k == 0:
+            return
+        x = df[self.columns].to_numpy(dtype=float)
+        valid = ~np.isnan(x)
+        has_valid = valid.any(axis=0)
+        last_pos = np.where(has_valid, k - 1 - np.argmax(valid[::-1], axis=0), -1)
+        # forward fill seeded with the last valid value, NaN after the last valid value of this block
+        fill_pos = np.where(valid, np.arange(k)[:, None], -1)
+        np.maximum.accumulate(fill_pos, axis=0, out=fill_pos)
+        seeded = np.vstack([self._last_valid, x])
+        filled = np.take_along_axis(seeded, fill_pos + 1, axis=0)
+        filled[np.arange(k)[:, None] > last_pos] = np.nan
+        # interpolated value of the row before this block
+        prev = np.where(has_valid | (self._trailing == 0), self._last_valid, np.nan)
+        diff = filled - np.vstack([prev, filled[:-1]])
+        changes = np.cumsum(np.vstack([self._total, np.nan_to_num(diff, nan=0.0)]), axis=0)[1:]
+        abs_change = np.where(np.isnan(diff), np.nan, changes)
+        if not self._started:
+            self._base = filled[0].copy()
+            self._started = True
+        self._reserve(self.rows + k)
+        # trailing missing values of earlier rows that are now inside the data
+        for j in np.nonzero(has_valid & (self._trailing > 0) & ~np.isnan(self._last_valid))[0]:
+            rows = slice(max(0, self.rows - self._trailing[j]), self.rows)
+            self._abs[rows, j] = self._total[j]
+            self._abs_daily[rows, j] = 0.0
+            self._rel_daily[rows, j] = 0.0 / self._last_valid[j]
+        new = slice(self.rows, self.rows + k)
+        self._dates[new] = pd.DatetimeIndex(df.index).asi8
+        self._abs[new] = abs_change
+        self._abs_daily[new] = diff
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self._rel_daily[new] = diff / filled
+        self._total = changes[-1]
+        self._last_valid = np.where(has_valid, x[np.maximum(last_pos, 0), np.arange(len(self.columns))],
+                                    self._last_valid)
+        self._trailing = np.where(has_valid, k - 1 - last_pos, self._trailing + k)
+        self.rows += k
+
+    def _frame(self, values: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(values, index=pd.DatetimeIndex(self._dates[:self.rows]), columns=self.columns)
+
+    def _settled(self, max_pending: int) -> int:
+        """
+        Number of processed rows that no later row can change: the rows before the trailing missing values of
+        every column, except columns that have been missing for more than max_pending rows.
+        """
+        pending = self._trailing[~np.isnan(self._last_valid) & (self._trailing <= max_pending)]
+        return max(0, self.rows - (pending.max() if len(pending) > 0 else 0))
+
+    def _pop(self, rows: int) -> pd.DataFrame:
+        """
+        Remove the first rows processed rows from this tracker, keeping its running state.
+        :return: the absolute changes of the removed rows
+        """
+        df = pd.DataFrame(self._abs[:rows].copy(), index=pd.DatetimeIndex(self._dates[:rows].copy()),
+                          columns=self.columns)
+        for array in (self._dates, self._abs, self._abs_daily, self._rel_daily):
+            array[:self.rows - rows] = array[rows:self.rows]
+        self.rows -= rows
+        return df
+
+    def abs_change(self) -> pd.DataFrame:
+        return self._frame(self._abs[:self.rows].copy())
+
+    def rel_change(self) -> pd.DataFrame:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = self._abs[:self.rows] / self._base
+        if self.rows > 0:
+            values[0] = 0
+        return self._frame(values)
+
+    def abs_daily_change(self) -> pd.DataFrame:
+        return self._frame(self._abs_daily[:self.rows].copy())
+
+    def rel_daily_change(self) -> pd.DataFrame:
+        return self._frame(self._rel_daily[:self.rows].copy())
+
+
+def _stream_changes(chunks: Iterable[pd.DataFrame], relative: bool, columns: Sequence[str],
+                    max_pending: int) -> Iterator[pd.DataFrame]:
+    tracker, first = None, True
+
+    def pop(rows: int) -> pd.DataFrame:
+        nonlocal first
+        df = tracker._pop(rows)
+        if relative:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = df.to_numpy() / tracker._base
+            if first:
+                values[0] = 0
+            df = pd.DataFrame(values, index=df.index, columns=df.columns)
+        first = False
+        return df
+
+    for chunk in chunks:
+        if tracker is None:
+            tracker = ChangeTracker(chunk.columns if columns is None else columns)
+        tracker.update(chunk)
+        settled = tracker._settled(max_pending)
+        if settled > 0:
+            yield pop(settled)
+    # what is left are the trailing missing values, they stay NaN
+    if tracker is not None and tracker.rows > 0:
+        yield pop(tracker.rows)
+
+
+def stream_abs_change(chunks: Iterable[pd.DataFrame], columns: Sequence[str] = None,
+                      max_pending: int = 1000) -> Iterator[pd.DataFrame]:
+    """
+    The absolute change since the first row over a stream of date-sorted chunks, for instance from `iter_rates`.
+    Together the yielded frames equal `ValueFrame.abs_change` over all chunks, while only the running state of a
+    `ChangeTracker` and the rows that wait for later values are kept in memory.
+
+    A missing value is filled with the value before it once a later value arrives, so the rows with trailing
+    missing values of a chunk are yielded with a later chunk. A column that is missing for more than
+    max_pending rows is taken to have ended: its missing values are yielded as NaN, also if it has values later.
+
+    :param chunks: iterable of DataFrames with a date index, sorted over all chunks
+    :param columns: the columns, default the columns of the first chunk
+    :param max_pending: max number of rows that wait for a missing value
+    :return: generator of DataFrames
+    """
+    return _stream_changes(chunks, False, columns, max_pending)
+
+
+def stream_rel_change(chunks: Iterable[pd.DataFrame], columns: Sequence[str] = None,
+                      max_pending: int = 1000) -> Iterator[pd.DataFrame]:
+    """
+    The relative change since the first row over a stream of date-sorted chunks, like `ValueFrame.rel_change`.
+    See `stream_abs_change`.
+
+    :param chunks: iterable of DataFrames with a date index, sorted over all chunks
+    :param columns: the columns, default the columns of the first chunk
+    :param max_pending: max number of rows that wait for a missing value
+    :return: generator of DataFrames
+    """
+    return _stream_changes(chunks, True, columns, max_pending)
+
+
 class ValueFrame(object):
     """
     A date-indexed frame.
 
     """
-    def __init__(self, dfx: Union[pd.DataFrame, Sequence[pd.DataFrame]]) -> None:
+    def __init__(self, dfx: Union[pd.DataFrame, Sequence[pd.DataFrame]] = None,
+                 store: Union[SeriesStore, str] = None, cache_size: int = 32, compact: bool = False) -> None:
         """
         Construct a date-indexed frame.
 
+        The data is either kept in memory or, if a store is given, on disk in memory-mapped files. With a store
+        only the columns and the date window that a query asks for are read.
+
+        Results of the change analytics are kept in an LRU cache of cache_size results, see `cache`. The cache
+        is cleared whenever the data changes.
+
+        With compact the data in memory is kept in the form of `compact_frame`, the analytics still compute
+        in float64 on the rows they need. Ignored with a store.
+
         :param dfx: pd.DataFrame or sequence of DataFrames with a date index
+        :param store: SeriesStore or directory of a SeriesStore to keep the data in, default None
+        :param cache_size: max number of analytics results kept, default 32. 0 disables caching
+        :param compact: keep the data in memory compact, default False
+        """
+        if isinstance(store, str):
+            store = SeriesStore(store)
+        self.store = store
+        self.compact = compact
+        self._df = pd.DataFrame()
+        self._lookup = None
+        self._trackers = {}
+        self.version = 0
+        self.cache = WindowCache(cache_size)
+        if dfx is not None:
+            self.merge(dfx)
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """
+        The complete frame. If this frame is backed by a store, all data is read from disk. If this frame is
+        compact, the compact form.
+        :return: DataFrame with date index
+        """
+        if self.store is not None:
+            return self.store.read()
+        return self._df
+
+    @df.setter
+    def df(self, df: pd.DataFrame) -> None:
+        """
+        Replace the data of this frame. Like `merge`, this clears the cache and discards all trackers.
+        :param df: DataFrame with a sorted date index
+        :return: None
+        """
+        if self.store is not None:
+            raise AttributeError('Cannot assign df of a frame backed by a store, use merge')
+        self._set(dense_frame(df))
+        self._changed()
+        self._trackers.clear()
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        """
+        The date index of this frame.
+        :return: pd.DatetimeIndex
+        """
+        if self.store is not None:
+            return self.store.index
+        return self._df.index
+
+    @property
+    def columns(self) -> list:
+        """
+        The column names of this frame.
+        :return: list of column names
+        """
+        if self.store is not None:
+            return self.store.columns
+        return list(self._df.columns)
+
+    @property
+    def lookup(self) -> DateLookup:
         """
-        self.df = pd.DataFrame()
-        self.merge(dfx)
+        Binary search lookup on the date index of this frame. Built on first use after a merge.
+        :return: DateLookup
+        """
+        if self._lookup is None:
+            self._lookup = self.store.lookup if self.store is not None else DateLookup(self._df.index)
+        return self._lookup
 
+    @timed(rows=None)
     def merge(self, dfx: Union[pd.DataFrame, Sequence[pd.DataFrame]]) -> None:
         """
-        Merge the given DataFrame(s) with this frame.
+        Merge the given DataFrame(s) with this frame. If this frame is backed by a store, the merged frames are
+        written to the store, replacing columns with the same name.
 
         :param dfx: pd.DataFrame or sequence of DataFrames with a date index
         :return: None
         """
         if isinstance(dfx, pd.DataFrame):
             dfx = [dfx]
-        for dfi in dfx:
-            self.df = pd.merge(self.df, dfi.sort_index(), how='outer', left_index=True, right_index=True)
+        dfx = [dense_frame(dfi).sort_index() for dfi in dfx]
+        if self.store is not None:
+            self.store.write(merge_frames(dfx))
+        else:
+            self._set(merge_frames([dense_frame(self._df)] + dfx))
+        self._changed()
+        self._trackers.clear()
+
+    def append(self, dfx: Union[pd.DataFrame, Sequence[pd.DataFrame]]) -> None:
+        """
+        Append rows to this frame. Unlike `merge`, rows for existing columns are added to those columns.
+        All dates must be after the last date of this frame. Change trackers are kept and catch up with the new
+        rows on their next use.
+
+        :param dfx: pd.DataFrame or sequence of DataFrames with a date index and columns of this frame
+        :return: None
+        """
+        if isinstance(dfx, pd.DataFrame):
+            dfx = [dfx]
+        dfn = pd.concat([dense_frame(dfi).sort_index() for dfi in dfx]).sort_index()
+        unknown = [c for c in dfn.columns if c not in self.columns]
+        if unknown:
+            raise ValueError('Cannot append unknown columns {}'.format(unknown))
+        if len(dfn) == 0:
+            return
+        if len(self.lookup) > 0 and dfn.index[0] <= self.last_index(False):
+            raise ValueError('Cannot append {}, not after last date {}'.format(dfn.index[0], self.last_index()))
+        dfn = dfn.groupby(level=0).last().reindex(columns=self.columns).astype(float)
+        if self.store is not None:
+            self.store.append(dfn)
+        else:
+            self._set(pd.concat([dense_frame(self._df), dfn]))
+        self._changed()
+
+    def _set(self, df: pd.DataFrame) -> None:
+        self._df = compact_frame(df) if self.compact else df
+
+    def _changed(self) -> None:
+        self._lookup = None
+        self.version += 1
+        self.cache.clear()
+
+    def tracker(self, start: Union[str, pd.Timestamp] = None, columns: Sequence[str] = None) -> ChangeTracker:
+        """
+        Incremental change analytics from the date nearest to start up to the last row. The tracker is kept
+        with this frame and brought up to date with rows appended since its last use, so repeated calls cost
+        O(new rows). A merge discards all trackers.
+
+        :param start: start date, default the first date
+        :param columns: the columns to track, default all
+        :return: ChangeTracker
+        """
+        first = 0 if start is None else self.lookup.position(start)
+        columns = self.columns if columns is None else list(columns)
+        key = (first, tuple(columns))
+        tracker = self._trackers.get(key)
+        if tracker is None:
+            tracker = self._trackers[key] = ChangeTracker(columns)
+        tracker.update(self._rows(first + tracker.rows, None, columns))
+        return tracker
+
+    def _rows(self, start: int = 0, stop: int = None, columns: Sequence[str] = None) -> pd.DataFrame:
+        if self.store is not None:
+            return self.store.rows(start, stop, columns)
+        df = self._df.iloc[start:stop]
+        df = df if columns is None else df[list(columns)]
+        return dense_frame(df) if self.compact else df
 
     def tail_abs(self, tail=2):
-        return self.df.tail(tail)
+        if self.store is not None:
+            return self.store.tail(tail)
+        df = self._df.tail(tail)
+        return dense_frame(df) if self.compact else df
 
-    def display_tail_abs(self, tail=2):
-        display(currency(self.tail_abs(tail), 2))
+    def display_tail_abs(self, tail=2, page_size=50):
+        """
+        Display the last tail rows. More than page_size rows are shown a page at a time, see `display_paged`.
+        :param tail: number of rows
+        :param page_size: number of rows per page
+        :return: None
+        """
+        dft = self.tail_abs(tail)
+        if len(dft) > page_size:
+            display_paged(dft, currency, page_size=page_size, start=-page_size, decimals=2)
+        else:
+            display(currency(dft, 2))
 
     def first_index(self, as_string: bool = True) -> Union[str, pd.Timestamp]:
-        start = self.df.index[0]
+        start = self.lookup[0]
         if as_string:
             return start.strftime('%Y-%m-%d')
         else:
             return start
 
     def last_index(self, as_string: bool = True) -> Union[str, pd.Timestamp]:
-        last = self.df.index[-1:][0]
+        last = self.lookup[-1]
         if as_string:
             return last.strftime('%Y-%m-%d')
         else:
             return last
 
     def first(self) -> pd.DataFrame:
-        return self.df[:self.first_index()]
+        return self._rows(0, self.lookup.position(self.first_index(False), DateLookup.BEFORE) + 1)
 
     def last(self) -> pd.DataFrame:
-        return self.df[self.last_index():]
-
-    def slice(self, start: Union[str, pd.Timestamp] = None, end: Union[str, pd.Timestamp] = None) -> pd.DataFrame:
-        if start is None:
-            start = self.first_index(False)
-        if isinstance(start, str):
-            start = pd.to_datetime(start)
-        if end is None:
-            end = pd.Timestamp.today()
-        if isinstance(end, str):
-            end = pd.to_datetime(end)
-        start = self.df.index[self.df.index.get_loc(start, method='nearest')]
-        end = self.df.index[self.df.index.get_loc(end, method='nearest')]
-        return self.df[start:end]
-
-    def abs_daily_change(self, start: Union[str, pd.Timestamp] = None,
-                         end: Union[str, pd.Timestamp] = None) -> pd.DataFrame:
-        return self.slice(start, end).interpolate(method='zero', axis=0).diff()
-
-    def rel_daily_change(self, start: Union[str, pd.Timestamp] = None,
-                         end: Union[str, pd.Timestamp] = None) -> pd.DataFrame:
-        dfs = self.slice(start, end).interpolate(method='zero', axis=0)
+        return self._rows(self.lookup.position(self.last_index(False), DateLookup.AFTER))
+
+    def _positions(self, start: Union[str, pd.Timestamp] = None,
+                   end: Union[str, pd.Timestamp] = None) -> (int, int):
+        first = 0 if start is None else self.lookup.position(start)
+        last = self.lookup.position(pd.Timestamp.today() if end is None else end)
+        return first, last
+
+    @timed()
+    def slice(self, start: Union[str, pd.Timestamp] = None, end: Union[str, pd.Timestamp] = None,
+              columns: Sequence[str] = None) -> pd.DataFrame:
+        """
+        The rows from the date nearest to start up to and including the date nearest to end.
+
+        :param start: start date, default the first date
+        :param end: end date, default today
+        :param columns: the columns to return, default all
+        :return: DataFrame with date index
+        """
+        first, last = self._positions(start, end)
+        return self._rows(first, last + 1, columns)
+
+    @_memoized
+    def abs_daily_change(self, start: Union[str, pd.Timestamp] = None, end: Union[str, pd.Timestamp] = None,
+                         columns: Sequence[str] = None) -> pd.DataFrame:
+        return self.slice(start, end, columns).interpolate(method='zero', axis=0).diff()
+
+    @_memoized
+    def rel_daily_change(self, start: Union[str, pd.Timestamp] = None, end: Union[str, pd.Timestamp] = None,
+                         columns: Sequence[str] = None) -> pd.DataFrame:
+        dfs = self.slice(start, end, columns).interpolate(method='zero', axis=0)
         return dfs.diff() / dfs
 
-    def abs_change(self, start: Union[str, pd.Timestamp] = None, end: Union[str, pd.Timestamp] = None) -> pd.DataFrame:
-        return self.slice(start, end).interpolate(method='zero', axis=0).diff().cumsum()
+    @_memoized
+    def abs_change(self, start: Union[str, pd.Timestamp] = None, end: Union[str, pd.Timestamp] = None,
+                   columns: Sequence[str] = None) -> pd.DataFrame:
+        return self.slice(start, end, columns).interpolate(method='zero', axis=0).diff().cumsum()
 
-    def rel_change(self, start: Union[str, pd.Timestamp] = None, end: Union[str, pd.Timestamp] = None) -> pd.DataFrame:
-        dfs = self.slice(start, end).interpolate(method='zero', axis=0)
+    @timed()
+    @_memoized
+    def rel_change(self, start: Union[str, pd.Timestamp] = None, end: Union[str, pd.Timestamp] = None,
+                   columns: Sequence[str] = None) -> pd.DataFrame:
+        dfs = self.slice(start, end, columns).interpolate(method='zero', axis=0)
         df_change = dfs.diff().cumsum()
         df = df_change / dfs.iloc[0]
         df.iloc[0] = 0
         return df
 
-    def scatter_rel_change(self, start='2017-01-04', height=700, decimals=1):
+    def window_changes(self, windows: Union[dict, Sequence[tuple]], relative: bool = True,
+                       columns: Sequence[str] = None) -> pd.DataFrame:
+        """
+        The change over many windows at once. For each window the result equals the last row of `rel_change`
+        (or `abs_change` if relative is False) over that window, up to floating point rounding.
+
+        All windows are answered from one matrix covering their union: a backward scan gives the first valid
+        value at or after every row, after which each window is a constant time lookup of its first valid
+        and its last value. N windows cost one pass over the data plus O(N), instead of N slices.
+
+        :param windows: dict of label to (start, end) or sequence of (start, end). start or end None means
+                    the first date and today, as in `slice`. See `period_windows` for the usual periods
+        :param relative: relative change if True, absolute change otherwise, default True
+        :param columns: the columns to return, default all
+        :return: DataFrame with a row per window and a column per column of this frame
+        """
+        if isinstance(windows, dict):
+            index = pd.Index(list(windows.keys()), name='window')
+            windows = list(windows.values())
+        else:
+            windows = list(windows)
+            index = None
+        columns = self.columns if columns is None else list(columns)
+        if len(windows) == 0:
+            return pd.DataFrame(columns=columns, index=index, dtype=float)
+        today = pd.Timestamp.today()
+        first = np.array([0 if start is None else self.lookup.position(start) for start, _ in windows])
+        last = self.lookup.positions([today if end is None else end for _, end in windows])
+        # a window may end before it starts, its change is NaN
+        lo, hi = min(first.min(), last.min()), max(first.max(), last.max())
+        values = self._rows(lo, hi + 1, columns).to_numpy(dtype=float)
+        rows, cols = np.arange(len(values)), np.arange(len(columns))
+        valid = ~np.isnan(values)
+        # position of the first valid value at or after each row, len(values) if there is none
+        next_valid = np.where(valid, rows[:, None], len(values))
+        next_valid = np.minimum.accumulate(next_valid[::-1], axis=0)[::-1]
+        s, e = first - lo, last - lo
+        first_valid = next_valid[s]
+        first_values = values[np.minimum(first_valid, len(values) - 1), cols]
+        inside = (first_valid < e[:, None]) & valid[e] & (e >= s)[:, None]
+        changes = np.where(inside, values[e] - first_values, np.nan)
+        if relative:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                changes = changes / values[s]
+            changes[e == s] = 0
+        if index is None:
+            index = pd.MultiIndex.from_arrays([self.lookup.values[first], self.lookup.values[last]],
+                                              names=['start', 'end'])
+            index = index.set_levels([pd.DatetimeIndex(level) for level in index.levels])
+        return pd.DataFrame(changes, index=index, columns=columns)
+
+    def figure_rel_change(self, start='2017-01-04', height=700, decimals=1, width=None, downsampling='minmax',
+                          webgl=False) -> go.Figure:
+        """
+        Figure of the relative change since start. Every series is downsampled to two points per pixel of
+        the plot width, so the size of the figure does not grow with the length of the history.
+        :param start: start date
+        :param height: height of the figure in pixels
+        :param decimals: decimals of the percentages on the y axis
+        :param width: width of the figure in pixels, default the width of the notebook
+        :param downsampling: 'minmax', 'lttb' or None for all points, see `downsample`
+        :param webgl: draw with go.Scattergl instead of go.Scatter
+        :return: go.Figure
+        """
         df = self.rel_change(start=start)
         tick_format = '.0{}%'.format(clamp(decimals, 0, 3))
+        points = 2 * (_PLOT_WIDTH if width is None else width)
+        scatter = go.Scattergl if webgl else go.Scatter
         data = []
         for column in df.columns:
-            trace = go.Scatter(
-                x=df.index,
-                y=df[column],
+            series = df[column] if downsampling is None else downsample(df[column], points, downsampling)
+            trace = scatter(
+                x=series.index,
+                y=series,
                 name=column,
             )
             data.append(trace)
@@ -119,9 +724,13 @@ class ValueFrame(object):
                 tickformat=tick_format
             ),
             height=height,
+            width=width,
         )
-        fig = go.Figure(data=data, layout=layout)
-        iplot(fig)
+        return go.Figure(data=data, layout=layout)
+
+    def scatter_rel_change(self, start='2017-01-04', height=700, decimals=1, width=None, downsampling='minmax',
+                           webgl=False):
+        offline.iplot(self.figure_rel_change(start, height, decimals, width, downsampling, webgl))
 
     def display_rel_change(self, minus_days=365):
         start = pd.Timestamp.today() - pd.DateOffset(days=minus_days)
@@ -150,7 +759,8 @@ class ValueFrame(object):
             readout=True,
             readout_format='d'
         )
-        controls = {'start': ia_start, 'height': ia_height, 'decimals': ia_decimals}
-        ui = widgets.HBox([ia_start, ia_height, ia_decimals])
+        ia_webgl = widgets.Checkbox(value=False, description='WebGL')
+        controls = {'start': ia_start, 'height': ia_height, 'decimals': ia_decimals, 'webgl': ia_webgl}
+        ui = widgets.HBox([ia_start, ia_height, ia_decimals, ia_webgl])
         out = widgets.interactive_output(self.scatter_rel_change, controls)
         display(ui, out)
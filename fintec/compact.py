@@ -0,0 +1,115 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Compact in-memory representation of date-indexed frames. """
+import logging
+
+import numpy as np
+import pandas as pd
+
+__all__ = ['compact_frame', 'dense_frame', 'memory_report']
+
+_log = logging.getLogger(__name__)
+_INT32 = np.iinfo(np.int32).max
+
+
+def _compact_column(values: np.ndarray, decimals: int, sparse: float) -> (object, bool):
+    """
+    The compact representation of a float column.
+    :param values: the column as float64
+    :param decimals: number of decimals that float32 must keep
+    :param sparse: fraction of missing values from which the column is stored sparse
+    :return: (array, True if the array is float32 rounded to decimals)
+    """
+    valid = ~np.isnan(values)
+    v = values[valid]
+    if len(v) > 0 and np.array_equal(v, np.round(v)) and np.abs(v).max() < 2 ** 53:
+        dtype = 'int32' if np.abs(v).max() <= _INT32 else 'int64'
+        if valid.all():
+            return values.astype(dtype), False
+        # masked, one byte per value for the mask
+        return pd.array(values, dtype=dtype.capitalize()), False
+    rounded = np.array_equal(np.round(v, decimals), v) \
+        and np.array_equal(np.round(v.astype(np.float32).astype(float), decimals), v)
+    array = values.astype(np.float32) if rounded else values
+    if len(values) > 0 and 1 - valid.mean() >= sparse:
+        array = pd.arrays.SparseArray(array, fill_value=np.nan)
+    return array, rounded
+
+
+def compact_frame(df: pd.DataFrame, decimals: int = 2, sparse: float = 0.5) -> pd.DataFrame:
+    """
+    A compact copy of df, for keeping many instruments in memory:
+
+    - float columns with integer values only, like volume, become int32 or int64. With missing values they
+      become a masked integer array, 'Int32' or 'Int64'.
+    - other float columns with at most decimals decimals become float32, if float32 keeps them to decimals.
+    - float columns with a fraction of sparse or more missing values are stored sparse, only the values that
+      are not missing take memory.
+
+    Other columns and the index are kept. `dense_frame` gives back the float64 frame, exactly. See
+    `memory_report` for the memory saved.
+
+    :param df: DataFrame
+    :param decimals: number of decimals of prices, default 2
+    :param sparse: fraction of missing values from which a column is stored sparse, default 0.5
+    :return: DataFrame
+    """
+    columns, rounded = {}, {}
+    for i, (col, dt) in enumerate(df.dtypes.items()):
+        s = df.iloc[:, i]
+        if dt == np.float64:
+            columns[i], is_rounded = _compact_column(s.to_numpy(), decimals, sparse)
+            if is_rounded:
+                rounded[col] = decimals
+        else:
+            columns[i] = s.array
+    dfc = pd.DataFrame(columns, index=df.index)
+    dfc.columns = df.columns
+    dfc.attrs['decimals'] = rounded
+    return dfc
+
+
+def dense_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The float64 frame of a frame made by `compact_frame`. float32 columns are rounded back to their decimals,
+    so the values are the same as before compacting. A float64 frame is returned as is.
+    :param df: DataFrame of numeric columns
+    :return: DataFrame of float64 columns
+    """
+    if all(dt == np.float64 for dt in df.dtypes):
+        return df
+    values = df.to_numpy(dtype=float, na_value=np.nan)
+    decimals = df.attrs.get('decimals', {})
+    for j, col in enumerate(df.columns):
+        if col in decimals:
+            values[:, j] = np.round(values[:, j], decimals[col])
+    return pd.DataFrame(values, index=df.index, columns=df.columns)
+
+
+def memory_report(df: pd.DataFrame, compacted: pd.DataFrame = None, **kwargs) -> pd.DataFrame:
+    """
+    Measured memory of df and of its compact form per column, with a row 'Index' for the index and a row
+    'total'.
+    :param df: DataFrame
+    :param compacted: the compact form of df, default `compact_frame(df, **kwargs)`
+    :param kwargs: named arguments for `compact_frame`
+    :return: DataFrame with columns 'dtype', 'bytes', 'compact dtype', 'compact bytes' and 'saving', the fraction
+            of bytes saved
+    """
+    if compacted is None:
+        compacted = compact_frame(df, **kwargs)
+    report = pd.DataFrame({'dtype': df.dtypes.astype(str), 'bytes': df.memory_usage(index=False, deep=True),
+                           'compact dtype': compacted.dtypes.astype(str),
+                           'compact bytes': compacted.memory_usage(index=False, deep=True)})
+    index = pd.Series({'dtype': str(df.index.dtype), 'bytes': df.index.memory_usage(deep=True),
+                       'compact dtype': str(compacted.index.dtype),
+                       'compact bytes': compacted.index.memory_usage(deep=True)}, name='Index')
+    report = pd.concat([pd.DataFrame([index]), report])
+    report.loc['total'] = ['', report['bytes'].sum(), '', report['compact bytes'].sum()]
+    report[['bytes', 'compact bytes']] = report[['bytes', 'compact bytes']].astype(np.int64)
+    report['saving'] = 1 - report['compact bytes'] / report['bytes']
+    _log.info('Compact frame takes {} of {} bytes, saves {:.0%}'
+              .format(report.at['total', 'compact bytes'], report.at['total', 'bytes'],
+                      report.at['total', 'saving']))
+    return report
@@ -2,32 +2,64 @@
 # -*- coding: utf-8 -*-
 
 """ Gathering data. """
+from __future__ import annotations
+
+import contextlib
+import io
+import itertools
 import logging
+import multiprocessing
 import os
+import re
+import threading
+import time
 import warnings
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from enum import Enum
-from typing import Union, Sequence, Iterable
+from typing import Callable, Iterator, Optional, Union, Sequence, Iterable
 
 import numpy as np
 import pandas as pd
-import requests
-import ipywidgets as widgets
-from IPython.core.display import display
-from fintec.styling import info
+from pandas.io.parsers import TextParser
+from fintec._lazy import display, lazy_module
+from fintec.cache import U_FIN_CACHE, cached, cached_many, clear
+from fintec.compact import compact_frame
+from fintec.dates import DateLookup
+from fintec.store import SeriesStore
+from fintec.timing import timed
+
+etree = lazy_module('lxml.etree')
+openpyxl = lazy_module('openpyxl')
+requests = lazy_module('requests')
+widgets = lazy_module('ipywidgets')
 
-__all__ = ['U_FIN_DATA_BASE',
-           'df_rates',
+__all__ = ['U_FIN_DATA_BASE', 'U_FIN_CACHE', 'U_FIN_IC_BASE', 'clear_cache',
+           'df_rates', 'df_rates_sheets', 'iter_rates', 'merge_frames',
            'Idx', 'update_index', 'update_indices', 'initiate_index', 'initiate_indices', 'df_index', 'df_indices',
+           'migrate_indices',
            'display_initiate_indices', 'display_update_indices']
 
 
 _log = logging.getLogger(__name__)
 _STRINT = Union[str, int]
 _IDXCOL = Union[_STRINT, Sequence[int], None]
+_DATE = Union[str, pd.Timestamp, None]
 
 U_FIN_DATA_BASE = 'U_FIN_DATA_BASE'
 """ The environment variable name for the data base directory. """
 
+U_FIN_IC_BASE = 'U_FIN_IC_BASE'
+""" The environment variable name for the base url of investing.com. """
+
+_HEADERS = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_2) AppleWebKit/537.36 (KHTML, like Gecko) '
+                          'Chrome/39.0.2171.95 Safari/537.36'}
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+_WHITESPACE = re.compile(r'[\s\xa0]+')
+_INDEX_STORE = 'indices.store'
+_INDEX_STORE_LOCK = threading.Lock()
+# directory -> (identity of the manifest, SeriesStore) of the store opened for reading
+_INDEX_STORES = {}
+
 
 def _all_date_range(start_date: str = '2017-01-01') -> pd.date_range:
     """
@@ -50,6 +82,126 @@ def _data_path(filename: str) -> str:
     return os.path.join(os.getenv(U_FIN_DATA_BASE, 'data'), filename)
 
 
+def _cell_text(element) -> str:
+    return _WHITESPACE.sub(' ', ''.join(element.itertext())).strip()
+
+
+def _read_html_table(source: str, table_index: int = 0, table_id: str = None, index_col: _IDXCOL = 0) -> pd.DataFrame:
+    """
+    Read one table of an html document, like `pd.read_html(source, index_col=index_col)[table_index]` but
+    without building the other tables. The document is parsed incrementally, rows are converted as they end
+    and parsing stops at the end of the table. Tables with colspan or rowspan are read with `pd.read_html`.
+
+    :param source: filename or html text
+    :param table_index: index number of the table in the document, counting nested tables too
+    :param table_id: id of the table, takes precedence over table_index
+    :param index_col: int, str or sequence or False or None, default 0
+    :return: pandas.DataFrame
+    """
+    if '<' in source:
+        stream = io.BytesIO(source.encode('utf-8'))
+    else:
+        stream = open(source, 'rb')
+    header, body = [], []
+    table, depth, count = None, 0, -1
+    try:
+        for event, element in etree.iterparse(stream, events=('start', 'end'), html=True, encoding='utf-8'):
+            tag = element.tag
+            if event == 'start':
+                if tag == 'table':
+                    count += 1
+                    if table is not None:
+                        depth += 1
+                    elif (element.get('id') == table_id) if table_id is not None else count == table_index:
+                        table = element
+                continue
+            if table is None:
+                continue
+            if tag == 'table':
+                if element is table:
+                    break
+                depth -= 1
+            elif tag == 'tr' and depth == 0:
+                cells = [cell for cell in element if cell.tag in ('td', 'th')]
+                if any(cell.get('colspan', '1') != '1' or cell.get('rowspan', '1') != '1' for cell in cells):
+                    _log.debug('Table with colspan or rowspan, reading with pd.read_html')
+                    return pd.read_html(source, index_col=index_col, attrs=None if table_id is None
+                                        else {'id': table_id})[0 if table_id is not None else table_index]
+                row = [_cell_text(cell) for cell in cells]
+                in_head = element.getparent().tag == 'thead'
+                if in_head or (not body and cells and all(cell.tag == 'th' for cell in cells)):
+                    header.append(row)
+                else:
+                    body.append(row)
+                element.clear()
+    finally:
+        stream.close()
+    if table is None:
+        raise ValueError('No table {} in {}'.format(table_index if table_id is None else table_id,
+                                                    source if '<' not in source else 'html text'))
+    rows = header + [row for row in body if any(row)]
+    with TextParser(rows, header=len(header) - 1 if header else None, index_col=index_col, thousands=',') as tp:
+        return tp.read()
+
+
+def _trim(row: tuple) -> tuple:
+    end = len(row)
+    while end > 0 and row[end - 1] is None:
+        end -= 1
+    return row[:end]
+
+
+def _sheet_frame(rows: Iterable[tuple], index_col: _IDXCOL = 0) -> Optional[pd.DataFrame]:
+    """
+    Build the frame of a sheet from its cell values, the first row being the header, like `pd.read_excel`
+    does for plain numeric sheets. Empty trailing cells and empty rows are dropped.
+
+    :param rows: tuples of cell values
+    :param index_col: int or None
+    :return: DataFrame, or None if the sheet needs `pd.read_excel`: no rows, header names that are not unique
+            strings, or data columns that are not numeric
+    """
+    rows = [row for row in map(_trim, rows) if row]
+    if len(rows) == 0:
+        return None
+    width = max(map(len, rows))
+    header = rows[0] + (None,) * (width - len(rows[0]))
+    columns = ['Unnamed: {}'.format(i) if name is None else name for i, name in enumerate(header)]
+    if not all(isinstance(name, str) for name in columns) or len(set(columns)) != len(columns):
+        return None
+    df = pd.DataFrame(rows[1:], columns=columns)
+    if index_col is not None:
+        df = df.set_index(columns[index_col])
+    if any(dt.kind not in 'biuf' for dt in df.dtypes):
+        return None
+    return df
+
+
+def _read_excel_sheets(filename: str, sheet_names: Sequence[_STRINT] = None, index_col: _IDXCOL = 0) -> dict:
+    """
+    Read sheets of a workbook in one open. Plain numeric sheets are read with a read-only openpyxl workbook
+    straight from its cell values, other sheets with `pd.read_excel` on the same open file.
+
+    :param filename: the workbook
+    :param sheet_names: names or index numbers of the sheets to read, default all sheets
+    :param index_col: int, str or sequence or False or None, default 0
+    :return: dict of sheet name or number, as given, to DataFrame
+    """
+    with pd.ExcelFile(filename) as xls:
+        names = xls.sheet_names
+        wanted = names if sheet_names is None else sheet_names
+        fast = xls.engine == 'openpyxl' and (index_col is None or isinstance(index_col, int))
+        frames = {}
+        for sheet in wanted:
+            name = names[sheet] if isinstance(sheet, int) else sheet
+            df = _sheet_frame(xls.book[name].iter_rows(values_only=True), index_col) if fast else None
+            if df is None:
+                df = xls.parse(sheet_name=name, index_col=index_col)
+            frames[sheet] = df
+    return frames
+
+
+@timed(nbytes=lambda filename, *args, **kwargs: os.path.getsize(filename))
 def _read_data(filename: str, index_col: _IDXCOL = 0, sheet_name: _STRINT = 0, converters=None):
     """
     Read in a DataFrame, either from a csv file or an Excel file.
@@ -65,43 +217,264 @@ def _read_data(filename: str, index_col: _IDXCOL = 0, sheet_name: _STRINT = 0, c
     if os.path.splitext(filename)[1].lower() == '.csv':
         # _log.debug('Reading csv data. filename={}'.format(filename))
         df = pd.read_csv(filename, index_col=index_col, converters=converters)
+    elif converters is None:
+        df = _read_excel_sheets(filename, [sheet_name], index_col)[sheet_name]
     else:
         # _log.debug('Reading excel data. filename={}'.format(filename))
         df = pd.read_excel(filename, sheet_name=sheet_name, index_col=index_col, converters=converters)
     return df
 
 
-def _read_date_indexed_data(filename: str, index_col: _IDXCOL = 0, sheet_name: _STRINT = 0, converters=None):
+def _date_indexed(df: pd.DataFrame, parsers=None) -> pd.DataFrame:
+    """
+    Parse columns, convert the index to datetime, interpolate nearest and sort.
+    :param df: the frame as read
+    :param parsers: dict of column label to function that takes and returns a pandas.Series, default None
+    :return: pandas.DataFrame
+    """
+    for col, parser in (parsers or {}).items():
+        if col in df.columns:
+            df[col] = parser(df[col])
+    df.index = pd.to_datetime(df.index)
+    return df.interpolate(method='nearest', axis=0).sort_index()
+
+
+def _window(start: _DATE = None, end: _DATE = None, previous: bool = False) -> Optional[Callable]:
+    """
+    The rows of a sorted date axis from start up to and including end.
+    :param start: first date, default the first date of the axis
+    :param end: last date, default the last date of the axis
+    :param previous: also the last row before start
+    :return: function of the axis as int64 nanoseconds that gives a slice, or None if there are no bounds
+    """
+    if start is None and end is None:
+        return None
+
+    def rows(nanos: np.ndarray) -> slice:
+        i0 = 0 if start is None else int(np.searchsorted(nanos, pd.Timestamp(start).value, side='left'))
+        i1 = len(nanos) if end is None else int(np.searchsorted(nanos, pd.Timestamp(end).value, side='right'))
+        return slice(max(0, i0 - 1) if previous else i0, max(i0, i1))
+
+    return rows
+
+
+@timed()
+def _read_date_indexed_data(filename: str, index_col: _IDXCOL = 0, sheet_name: _STRINT = 0, converters=None,
+                            parsers=None, cache: bool = True, window: Callable = None):
     """
     Read data with a datetime index, interpolate nearest.
 
+    The typed and interpolated result is cached in a directory '.cache' next to filename, keyed on the path of
+    the file and the reader arguments. The cache entry is invalidated when the modification time or size of the
+    file changes. Set the environment variable 'U_FIN_CACHE' to '0' to switch off caching altogether.
+
     :param filename: file to read
     :param index_col: int, str or sequence or False or None, default 0
     :param sheet_name: if it is an Excel file, the name or index number of the sheet, default 0
     :param converters: dict, default None
                     Dict of functions for converting values in certain columns. Keys can either
                     be integers or column labels
+    :param parsers: dict, default None
+                    Dict of functions for converting whole columns after reading. Keys are column labels,
+                    values take and return a pandas.Series
+    :param cache: use the on-disk cache, default True
+    :param window: rows to return, see `_window`. From cache only these rows are read. Default all rows
     :return: pandas.DataFrame
     """
-    df = _read_data(filename, index_col, sheet_name, converters=converters)
-    df.index = pd.to_datetime(df.index)
-    df = df.interpolate(method='nearest', axis=0).sort_index()
-    return df
+    def read() -> pd.DataFrame:
+        return _date_indexed(_read_data(filename, index_col, sheet_name, converters=converters), parsers)
+
+    if not cache:
+        df = read()
+        return df if window is None else df.iloc[window(df.index.asi8)]
+    return cached(filename, (index_col, sheet_name, converters, parsers), read, window)
+
+
+def clear_cache(directory: str = None) -> int:
+    """
+    Remove all cached data files below directory.
+
+    :param directory: the directory to clear, default the data base directory
+    :return: number of cache files removed
+    """
+    if directory is None:
+        directory = _data_path('')
+    return clear(directory)
 
 
-def df_rates(filename='fondsen.xlsx', index_col: _IDXCOL = 0, sheet_name: _STRINT = 'koersen') -> pd.DataFrame:
+def df_rates(filename='fondsen.xlsx', index_col: _IDXCOL = 0, sheet_name: _STRINT = 'koersen',
+             start: _DATE = None, end: _DATE = None, compact: bool = False) -> pd.DataFrame:
     """
     Read file filename relative to data_path, sheet 'sheet_name'. The index_col should be of type date.
     Fills NaN's, except leading and trailing. The type of file and how it is read is determined
-    by the file extension, either .csv or .xlsx.
+    by the file extension, either .csv or .xlsx. If the file is cached, only the rows between start and end
+    are read from the cache.
 
     :param filename: file to read
     :param index_col: int, str or sequence or False or None, default 0
     :param sheet_name: if it is an Excel file, the name or index number of the sheet, default 'koersen'
+    :param start: first date, default the first date of the file
+    :param end: last date inclusive, default the last date of the file
+    :param compact: return the compact form, see `compact_frame`, default False
     :return: pandas.DataFrame
     """
     _log.debug('Reading rates. filename={}, index_col={}, sheet_name={}'.format(filename, index_col, sheet_name))
-    return _read_date_indexed_data(_data_path(filename), index_col, sheet_name)
+    df = _read_date_indexed_data(_data_path(filename), index_col, sheet_name, window=_window(start, end))
+    return compact_frame(df) if compact else df
+
+
+def df_rates_sheets(filename='fondsen.xlsx', sheet_names: Sequence[_STRINT] = None,
+                    index_col: _IDXCOL = 0) -> dict:
+    """
+    Read several sheets of a workbook relative to data_path, each like `df_rates` reads one sheet. The sheets
+    that are not cached yet are read in one open of the workbook, and cached one by one, so a following
+    `df_rates` of one of these sheets is read from cache.
+
+    :param filename: the workbook
+    :param sheet_names: names or index numbers of the sheets, default all sheets
+    :param index_col: int, str or sequence or False or None, default 0
+    :return: dict of sheet name or number, as given, to pandas.DataFrame
+    """
+    path = _data_path(filename)
+    if sheet_names is None:
+        with pd.ExcelFile(path) as xls:
+            sheet_names = xls.sheet_names
+    sheet_names = list(sheet_names)
+    _log.debug('Reading rates. filename={}, index_col={}, sheet_names={}'.format(filename, index_col, sheet_names))
+
+    def read(positions: list) -> list:
+        sheets = _read_excel_sheets(path, [sheet_names[i] for i in positions], index_col)
+        return [_date_indexed(sheets[sheet_names[i]]) for i in positions]
+
+    frames = cached_many(path, [(index_col, sheet, None, None) for sheet in sheet_names], read)
+    return dict(zip(sheet_names, frames))
+
+
+def _excel_chunks(filename: str, sheet_name: _STRINT, index_col: Optional[int], converters: dict,
+                  chunksize: int) -> Iterator[pd.DataFrame]:
+    """
+    Stream a sheet of a workbook in chunks of rows, from a read-only openpyxl workbook.
+    :param filename: the workbook
+    :param sheet_name: name or index number of the sheet
+    :param index_col: int or None
+    :param converters: dict of column label or number to function on cell values, or None
+    :param chunksize: number of rows per chunk
+    :return: generator of DataFrames
+    """
+    wb = openpyxl.load_workbook(filename, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        rows = (row for row in map(_trim, ws.iter_rows(values_only=True)) if row)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = ['Unnamed: {}'.format(i) if name is None else name for i, name in enumerate(header)]
+        while True:
+            batch = [row[:len(columns)] for row in itertools.islice(rows, chunksize)]
+            if len(batch) == 0:
+                return
+            df = pd.DataFrame(batch, columns=columns)
+            for col, converter in (converters or {}).items():
+                label = columns[col] if isinstance(col, int) else col
+                df[label] = df[label].map(converter)
+            yield df if index_col is None else df.set_index(columns[index_col])
+    finally:
+        wb.close()
+
+
+def iter_rates(filename='fondsen.xlsx', chunksize: int = 100000, index_col: Optional[int] = 0,
+               sheet_name: _STRINT = 'koersen', converters: dict = None, parsers: dict = None,
+               start: _DATE = None, end: _DATE = None) -> Iterator[pd.DataFrame]:
+    """
+    Stream file filename relative to data_path in chunks of chunksize rows, for files too big for `df_rates`.
+    Converters and parsers are applied per chunk, the index is converted to dates and each chunk is sorted.
+    Numeric columns of the first chunk are coerced to float in later chunks, so all chunks have the same
+    dtypes. Unlike `df_rates` missing values are not interpolated. Only one chunk is in memory at a time.
+
+    The file must be sorted by date, ascending. Reading stops at the first chunk after end.
+
+    :param filename: csv or Excel file to read
+    :param chunksize: number of rows per chunk
+    :param index_col: int or None, default 0
+    :param sheet_name: if it is an Excel file, the name or index number of the sheet, default 'koersen'
+    :param converters: dict of column label or number to function on cell values, default None
+    :param parsers: dict of column label to function that takes and returns a pandas.Series, default None
+    :param start: first date, default the first date of the file
+    :param end: last date inclusive, default the last date of the file
+    :return: generator of DataFrames with a date index
+    """
+    path = _data_path(filename)
+    _log.debug('Streaming rates. filename={}, chunksize={}'.format(path, chunksize))
+    window = _window(start, end)
+    end = None if end is None else pd.Timestamp(end)
+    if os.path.splitext(path)[1].lower() == '.csv':
+        chunks = pd.read_csv(path, index_col=index_col, converters=converters, chunksize=chunksize)
+    else:
+        chunks = _excel_chunks(path, sheet_name, index_col, converters, chunksize)
+    numeric, last = None, None
+    with contextlib.closing(chunks):
+        for chunk in chunks:
+            for col, parser in (parsers or {}).items():
+                if col in chunk.columns:
+                    chunk[col] = parser(chunk[col])
+            chunk.index = pd.to_datetime(chunk.index)
+            chunk = chunk.sort_index()
+            if numeric is None:
+                numeric = [col for col, dt in chunk.dtypes.items() if dt.kind in 'biuf']
+            dtypes = chunk.dtypes
+            for col in numeric:
+                if dtypes[col].kind not in 'biuf':
+                    chunk[col] = pd.to_numeric(chunk[col], errors='coerce').astype(float)
+            if len(chunk) == 0:
+                continue
+            if last is not None and chunk.index[0] < last:
+                raise ValueError('{} is not sorted by date, {} after {}'.format(path, chunk.index[0], last))
+            last = chunk.index[-1]
+            if window is not None:
+                chunk = chunk.iloc[window(chunk.index.asi8)]
+            if len(chunk) > 0:
+                yield chunk
+            if end is not None and last > end:
+                return
+
+
+def merge_frames(frames: Sequence[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Outer join frames on their index in one pass. Equivalent to merging the frames one by one with
+    `pd.merge(..., how='outer', left_index=True, right_index=True)`, but without copying the growing result
+    on every step. Float columns with a DatetimeIndex are aligned on the union of all dates and written into one
+    preallocated array. Other frames are aligned with `pd.concat(axis=1)`. Frames with overlapping column names
+    or a non-unique index are merged one by one, as before.
+
+    :param frames: sequence of DataFrames
+    :return: DataFrame with the sorted union of all indexes and the columns of all frames
+    """
+    frames = [df for df in frames if len(df.columns) > 0 or len(df) > 0]
+    if len(frames) == 0:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0].sort_index()
+    columns = [c for df in frames for c in df.columns]
+    if len(set(columns)) < len(columns) or not all(df.index.is_unique for df in frames):
+        dfm = frames[0]
+        for df in frames[1:]:
+            dfm = pd.merge(dfm, df, how='outer', left_index=True, right_index=True)
+        return dfm
+    names = {df.index.name for df in frames}
+    name = names.pop() if len(names) == 1 else None
+    if all(isinstance(df.index, pd.DatetimeIndex) and df.index.tz is None for df in frames) \
+            and all(dt.kind == 'f' for df in frames for dt in df.dtypes):
+        dates = np.unique(np.concatenate([df.index.asi8 for df in frames]))
+        values = np.full((len(dates), len(columns)), np.nan)
+        col = 0
+        for df in frames:
+            rows = np.searchsorted(dates, df.index.asi8)
+            values[rows, col:col + len(df.columns)] = df.to_numpy(dtype=float)
+            col += len(df.columns)
+        return pd.DataFrame(values, index=pd.DatetimeIndex(dates, name=name), columns=columns)
+    dfm = pd.concat(frames, axis=1, join='outer').sort_index()
+    dfm.index.name = name
+    return dfm
 
 
 class Idx(Enum):
@@ -137,10 +510,11 @@ class Idx(Enum):
 
     def ic_historical_data_url(self) -> str:
         """
-        URL of the index history.
+        URL of the index history. The base url can be set with the environment variable 'U_FIN_IC_BASE'.
         :return: URL of the index history
         """
-        return 'https://www.investing.com/indices/{}-historical-data'.format(self.ic_name)
+        base = os.getenv(U_FIN_IC_BASE, 'https://www.investing.com').rstrip('/')
+        return '{}/indices/{}-historical-data'.format(base, self.ic_name)
 
     def init_file(self) -> str:
         """
@@ -164,68 +538,273 @@ class Idx(Enum):
         return None
 
 
-def update_index(idx: Idx, table_index: int = 1) -> pd.DataFrame:
+def _session(pool_size: int = 1) -> requests.Session:
+    """
+    A session with a connection pool of pool_size connections per host.
+    :param pool_size: max number of connections kept per host
+    :return: requests.Session
+    """
+    session = requests.Session()
+    session.headers.update(_HEADERS)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _fetch(session: requests.Session, url: str, timeout: float = 30, retries: int = 3,
+           backoff: float = 1.0) -> str:
+    """
+    Get the text at url. Connection errors, timeouts and the status codes 429 and 5xx are retried
+    with exponential backoff: backoff, 2 * backoff, 4 * backoff ... seconds.
+
+    :param session: the session to use
+    :param url: the url to get
+    :param timeout: timeout in seconds for connect and read
+    :param retries: max number of retries
+    :param backoff: seconds to wait before the first retry
+    :return: the text of the response
+    """
+    attempt = 0
+    while True:
+        try:
+            response = session.get(url, timeout=timeout)
+            if response.status_code == 200:
+                return response.text
+            if response.status_code not in _RETRY_STATUS or attempt >= retries:
+                raise Exception('Unexpected response status: {}'.format(response.status_code))
+            reason = 'status {}'.format(response.status_code)
+        except (requests.ConnectionError, requests.Timeout) as err:
+            if attempt >= retries:
+                raise
+            reason = err.__class__.__name__
+        wait = backoff * 2 ** attempt
+        attempt += 1
+        _log.debug('Retry {} of {} in {}s after {}. url={}'.format(attempt, retries, wait, reason, url))
+        time.sleep(wait)
+
+
+def _write_csv_atomic(df: pd.DataFrame, filename: str) -> None:
+    """
+    Write df to a temporary file next to filename and rename it to filename. Readers either see the old or the
+    new file, never a half written one.
+
+    :param df: the frame to write
+    :param filename: the file to write to
+    :return: None
+    """
+    tmp_file = '{}.{}.{}.tmp'.format(filename, os.getpid(), threading.get_ident())
+    try:
+        df.to_csv(tmp_file)
+        os.replace(tmp_file, filename)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def _line_date(line: bytes) -> pd.Timestamp:
+    return pd.Timestamp(line.split(b',', 1)[0].decode('utf-8').strip('"'))
+
+
+def _csv_tail(filename: str, since: pd.Timestamp, block_size: int = 1 << 16) -> (bytes, int, bytes):
+    """
+    Find the rows of a date-sorted csv file with a date on or after since, reading the file backwards
+    in blocks. An unterminated last line, left behind by an interrupted append, is not part of the tail.
+
+    :param filename: the csv file with dates in the first column
+    :param since: the first date of the tail
+    :param block_size: number of bytes read at a time
+    :return: (header, offset, tail) the header line, the byte offset of the tail and the tail
+    """
+    with open(filename, 'rb') as f:
+        header = f.readline()
+        data_start = f.tell()
+        pos = f.seek(0, os.SEEK_END)
+        buf = b''
+        while pos > data_start:
+            new_pos = max(data_start, pos - block_size)
+            f.seek(new_pos)
+            buf = f.read(pos - new_pos) + buf
+            pos = new_pos
+            first = 0 if pos == data_start else buf.find(b'\n') + 1
+            end = buf.find(b'\n', first)
+            if first > 0 and end > first and _line_date(buf[first:end]) < since:
+                break
+    first = 0 if pos == data_start else buf.find(b'\n') + 1
+    offset = pos + first
+    tail = b''
+    for line in buf[first:].splitlines(keepends=True):
+        if not line.endswith(b'\n'):
+            break
+        if tail or _line_date(line) >= since:
+            tail += line
+        else:
+            offset += len(line)
+    return header, offset, tail
+
+
+def _update_csv_tail(filename: str, dfn: pd.DataFrame) -> bool:
+    """
+    Write the date-sorted rows of dfn into the csv file filename, replacing the rows on or after the first date
+    of dfn. When the stored rows in that range are equal to the first rows of dfn, only the newer rows are
+    appended. Otherwise only the overlapping tail is rewritten.
+
+    The file is first truncated at the start of the rows to write and synced, then the rows are appended. An
+    interrupted update leaves either the file without the rows that were being replaced, which are in the
+    download and written again by the next update, or an unterminated last line that `_csv_tail` skips.
+
+    :param filename: the csv file to update
+    :param dfn: the new rows
+    :return: True if the file was updated, False if the header of the file does not match dfn
+    """
+    header, offset, tail = _csv_tail(filename, dfn.index[0])
+    lines = dfn.to_csv().encode('utf-8')
+    new_header, new_rows = lines[:lines.index(b'\n') + 1], lines[lines.index(b'\n') + 1:]
+    if new_header.strip() != header.strip():
+        return False
+    if new_rows.startswith(tail):
+        offset, new_rows = offset + len(tail), new_rows[len(tail):]
+        _log.debug('Appending {} bytes to {}'.format(len(new_rows), filename))
+    else:
+        _log.debug('Rewriting {} bytes of tail of {}'.format(len(tail), filename))
+    with open(filename, 'r+b') as f:
+        if f.seek(0, os.SEEK_END) > offset:
+            f.truncate(offset)
+            f.flush()
+            os.fsync(f.fileno())
+        f.seek(offset)
+        f.write(new_rows)
+        f.flush()
+        os.fsync(f.fileno())
+    return True
+
+
+@timed()
+def update_index(idx: Idx, table_index: int = 1, session: requests.Session = None, timeout: float = 30,
+                 retries: int = 3, backoff: float = 1.0, incremental: bool = False) -> pd.DataFrame:
     """
     Update the given index.
 
+    By default the existing index file is read, merged with the downloaded table and written back atomically
+    in full. With incremental=True only the rows dated on or after the first downloaded row are touched:
+    new rows are appended and, if stored rows were corrected at the source, only that overlapping tail
+    is rewritten. If the layout of the file does not match the downloaded table, a full rewrite is done.
+
     :param idx: index to update
     :param table_index: index number of the table to read from html
-    :return: DataFrame with ohlc
+    :param session: session to use, default a new session
+    :param timeout: timeout in seconds for connect and read
+    :param retries: max number of retries
+    :param backoff: seconds to wait before the first retry, doubles on each next retry
+    :param incremental: only write the tail of the index file, default False
+    :return: DataFrame with ohlc. The full index, or, if incremental, only the downloaded rows
     """
-    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_2) AppleWebKit/537.36 (KHTML, like Gecko) '
-                             'Chrome/39.0.2171.95 Safari/537.36'}
-    response = requests.get(idx.ic_historical_data_url(), headers=headers)
-    if response.status_code != 200:
-        raise Exception('Unexpected response status: {}'.format(response.status_code))
-    # old index
-    dfo = _read_date_indexed_data(idx.filename())
+    if session is None:
+        session = _session()
+    text = _fetch(session, idx.ic_historical_data_url(), timeout=timeout, retries=retries, backoff=backoff)
     # new index
-    dfn = pd.read_html(response.text, index_col=0)[table_index]
+    dfn = _read_html_table(text, table_index)
     dfn.index = pd.to_datetime(dfn.index)
     dfn = dfn.sort_index()
+    store = _index_store()
+    stale = store is not None and _stale(store, idx)
+    if incremental and _update_csv_tail(idx.filename(), dfn):
+        _update_index_store(idx, dfn, stale)
+        _log.info('Updated {} incremental'.format(idx.describe()))
+        return dfn
+    # old index
+    dfo = _read_date_indexed_data(idx.filename(), cache=False)
     # concat on last day
     lastday = dfn.index[0] + pd.DateOffset(days=-1)
     dfi = pd.concat([dfo[:lastday], dfn], join='inner')
-    dfi.to_csv(idx.filename())
+    _write_csv_atomic(dfi, idx.filename())
+    _update_index_store(idx, dfn, stale)
     _log.info('Updated {}'.format(idx.describe()))
     return dfi
 
 
-def update_indices(indices: Union[iter, Idx] = Idx, table_index: int = 1):
+def update_indices(indices: Union[iter, Idx] = Idx, table_index: int = 1, max_workers: int = 4,
+                   timeout: float = 30, retries: int = 3, backoff: float = 1.0,
+                   incremental: bool = True, progress: Callable = None,
+                   cancel: threading.Event = None) -> pd.DataFrame:
     """
-    Update indices.
+    Update indices concurrently. All downloads share one pooled session. An index that fails does not
+    stop the others; its error is recorded in the report. Once cancel is set, indices that have not started
+    yet are skipped with status 'cancelled'.
 
     :param indices: indices to update. Default Idx
     :param table_index: index number of the table to read from html
-    :return: None
+    :param max_workers: max number of indices that are updated at the same time
+    :param timeout: timeout in seconds for connect and read
+    :param retries: max number of retries per index
+    :param backoff: seconds to wait before the first retry, doubles on each next retry
+    :param incremental: only write the tail of the index files, default True. Unlike for `update_index`, where
+            the default is False because it changes what it returns
+    :param progress: function called with the index and its report row as dict, when an index is done
+    :param cancel: event to cancel the update
+    :return: DataFrame report with a row per index and columns 'status', 'rows', 'last', 'seconds' and 'error'.
+            'rows' is the number of rows returned by update_index
     """
     _log.debug('Updating indices')
     if not isinstance(indices, Iterable):
         indices = [indices]
-    for idx in indices:
-        update_index(idx, table_index)
+    indices = list(indices)
+    session = _session(max_workers)
 
+    def update(idx: Idx) -> dict:
+        t0 = time.perf_counter()
+        if cancel is not None and cancel.is_set():
+            result = {'status': 'cancelled', 'rows': 0, 'last': pd.NaT, 'error': None}
+        else:
+            try:
+                dfi = update_index(idx, table_index, session=session, timeout=timeout, retries=retries,
+                                   backoff=backoff, incremental=incremental)
+                result = {'status': 'ok', 'rows': len(dfi), 'last': dfi.index.max(), 'error': None}
+            except Exception as err:
+                _log.warning('Could not update {}: {}'.format(idx.describe(), err))
+                result = {'status': 'error', 'rows': 0, 'last': pd.NaT, 'error': str(err)}
+        result['seconds'] = time.perf_counter() - t0
+        if progress is not None:
+            progress(idx, result)
+        return result
 
-def display_update_indices():
-    def on_button_update_indices_clicked(b):
-        b_update.description = 'updating...'
-        with out:
-            info(update_indices)
-        b_update.description = 'updated'
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            results = list(executor.map(update, indices))
+    finally:
+        session.close()
+    report = pd.DataFrame(results, index=pd.Index([idx.name for idx in indices], name='index'),
+                          columns=['status', 'rows', 'last', 'seconds', 'error'])
+    _log.info('Updated {} of {} indices'.format((report.status == 'ok').sum(), len(report)))
+    return report
 
-    b_update = widgets.Button(description='Update indices')
-    out = widgets.Output()
-    b_update.on_click(on_button_update_indices_clicked)
-    display(widgets.VBox([b_update, out]))
+
+def display_update_indices(indices: Union[iter, Idx] = Idx, **kwargs) -> 'BackgroundJob':
+    """
+    Display a button that updates indices in the background, see `BackgroundJob`.
+    :param indices: indices to update. Default Idx
+    :param kwargs: named arguments for `update_indices`
+    :return: the job
+    """
+    job = BackgroundJob(update_indices, indices, 'Update indices', **kwargs)
+    display(job.ui)
+    return job
 
 
-def initiate_index(idx: Idx, table_index: int = 0) -> pd.DataFrame:
+def initiate_index(idx: Idx, table_index: int = 0, table_id: str = None) -> pd.DataFrame:
     """
     Initiate the given index. Assumes html has been saved manually at idx.init_file().
     :param idx: the index to initiate
     :param table_index: index number of the table to read from html
+    :param table_id: id of the table to read from html, takes precedence over table_index
     :return: DataFrame with ohlc
     """
+    dfi = _initiate_csv(idx, table_index, table_id)
+    _sync_index_store([idx])
+    return dfi
+
+
+def _initiate_csv(idx: Idx, table_index: int = 0, table_id: str = None) -> pd.DataFrame:
     if os.path.exists(idx.filename()):
         _log.info('Not initiating {}. File \'{}\' exists'.format(idx, idx.filename()))
         dfi = pd.read_csv(idx.filename(), index_col=0)
@@ -233,11 +812,10 @@ def initiate_index(idx: Idx, table_index: int = 0) -> pd.DataFrame:
         dfi = dfi.sort_index()
     elif os.path.exists(idx.init_file()):
         _log.info('Initiating index from {}'.format(idx.init_file()))
-        dfs = pd.read_html(idx.init_file(), index_col=0)
-        dfi = dfs[table_index]
+        dfi = _read_html_table(idx.init_file(), table_index, table_id)
         dfi.index = pd.to_datetime(dfi.index)
         dfi = dfi.sort_index()
-        dfi.to_csv(idx.filename())
+        _write_csv_atomic(dfi, idx.filename())
         _log.info('Initiated index {}'.format(idx.filename()))
     else:
         msg = 'Not initiating {}. Initial file not found: {}'.format(idx, idx.init_file())
@@ -247,31 +825,207 @@ def initiate_index(idx: Idx, table_index: int = 0) -> pd.DataFrame:
     return dfi
 
 
-def initiate_indices(indices: Union[iter, Idx] = Idx, table_index: int = 0):
+def _initiate(idx: Idx, table_index: int = 0, table_id: str = None) -> Optional[int]:
+    """ Worker of `initiate_indices`, returns the number of rows or None if the initial file is missing. """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        dfi = _initiate_csv(idx, table_index, table_id)
+    return None if dfi is None else len(dfi)
+
+
+def initiate_indices(indices: Union[iter, Idx] = Idx, table_index: int = 0, progress: Callable = None,
+                     cancel: threading.Event = None, table_id: str = None, processes: int = None):
     """
     Initiate the given indices. Assumes html pages have been saved manually at idx.init_file().
+    Indices whose csv file exists are skipped, with status 'exists'. Parsing the pages is cpu bound, so with
+    more than one index left they are initiated in a pool of processes.
+    Once cancel is set, indices that have not started yet are skipped.
     :param indices: the indices to initiate
     :param table_index: index number of the table to read from html
+    :param progress: function called with the index and a dict with 'status' and 'rows', when an index is done
+    :param cancel: event to stop before the next index
+    :param table_id: id of the table to read from html, takes precedence over table_index
+    :param processes: max number of processes, default the number of cpus. With 1 all indices are initiated
+            in this process
     :return: None
     """
-    _log.debug('Updating indices')
+    _log.debug('Initiating indices')
     if not isinstance(indices, Iterable):
         indices = [indices]
+    indices = list(indices)
+    todo = []
     for idx in indices:
-        initiate_index(idx, table_index=table_index)
+        if os.path.exists(idx.filename()):
+            _log.info('Not initiating {}. File \'{}\' exists'.format(idx, idx.filename()))
+            if progress is not None:
+                progress(idx, {'status': 'exists', 'rows': 0})
+        else:
+            todo.append(idx)
+    processes = min(len(todo), processes or os.cpu_count() or 1)
+
+    def done(idx: Idx, rows: Optional[int]) -> None:
+        if progress is not None:
+            progress(idx, {'status': 'missing' if rows is None else 'ok', 'rows': rows or 0})
+
+    if processes <= 1:
+        for idx in todo:
+            if cancel is not None and cancel.is_set():
+                _log.info('Cancelled initiating indices before {}'.format(idx))
+                break
+            done(idx, _initiate(idx, table_index, table_id))
+    else:
+        # spawn, forking a process with running threads (logging, widgets) is not safe
+        with ProcessPoolExecutor(max_workers=processes,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {executor.submit(_initiate, idx, table_index, table_id): idx for idx in todo}
+            for future in as_completed(futures):
+                idx = futures[future]
+                rows = future.result()
+                if rows is None:
+                    _log.warning('Not initiated {}. Initial file not found: {}'.format(idx, idx.init_file()))
+                else:
+                    _log.info('Initiated index {}'.format(idx.filename()))
+                done(idx, rows)
+                if cancel is not None and cancel.is_set():
+                    cancelled = [futures[f] for f in futures if f.cancel()]
+                    if cancelled:
+                        _log.info('Cancelled initiating indices {}'.format(cancelled))
+    # the store is written here, not by the processes
+    _sync_index_store(indices)
+
+
+def display_initiate_indices(indices: Union[iter, Idx] = Idx, **kwargs) -> 'BackgroundJob':
+    """
+    Display a button that initiates indices in the background, see `BackgroundJob`.
+    :param indices: indices to initiate. Default Idx
+    :param kwargs: named arguments for `initiate_indices`
+    :return: the job
+    """
+    job = BackgroundJob(initiate_indices, indices, 'Initiate indices', **kwargs)
+    display(job.ui)
+    return job
+
+
+class _OutputHandler(logging.Handler):
+    """ Logging handler that appends formatted records to an ipywidgets Output, from any thread. """
+
+    def __init__(self, out: widgets.Output, level=logging.INFO) -> None:
+        super().__init__(level)
+        self.out = out
+        self.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.out.append_stdout(self.format(record) + '\n')
+        except Exception:
+            self.handleError(record)
+
+
+class BackgroundJob(object):
+    """
+    Runs a function over indices in a background thread, so the kernel stays responsive. The function is
+    called with the keywords 'progress' and 'cancel', like `update_indices` and `initiate_indices`. The widget
+    shows a progress bar per index, a cancel button and the log lines of the run as they come in.
+
+    Jobs run one at a time on a shared worker thread, so two jobs never write the same index files.
+
+    """
+    _executor = None
+
+    def __init__(self, func: Callable, indices: Union[Iterable, Idx], description: str, level=logging.INFO,
+                 **kwargs) -> None:
+        """
+        Construct a job and its widget. Nothing runs until `start` or a click on the button.
+
+        :param func: function to run, like `update_indices`
+        :param indices: the indices to pass to func
+        :param description: description of the start button
+        :param level: the log level of the lines shown
+        :param kwargs: named arguments for func
+        """
+        self.func = func
+        self.indices = list(indices) if isinstance(indices, Iterable) else [indices]
+        self.level = level
+        self.kwargs = kwargs
+        self.cancelled = threading.Event()
+        self.future = None
+        # func reports progress from its pool threads
+        self._progress_lock = threading.Lock()
+        self.b_start = widgets.Button(description=description)
+        self.b_cancel = widgets.Button(description='Cancel', disabled=True)
+        self.progress = widgets.IntProgress(value=0, min=0, max=len(self.indices))
+        self.label = widgets.Label()
+        self.out = widgets.Output()
+        self.b_start.on_click(lambda b: self.start())
+        self.b_cancel.on_click(lambda b: self.cancel())
+        self.ui = widgets.VBox([widgets.HBox([self.b_start, self.b_cancel, self.progress, self.label]), self.out])
+
+    @classmethod
+    def _background(cls) -> ThreadPoolExecutor:
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fintec-job')
+        return cls._executor
+
+    def running(self) -> bool:
+        return self.future is not None and not self.future.done()
 
+    def start(self) -> Future:
+        """
+        Start the job in the background, unless it is running already.
+        :return: the Future of the result of func
+        """
+        if self.running():
+            return self.future
+        self.cancelled.clear()
+        self.progress.value = 0
+        self.out.outputs = ()
+        self.label.value = 'waiting...'
+        self.b_start.disabled = True
+        self.b_cancel.disabled = False
+        self.future = self._background().submit(self._run)
+        self.future.add_done_callback(self._done)
+        return self.future
+
+    def cancel(self) -> None:
+        """
+        Cancel the job. Indices that are in progress finish, the others are skipped.
+        :return: None
+        """
+        self.cancelled.set()
+        self.b_cancel.disabled = True
+        if self.running():
+            self.label.value = 'cancelling...'
+
+    def _on_progress(self, idx: Idx, result: dict) -> None:
+        with self._progress_lock:
+            self.progress.value += 1
+            self.label.value = '{}/{} {} {}'.format(self.progress.value, self.progress.max, idx.name,
+                                                    result['status'])
 
-def display_initiate_indices():
-    def on_button_initiate_indices_clicked(b):
-        b_update.description = 'initiating...'
-        with out:
-            info(initiate_indices)
-        b_update.description = 'initiated'
+    def _run(self):
+        self.label.value = 'running...'
+        handler = _OutputHandler(self.out, self.level)
+        root = logging.getLogger()
+        root_level = root.level
+        root.addHandler(handler)
+        root.setLevel(min(root_level, self.level))
+        try:
+            return self.func(self.indices, progress=self._on_progress, cancel=self.cancelled, **self.kwargs)
+        finally:
+            root.removeHandler(handler)
+            root.setLevel(root_level)
 
-    b_update = widgets.Button(description='Initiate indices')
-    out = widgets.Output()
-    b_update.on_click(on_button_initiate_indices_clicked)
-    display(widgets.VBox([b_update, out]))
+    def _done(self, future: Future) -> None:
+        self.b_start.disabled = False
+        self.b_cancel.disabled = True
+        if future.exception() is not None:
+            self.label.value = 'failed'
+            self.out.append_stderr('{}: {}\n'.format(type(future.exception()).__name__, future.exception()))
+            return
+        self.label.value = '{} {}/{}'.format('cancelled' if self.cancelled.is_set() else 'done',
+                                             self.progress.value, self.progress.max)
+        if future.result() is not None:
+            self.out.append_stdout('{}\n'.format(future.result()))
 
 
 def __convert_volume__(v: str) -> float:
@@ -304,43 +1058,337 @@ def __convert_change__(c: str) -> float:
         return np.nan
 
 
-def df_index(idx: Idx) -> pd.DataFrame:
+_VOLUME_FACTORS = {'K': 1e3, 'M': 1e6, 'B': 1e9}
+
+
+def _parse_decimals(codes: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Vectorized parsing of plain decimal numbers ('-123.45') given as a matrix of unicode code points,
+    one row per value, padded with zeros. The integer mantissa is accumulated column by column and divided by
+    the matching power of ten, which gives the same correctly rounded float as float() for up to 15 digits.
+
+    :param codes: matrix of code points
+    :return: (numbers, plain) parsed numbers and a mask of rows that were plain decimals
+    """
+    is_digit = (codes >= 48) & (codes <= 57)
+    is_dot = codes == 46
+    is_minus = codes[:, 0] == 45 if codes.shape[1] else np.zeros(len(codes), dtype=bool)
+    valid = is_digit | is_dot | (codes == 0)
+    valid[:, 0] |= is_minus
+    n_digits = np.count_nonzero(is_digit, axis=1)
+    plain = valid.all(axis=1) & (np.count_nonzero(is_dot, axis=1) <= 1) & (n_digits > 0) & (n_digits <= 15)
+    mantissa = np.zeros(len(codes), dtype=np.int64)
+    for j in range(codes.shape[1]):
+        mantissa = np.where(is_digit[:, j], mantissa * 10 + (codes[:, j].astype(np.int64) - 48), mantissa)
+    decimals = np.count_nonzero(is_digit & np.logical_or.accumulate(is_dot, axis=1), axis=1)
+    numbers = mantissa / np.power(10.0, decimals)
+    return np.where(is_minus, -numbers, numbers), plain
+
+
+def _split_suffix(values: np.ndarray, suffixes: str) -> (np.ndarray, np.ndarray):
+    """
+    Vectorized split of string values in a number part and a one-character suffix. Works on the
+    code points of a fixed width unicode array, so no Python function is called per value.
+    Empty values and '-' become NaN.
+
+    :param values: the string values
+    :param suffixes: the characters that are recognized as suffix
+    :return: (numbers, suffix) numbers as float array, suffix as array of code points, 0 where there is no suffix
+    """
+    values = np.asarray(values, dtype=str)
+    n = len(values)
+    codes = values.view(np.uint32).reshape(n, -1).copy()
+    if codes.shape[1] == 0:
+        return np.full(n, np.nan), np.zeros(n, dtype=np.uint32)
+    length = np.count_nonzero(codes, axis=1)
+    last_pos = np.maximum(length - 1, 0)
+    rows = np.arange(n)
+    suffix = codes[rows, last_pos]
+    has_suffix = np.zeros(n, dtype=bool)
+    for c in suffixes:
+        has_suffix |= suffix == ord(c)
+    suffix[~has_suffix] = 0
+    codes[rows[has_suffix], last_pos[has_suffix]] = 0
+    numbers, plain = _parse_decimals(codes)
+    missing = (length - has_suffix == 0) | ((length == 1) & (codes[:, 0] == 45))
+    other = ~(plain | missing)
+    if other.any():
+        numbers[other] = codes[other].view(values.dtype).ravel().astype(float)
+    numbers[missing] = np.nan
+    return numbers, suffix
+
+
+def _parse_unique(s: pd.Series, parse) -> pd.Series:
+    """
+    Parse only the distinct values of s and map the results back on all rows. Index columns repeat
+    their values a lot, so this cuts the parsing work considerably. Missing values become NaN.
+
+    :param s: the column as read
+    :param parse: function that takes an array of distinct strings and returns an array of floats
+    :return: the parsed column
+    """
+    labels, uniques = pd.factorize(s)
+    numbers = np.append(parse(np.asarray(uniques, dtype=str)), np.nan)
+    return pd.Series(numbers[labels], index=s.index, name=s.name)
+
+
+def _parse_volume(s: pd.Series) -> pd.Series:
+    """
+    Vectorized conversion of the column 'Vol.' from investing.com/indices data. Handles the suffixes
+    'K', 'M' and 'B' and '-' for missing values.
+    :param s: the column as read
+    :return: the column as float values
+    """
+    if s.dtype.kind in 'biuf':
+        return s.astype(float)
+
+    def parse(values: np.ndarray) -> np.ndarray:
+        numbers, suffix = _split_suffix(values, ''.join(_VOLUME_FACTORS))
+        for sfx, factor in _VOLUME_FACTORS.items():
+            numbers[suffix == ord(sfx)] *= factor
+        return numbers
+
+    return _parse_unique(s, parse)
+
+
+def _parse_change(s: pd.Series) -> pd.Series:
+    """
+    Vectorized conversion of the column 'Change %' from investing.com/indices data.
+    Values without a trailing '%' become NaN.
+    :param s: the column as read
+    :return: the column as float fractions
+    """
+    def parse(values: np.ndarray) -> np.ndarray:
+        numbers, suffix = _split_suffix(values, '%')
+        numbers[suffix != ord('%')] = np.nan
+        return numbers / 100
+
+    return _parse_unique(s, parse)
+
+
+def df_index(idx: Idx, start: _DATE = None, end: _DATE = None, compact: bool = False) -> pd.DataFrame:
     """
-    Read the index table indicated by idx. Fills NaN's, except leading and trailing.
+    Read the index table indicated by idx. Fills NaN's, except leading and trailing. If the index is cached,
+    only the rows between start and end are read from the cache.
 
     :param idx: index table to read
+    :param start: first date, default the first date of the index
+    :param end: last date inclusive, default the last date of the index
+    :param compact: return the compact form, float32 prices and integer volume, see `compact_frame`,
+            default False
     :return: DataFrame with date index, ohlc, volume and change percentage
     """
-    _log.debug('Reading index {}'.format(idx.filename()))
-    converters = {'Vol.': __convert_volume__, 'Change %': __convert_change__}
-    return _read_date_indexed_data(idx.filename(), converters=converters) \
-        .rename(columns={'Price': 'close', 'Vol.': 'volume', 'Change %': 'change'}) \
+    df = _df_index(idx, _window(start, end))
+    return compact_frame(df) if compact else df
+
+
+_INDEX_PARSERS = {'Vol.': _parse_volume, 'Change %': _parse_change}
+
+
+def _index_frame(df: pd.DataFrame) -> pd.DataFrame:
+    return df.rename(columns={'Price': 'close', 'Vol.': 'volume', 'Change %': 'change'}) \
         .rename(columns=np.unicode.lower)
 
 
-def df_indices(indices: Union[iter, Idx] = Idx, col: str = 'close', start: str = '2017-01-01') -> pd.DataFrame:
+def _df_index(idx: Idx, window: Callable = None) -> pd.DataFrame:
+    _log.debug('Reading index {}'.format(idx.filename()))
+    return _index_frame(_read_date_indexed_data(idx.filename(), parsers=_INDEX_PARSERS, window=window))
+
+
+def _index_column(idx: Idx, col: str) -> str:
+    return '{}.{}'.format(idx.name, col)
+
+
+def _csv_stamp(idx: Idx) -> list:
+    """ The modification time in nanoseconds and the size of the csv file of idx, as kept in the store. """
+    stat = os.stat(idx.filename())
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _write_index_store(store: SeriesStore, indices: Sequence[Idx]) -> None:
+    # stamped before reading, a csv file that changes meanwhile is stale in the store
+    stamps = {idx.name: _csv_stamp(idx) for idx in indices}
+    store.write(merge_frames([df_index(idx).rename(columns=lambda col: _index_column(idx, col)) for idx in indices]),
+                stamps)
+    _log.debug('Wrote {} to {}'.format([idx.name for idx in indices], store.directory))
+
+
+def _stale(store: SeriesStore, idx: Idx) -> bool:
+    """ Is the csv file of idx not the one that was written to the store? """
+    if not os.path.exists(idx.filename()):
+        return False
+    column = _index_column(idx, 'close')
+    return column not in store.columns or store.meta.get(idx.name) != _csv_stamp(idx)
+
+
+def _index_store() -> Optional[SeriesStore]:
+    """
+    The consolidated store of indices for reading, if it has been created with `migrate_indices`. The opened
+    store is kept as long as its manifest is the same file, so the series it has read stay mapped. Do not write
+    to it, see `_open_index_store`.
+    :return: SeriesStore or None if there is no store
+    """
+    directory = _data_path(_INDEX_STORE)
+    try:
+        stat = os.stat(os.path.join(directory, SeriesStore.MANIFEST))
+    except FileNotFoundError:
+        return None
+    # the manifest is replaced on every write, a new inode
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    cached = _INDEX_STORES.get(directory)
+    if cached is None or cached[0] != key:
+        cached = key, SeriesStore(directory)
+        _INDEX_STORES[directory] = cached
+    return cached[1]
+
+
+def _open_index_store() -> Optional[SeriesStore]:
+    """
+    The consolidated store of indices for writing, opened anew. Hold `_INDEX_STORE_LOCK` while writing.
+    :return: SeriesStore or None if there is no store
+    """
+    directory = _data_path(_INDEX_STORE)
+    if not os.path.exists(os.path.join(directory, SeriesStore.MANIFEST)):
+        return None
+    return SeriesStore(directory)
+
+
+def _sync_index_store(indices: Sequence[Idx]) -> None:
     """
-    Returns a dataframe with the columns named col from indices.
+    Write those of indices of which the csv file changed after they were written to the store, if there is a store.
+    :param indices: indices to bring up to date
+    :return: None
+    """
+    with _INDEX_STORE_LOCK:
+        store = _open_index_store()
+        stale = [] if store is None else [idx for idx in indices if _stale(store, idx)]
+        if stale:
+            _write_index_store(store, stale)
+
+
+def _index_rows(store: SeriesStore, idx: Idx, dfn: pd.DataFrame) -> pd.DataFrame:
+    """
+    The downloaded rows of idx in the layout of the store. The dates of the store after the first downloaded
+    date are included, with NaN if they are not downloaded, as the csv file has no other rows after that date.
+    :param store: the store of indices
+    :param idx: the index
+    :param dfn: the downloaded table, sorted on its date index
+    :return: DataFrame with the columns of idx in the store
+    """
+    dft = dfn.copy()
+    for col, parser in _INDEX_PARSERS.items():
+        if col in dft.columns:
+            dft[col] = parser(dft[col])
+    dft = _index_frame(dft).rename(columns=lambda col: _index_column(idx, col))
+    first = dft.index[0]
+    # interpolate the first rows with the stored row before them, as `df_index` does on the whole file
+    before = _read_index_store(store, list(dft.columns), first, first - pd.Timedelta(1))
+    dft = pd.concat([before, dft]).interpolate(method='nearest', axis=0).iloc[len(before):]
+    tail = store.rows(int(np.searchsorted(store.lookup.values, first.value)), None, []).index
+    return dft.reindex(dft.index.union(tail))
+
+
+def _update_index_store(idx: Idx, dfn: pd.DataFrame, stale: bool) -> None:
+    """
+    Write the downloaded rows of idx into the store of indices, if there is a store. Only the files of idx are
+    written, from the first downloaded date on. An index that was not up to date in the store is written in full.
+    :param idx: the index
+    :param dfn: the downloaded table, sorted on its date index
+    :param stale: the index was not up to date in the store before the download was written
+    :return: None
+    """
+    with _INDEX_STORE_LOCK:
+        store = _open_index_store()
+        if store is None:
+            return
+        if stale:
+            _write_index_store(store, [idx])
+        else:
+            stamp = _csv_stamp(idx)
+            store.update(_index_rows(store, idx, dfn), {idx.name: stamp})
+
+
+def migrate_indices(indices: Union[iter, Idx] = Idx) -> SeriesStore:
+    """
+    Create or refresh the consolidated store of indices from their csv files. The store is a `SeriesStore` in
+    'indices.store' in the data base directory, with a series '<index>.<column>' for every column of `df_index`
+    on one shared date axis. Once it exists, `update_index` and `initiate_index` also write into it and
+    `df_indices` reads from it. The csv files stay, they are what is downloaded and initiated. Indices of
+    which the csv file changed otherwise are read from their csv file until they are updated or migrated again.
+    Indices without a csv file are skipped.
+
+    :param indices: indices to migrate, default Idx
+    :return: the store
+    """
+    if not isinstance(indices, Iterable):
+        indices = [indices]
+    indices = list(indices)
+    missing = [idx.name for idx in indices if not os.path.exists(idx.filename())]
+    if missing:
+        _log.warning('Not migrating {}, no csv file'.format(missing))
+    indices = [idx for idx in indices if idx.name not in missing]
+    with _INDEX_STORE_LOCK:
+        store = SeriesStore(_data_path(_INDEX_STORE))
+        if indices:
+            _write_index_store(store, indices)
+    _log.info('Migrated {} indices to {}'.format(len(indices), store.directory))
+    return store
+
+
+def _read_index_store(store: SeriesStore, columns: Sequence[str], start: _DATE = None,
+                      end: _DATE = None) -> pd.DataFrame:
+    """
+    Read columns of the index store from the last date before start on which one of them has a value, up to and
+    including end. Dates on which none of them has a value are left out.
+    :param store: the store
+    :param columns: the columns to read
+    :param start: first date, default the first date of the store
+    :param end: last date inclusive, default the last date of the store
+    :return: DataFrame with date index
+    """
+    window = _window(start, end)
+    rows = slice(0, len(store)) if window is None else window(store.lookup.values)
+    dfm = store.rows(rows.start, rows.stop, columns).dropna(how='all')
+    stop, step = rows.start, 32
+    while stop > 0:
+        before = store.rows(max(0, stop - step), stop, columns).dropna(how='all')
+        if len(before) > 0:
+            return pd.concat([before.iloc[-1:], dfm])
+        stop -= step
+    return dfm
+
+
+@timed()
+def df_indices(indices: Union[iter, Idx] = Idx, col: str = 'close', start: _DATE = '2017-01-01',
+               end: _DATE = None, compact: bool = False) -> pd.DataFrame:
+    """
+    Returns a dataframe with the columns named col from indices. Reads one slice of the consolidated store if
+    it has been created with `migrate_indices` and holds the indices as in their csv files, otherwise merges the
+    csv files of the indices. Reading does not write the store. Only the rows
+    between start and end are read from the store or from the cache of the csv files.
 
     :param indices: iterable of indices, default Idx
     :param col: which column should be merged in the final frame.
                 one of ['close', 'open', 'high', 'low', 'volume', 'change']
-    :param start: start date
+    :param start: start date, the frame starts at the date nearest to it. None for the first date
+    :param end: last date inclusive, default the last date
+    :param compact: return the compact form, see `compact_frame`, default False
     :return: DataFrame with date index, indices represented with column named by col
     """
     _log.debug('Merging column \'{}\' of indices.'.format(col))
     if not isinstance(indices, Iterable):
         indices = [indices]
-    dfm = None
+    indices = list(indices)
     _log.debug('Reading {} indices.'.format(len(indices)))
-    for idx in indices:
-        df = df_index(idx).rename(columns={col: idx.name})
-        if dfm is None:
-            dfm = df[[idx.name]]
-        else:
-            dfm = pd.merge(dfm, df[[idx.name]], how='outer', left_index=True, right_index=True)
-
-    dt = pd.to_datetime(start)
-    dti = dfm.index[dfm.index.get_loc(dt, method='nearest')]
-    strt = '{0:%Y-%m-%d}'.format(dti)
-    return dfm.loc[strt:]
+    store = _index_store()
+    columns = [_index_column(idx, col) for idx in indices]
+    if store is not None and set(columns).issubset(store.columns) and not any(_stale(store, idx) for idx in indices):
+        # the date axis of the store is shared by all indices, keep the dates of these
+        dfm = _read_index_store(store, columns, start, end).rename(columns=lambda column: column.split('.')[0])
+    else:
+        # with the last row before start, to find the date nearest to start
+        window = _window(start, end, previous=True)
+        dfm = merge_frames([_df_index(idx, window)[[col]].rename(columns={col: idx.name}) for idx in indices])
+    if start is not None and len(dfm) > 0:
+        dfm = dfm.iloc[DateLookup(dfm.index).position(start):]
+    return compact_frame(dfm) if compact else dfm
@@ -0,0 +1,85 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Fast date lookups on sorted date axes. """
+import datetime
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+__all__ = ['DateLookup']
+
+
+def _nanos(dates) -> np.ndarray:
+    """
+    Convert a date or sequence of dates to int64 nanoseconds.
+    :param dates: str, pd.Timestamp, datetime or sequence of these
+    :return: array of int64 nanoseconds
+    """
+    if isinstance(dates, (str, pd.Timestamp, datetime.date, np.datetime64)):
+        return np.array([pd.Timestamp(dates).value], dtype=np.int64)
+    return pd.DatetimeIndex(pd.to_datetime(dates)).asi8
+
+
+class DateLookup(object):
+    """
+    A sorted date axis as an int64 nanosecond array. Resolves dates to positions with a binary search,
+    so windows can be sliced positionally with `iloc` without formatting or parsing date strings.
+
+    """
+    NEAREST = 'nearest'
+    BEFORE = 'before'
+    AFTER = 'after'
+
+    def __init__(self, dates: Union[pd.DatetimeIndex, np.ndarray]) -> None:
+        """
+        Construct a lookup for the sorted dates.
+
+        :param dates: sorted pd.DatetimeIndex or array of int64 nanoseconds
+        """
+        if isinstance(dates, pd.DatetimeIndex):
+            dates = dates.asi8
+        self.values = dates
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, position: int) -> pd.Timestamp:
+        return pd.Timestamp(int(self.values[position]))
+
+    def positions(self, dates, how: str = NEAREST) -> np.ndarray:
+        """
+        Positions of dates on the axis.
+
+        - 'nearest' the position of the nearest date. Ties go to the later date.
+        - 'before' the position of the last date on or before the date, -1 if there is none.
+        - 'after' the position of the first date on or after the date, len(self) if there is none.
+
+        :param dates: str, pd.Timestamp or sequence of dates
+        :param how: one of 'nearest', 'before' or 'after', default 'nearest'
+        :return: array of positions
+        """
+        if len(self.values) == 0:
+            raise KeyError('Lookup on an empty date axis')
+        nanos = _nanos(dates)
+        if how == self.AFTER:
+            return np.searchsorted(self.values, nanos, side='left')
+        if how == self.BEFORE:
+            return np.searchsorted(self.values, nanos, side='right') - 1
+        if how != self.NEAREST:
+            raise ValueError('how should be one of {}, not {}'.format([self.NEAREST, self.BEFORE, self.AFTER], how))
+        right = np.minimum(np.searchsorted(self.values, nanos, side='left'), len(self.values) - 1)
+        left = np.maximum(right - 1, 0)
+        take_left = (nanos - self.values[left]) < (self.values[right] - nanos)
+        return np.where(take_left, left, right)
+
+    def position(self, date, how: str = NEAREST) -> int:
+        """
+        Position of date on the axis. See `positions` for the meaning of how.
+
+        :param date: str or pd.Timestamp
+        :param how: one of 'nearest', 'before' or 'after', default 'nearest'
+        :return: the position
+        """
+        return int(self.positions(date, how)[0])
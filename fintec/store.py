@@ -0,0 +1,438 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" On-disk storage of date-indexed series in memory-mapped NumPy files. """
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional, Union, Sequence
+
+import numpy as np
+import pandas as pd
+
+from fintec.dates import DateLookup
+
+__all__ = ['SeriesStore']
+
+_log = logging.getLogger(__name__)
+_DATE = Union[str, pd.Timestamp, None]
+
+
+def _tmp_file(filename: str) -> str:
+    return '{}.{}.{}.tmp'.format(filename, os.getpid(), threading.get_ident())
+
+
+def _save_atomic(filename: str, array: np.ndarray) -> None:
+    tmp_file = _tmp_file(filename)
+    with open(tmp_file, 'wb') as f:
+        np.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, filename)
+
+
+def _read_header(f) -> (int, int, np.dtype, int):
+    """
+    Read the header of an npy file of a one dimensional array.
+    :param f: the file, at its start
+    :return: (start of the header text, length of the array, dtype, offset of the data)
+    """
+    version = np.lib.format.read_magic(f)
+    header_start = f.tell() + (2 if version == (1, 0) else 4)
+    read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) \
+        else np.lib.format.read_array_header_2_0
+    shape, _, dtype = read_header(f)
+    return header_start, shape[0], dtype, f.tell()
+
+
+def _length(filename: str) -> int:
+    """
+    Length of the one dimensional array in the npy file filename, from its header only.
+    """
+    with open(filename, 'rb') as f:
+        return _read_header(f)[1]
+
+
+def _memmap(filename: str) -> np.ndarray:
+    """
+    Read-only memory map of the one dimensional array in the npy file filename, with one open of the file.
+    """
+    with open(filename, 'rb') as f:
+        _, length, dtype, offset = _read_header(f)
+        if length == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(f, dtype=dtype, mode='r', offset=offset, shape=(length,))
+
+
+def _write_rows(filename: str, start: int, values: np.ndarray) -> None:
+    """
+    Write values into the npy file filename from row start on, and make the array end after them. The bytes
+    are written in place and the shape in the header is patched, so the cost is the number of values, not
+    the length of the file. The file is never truncated, memory maps of it stay valid. If the new shape does
+    not fit in the header, the file is rewritten.
+
+    :param filename: npy file of a one dimensional array of the dtype of values
+    :param start: the first row to write, at most the length of the array
+    :param values: the values
+    :return: None
+    """
+    with open(filename, 'r+b') as f:
+        header_start, length, dtype, offset = _read_header(f)
+        header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}" \
+            .format(np.lib.format.dtype_to_descr(dtype), start + len(values))
+        if dtype == values.dtype and start <= length and len(header) < offset - header_start:
+            f.seek(offset + start * dtype.itemsize)
+            f.write(values.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(header_start)
+            f.write((header.ljust(offset - header_start - 1) + '\n').encode('latin1'))
+            f.flush()
+            os.fsync(f.fileno())
+            return
+    _log.debug('Rewriting {}'.format(filename))
+    head = np.load(filename, mmap_mode='r')[:start]
+    _save_atomic(filename, np.concatenate([head, values]).astype(head.dtype))
+
+
+class SeriesStore(object):
+    """
+    A directory of float64 series that share one date axis. Every series lives in its own .npy file, the
+    date axis in a .npy file of int64 nanoseconds. Series are opened memory-mapped, so reading a few columns
+    over a date window only touches that part of the files.
+
+    The manifest 'columns.json' names the files of the date axis and of the series, the number of rows, a
+    generation number, per series its number of rows and the time it was last written, and `meta`, a dict the
+    caller can keep about the series, written together with them. It is always written last. A series may have
+    less rows than the date axis, the rows after its end are NaN.
+
+    New rows at the end of the date axis are appended in place, after the rows the manifest names, see
+    `update`. A series of which stored rows change is written to a new file, and extending the date axis
+    anywhere but at its end writes all series to new files of the next generation. The files the manifest
+    names are not overwritten, so an interrupted write leaves the store of the previous manifest intact; at
+    most an appended header shape is larger than the rows of the manifest, which are the rows read.
+
+    Opening a store reads the manifest and maps the date axis. A series file is opened and mapped when the
+    series is first read, once. A series shorter than the manifest says is then left out with a warning.
+
+    """
+    MANIFEST = 'columns.json'
+
+    def __init__(self, directory: str) -> None:
+        """
+        Open or create a store in directory.
+
+        :param directory: the directory of the store. Will be created if it does not exist
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # column -> [file, rows, modified]
+        self._columns = {}
+        # column -> memory map of its file, opened on first read
+        self._maps = {}
+        self._dates = np.empty(0, dtype=np.int64)
+        self._dates_file = 'dates.npy'
+        self.generation = 0
+        self._size = 0
+        self.meta = {}
+        if os.path.exists(self._path(self.MANIFEST)):
+            self._open()
+
+    def _open(self) -> None:
+        with open(self._path(self.MANIFEST), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest, list):
+            # the first layout, a list of (column, file)
+            manifest = {'columns': manifest, 'dates': 'dates.npy', 'generation': 0,
+                        'rows': _length(self._path('dates.npy'))}
+        self.generation = manifest['generation']
+        self._size = manifest['rows']
+        self._dates_file = manifest['dates']
+        self.meta = manifest.get('meta', {})
+        self._load_dates()
+        if len(self._dates) < self._size:
+            raise ValueError('Date axis of {} has {} rows, expected {}'
+                             .format(self.directory, len(self._dates), self._size))
+        self._columns, self._maps = {}, {}
+        for entry in manifest['columns']:
+            column, filename = entry[:2]
+            # columns of the previous layouts span the date axis
+            rows, modified = entry[2:] if len(entry) > 2 else (self._size, 0.0)
+            self._columns[column] = [filename, rows, modified]
+
+    def _load_dates(self) -> None:
+        path = self._path(self._dates_file)
+        self._dates = _memmap(path)[:self._size] if os.path.exists(path) \
+            else np.empty(0, dtype=np.int64)
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _file(self, position: int, generation: int) -> str:
+        return 'c{}.npy'.format(position) if generation == 0 else 'c{}.g{}.npy'.format(position, generation)
+
+    def _new_file(self, generation: int) -> str:
+        used = set(entry[0] for entry in self._columns.values())
+        position = len(self._columns)
+        while self._file(position, generation) in used:
+            position += 1
+        return self._file(position, generation)
+
+    def _commit(self) -> None:
+        """
+        Write the manifest and remove the files it does not name anymore.
+        """
+        manifest = {'generation': self.generation, 'rows': self._size, 'dates': self._dates_file,
+                    'columns': [[column] + entry for column, entry in self._columns.items()], 'meta': self.meta}
+        tmp_file = _tmp_file(self._path(self.MANIFEST))
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self._path(self.MANIFEST))
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+        used = set(entry[0] for entry in self._columns.values()) | {self._dates_file}
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.npy') and filename not in used:
+                try:
+                    os.remove(self._path(filename))
+                except OSError as err:
+                    _log.debug('Could not remove {}: {}'.format(filename, err))
+
+    def __len__(self) -> int:
+        return len(self._dates)
+
+    @property
+    def columns(self) -> list:
+        """
+        The names of the series in this store.
+        :return: list of column names
+        """
+        return list(self._columns)
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        """
+        The shared date axis.
+        :return: pd.DatetimeIndex
+        """
+        return pd.DatetimeIndex(np.asarray(self._dates), name='Date')
+
+    def modified(self, column: str) -> float:
+        """
+        The time the series column was last written.
+        :param column: name of the series
+        :return: time in seconds since the epoch
+        """
+        return self._columns[column][2]
+
+    def _map(self, column: str) -> Optional[np.ndarray]:
+        """
+        The memory map of the file of the series column, None if the series has been left out.
+        """
+        if column not in self._maps:
+            filename, rows, _ = self._columns[column]
+            path = self._path(filename)
+            values = _memmap(path) if os.path.exists(path) else np.empty(0)
+            if len(values) < rows:
+                _log.warning('Leaving out series {} of {}, it has {} rows, expected {}'
+                             .format(column, self.directory, len(values), rows))
+                del self._columns[column]
+                return None
+            self._maps[column] = values
+        return self._maps[column]
+
+    def _values(self, column: str, start: int, stop: int) -> np.ndarray:
+        """
+        The rows start up to but not including stop of the series column, NaN after the end of the series.
+        """
+        rows = self._columns[column][1] if column in self._columns else 0
+        values = np.full(stop - start, np.nan)
+        if min(stop, rows) > start:
+            series = self._map(column)
+            if series is not None:
+                values[:min(stop, rows) - start] = series[start:min(stop, rows)]
+        return values
+
+    @property
+    def lookup(self) -> DateLookup:
+        """
+        Binary search lookup on the shared date axis.
+        :return: DateLookup
+        """
+        return DateLookup(self._dates)
+
+    def rows(self, start: int = 0, stop: int = None, columns: Sequence[str] = None) -> pd.DataFrame:
+        """
+        Read the given columns for the rows start up to but not including stop. Only these rows of these
+        columns are read from disk.
+
+        :param start: position of the first row
+        :param stop: position after the last row, default the end of the store
+        :param columns: names of the series to read, default all
+        :return: DataFrame with date index
+        """
+        if columns is None:
+            columns = self.columns
+        i0, i1, _ = slice(start, stop).indices(len(self._dates))
+        i1 = max(i0, i1)
+        index = pd.DatetimeIndex(np.array(self._dates[i0:i1]), name='Date')
+        return pd.DataFrame({column: self._values(column, i0, i1) for column in columns},
+                            index=index, columns=list(columns))
+
+    def read(self, columns: Sequence[str] = None, start: _DATE = None, end: _DATE = None) -> pd.DataFrame:
+        """
+        Read the given columns between start and end inclusive. Only this window of these columns is read
+        from disk.
+
+        :param columns: names of the series to read, default all
+        :param start: first date, default the first date of the store
+        :param end: last date, default the last date of the store
+        :return: DataFrame with date index
+        """
+        i0 = 0 if start is None else int(np.searchsorted(self._dates, pd.Timestamp(start).value, side='left'))
+        i1 = len(self._dates) if end is None else \
+            int(np.searchsorted(self._dates, pd.Timestamp(end).value, side='right'))
+        return self.rows(i0, i1, columns)
+
+    def tail(self, n: int = 2, columns: Sequence[str] = None) -> pd.DataFrame:
+        """
+        Read the last n rows of the given columns.
+
+        :param n: number of rows
+        :param columns: names of the series to read, default all
+        :return: DataFrame with date index
+        """
+        return self.rows(max(0, len(self._dates) - n), len(self._dates), columns)
+
+    def write(self, df: pd.DataFrame, meta: dict = None) -> None:
+        """
+        Write the columns of df to this store. Existing series with the same name are replaced. If df brings
+        dates that are not on the date axis yet, the axis is extended and all series are written to the files
+        of a new generation, the manifest last.
+
+        :param df: DataFrame with a date index
+        :param meta: items to set in `meta` with the manifest, default None
+        :return: None
+        """
+        df = df.sort_index()
+        new_dates = pd.DatetimeIndex(pd.to_datetime(df.index)).asi8
+        dates = np.union1d(np.asarray(self._dates), new_dates)
+        if len(dates) != len(self._dates) or not os.path.exists(self._path(self._dates_file)):
+            generation = self.generation + 1
+            rows = np.searchsorted(dates, np.asarray(self._dates))
+            columns = {}
+            for position, (column, (_, _, modified)) in enumerate(list(self._columns.items())):
+                filename = self._file(position, generation)
+                if column not in df.columns:
+                    values = np.full(len(dates), np.nan)
+                    values[rows] = self._values(column, 0, len(self._dates))
+                    if column not in self._columns:
+                        # left out on reading it
+                        continue
+                    _save_atomic(self._path(filename), values)
+                columns[column] = [filename, len(dates), modified]
+            self._dates_file = 'dates.g{}.npy'.format(generation)
+            _save_atomic(self._path(self._dates_file), dates)
+            self._columns, self._maps = columns, {}
+            self.generation, self._size = generation, len(dates)
+            self._load_dates()
+            _log.debug('Extended date axis of {} to {} dates'.format(self.directory, len(dates)))
+        rows = np.searchsorted(dates, new_dates)
+        for column in df.columns:
+            filename = self._columns[column][0] if column in self._columns else self._new_file(self.generation)
+            values = np.full(len(dates), np.nan)
+            values[rows] = df[column].to_numpy(dtype=float)
+            _save_atomic(self._path(filename), values)
+            self._columns[column] = [filename, len(dates), time.time()]
+            self._maps.pop(column, None)
+        self.meta.update(meta or {})
+        self._commit()
+        _log.debug('Wrote {} columns to {}'.format(len(df.columns), self.directory))
+
+    def update(self, df: pd.DataFrame, meta: dict = None) -> None:
+        """
+        Write the rows of df into the series of this store. Values of df replace those on the same dates,
+        other values of the series stay. Series that are not in df are not touched.
+
+        Dates of df after the last date of the store are appended to the date axis. Rows after the end of a
+        series are appended in place to its file, so an update of the last days costs those days, whatever the
+        length of the store. Rows of the manifest are never overwritten: a series of which df changes stored
+        values is written to a new file, named in the manifest once it is written. Only if df brings a date
+        before the last date that is not on the date axis, the series are rewritten, see `write`.
+
+        :param df: DataFrame with a date index and columns of this store
+        :param meta: items to set in `meta` with the manifest, default None
+        :return: None
+        """
+        unknown = [c for c in df.columns if c not in self._columns]
+        if unknown:
+            raise ValueError('Cannot update unknown columns {}, write them first'.format(unknown))
+        df = df.sort_index()
+        new_dates = pd.DatetimeIndex(pd.to_datetime(df.index)).asi8
+        if len(new_dates) == 0:
+            return
+        dates = np.asarray(self._dates)
+        n_old = int(np.searchsorted(new_dates, dates[-1], side='right')) if len(dates) > 0 else 0
+        positions = np.searchsorted(dates, new_dates[:n_old])
+        if not np.array_equal(dates[np.minimum(positions, len(dates) - 1)], new_dates[:n_old]):
+            _log.debug('Dates of {} not on the date axis, rewriting {}'.format(self.directory, list(df.columns)))
+            dfo = self.rows(columns=list(df.columns))
+            self.write(pd.concat([dfo.drop(df.index, errors='ignore'), df]), meta)
+            return
+        size = len(dates) + len(new_dates) - n_old
+        positions = np.concatenate([positions, np.arange(len(dates), size)])
+        first = int(positions[0])
+        generation = self.generation
+        for column in df.columns:
+            filename, rows, _ = self._columns[column]
+            start = min(first, rows)
+            values = self._values(column, start, size)
+            values[positions - start] = df[column].to_numpy(dtype=float)
+            if np.array_equal(values[:rows - start], self._values(column, start, rows), equal_nan=True):
+                if size > rows:
+                    # after the rows of the manifest, an interrupted append is not read
+                    _write_rows(self._path(filename), rows, values[rows - start:])
+                    self._columns[column] = [filename, size, time.time()]
+                    self._maps.pop(column, None)
+                continue
+            generation = self.generation + 1
+            filename = self._new_file(generation)
+            _save_atomic(self._path(filename), np.concatenate([self._values(column, 0, start), values]))
+            self._columns[column] = [filename, size, time.time()]
+            self._maps.pop(column, None)
+        self.generation = generation
+        if size > len(dates):
+            _write_rows(self._path(self._dates_file), len(dates), new_dates[n_old:])
+            self._size = size
+            self._load_dates()
+        self.meta.update(meta or {})
+        self._commit()
+        _log.debug('Updated {} rows of {} columns in {}'.format(len(df), len(df.columns), self.directory))
+
+    def append(self, df: pd.DataFrame) -> None:
+        """
+        Append rows to the series of this store. The dates of df must be after the last date of the store.
+        Series that are not in df get NaN for the new dates. See `update`.
+
+        :param df: DataFrame with a date index and columns of this store
+        :return: None
+        """
+        unknown = [c for c in df.columns if c not in self._columns]
+        if unknown:
+            raise ValueError('Cannot append unknown columns {}'.format(unknown))
+        df = df.sort_index()
+        new_dates = pd.DatetimeIndex(pd.to_datetime(df.index)).asi8
+        if len(new_dates) == 0:
+            return
+        if len(self._dates) > 0 and new_dates[0] <= self._dates[-1]:
+            raise ValueError('Cannot append {}, not after last date {}'
+                             .format(pd.Timestamp(new_dates[0]), pd.Timestamp(int(self._dates[-1]))))
+        self.update(df)
+        _log.debug('Appended {} rows to {}'.format(len(df), self.directory))
@@ -2,20 +2,33 @@
 # -*- coding: utf-8 -*-
 
 """ Classes and methods to do styling with pandas DataFrames on Jupyter NoteBooks. """
+from __future__ import annotations
+
+import copy
 import csv
 import datetime
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from io import StringIO
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 import logging, sys
 
-__all__ = ['color_negative_red', 'c_format', 'p_format', 'currency', 'percentage',
-           'start_logging', 'end_logging', 'start_file_logging', 'end_file_logging', 'debug', 'info']
+from fintec._lazy import display, lazy_module
+
+widgets = lazy_module('ipywidgets')
+
+__all__ = ['color_negative_red', 'c_format', 'p_format', 'currency', 'percentage', 'display_paged',
+           'start_logging', 'end_logging', 'start_file_logging', 'end_file_logging', 'debug', 'info',
+           'LOG_COLUMNS', 'log_files', 'iter_log', 'read_log']
 
 _log = logging.getLogger(__name__)
 __STDOUT_LOG_CHANNEL__ = None
 __FILE_LOG_CHANNEL__ = None
+__FILE_LOG_LISTENER__ = None
 
 
 def start_logging(level=logging.DEBUG):
@@ -80,29 +93,73 @@ def info(func, *args, **kwargs):
 
 
 class CsvFormatter(logging.Formatter):
+    """
+    Formats records as a csv line. Every thread writes to its own buffer, so one formatter can be shared by
+    handlers that format on different threads.
+    """
 
     def __init__(self):
         super().__init__()
-        self.output = StringIO()
-        self.writer = csv.writer(self.output, quoting=csv.QUOTE_ALL)
+        self._local = threading.local()
+
+    def _writer(self):
+        if not hasattr(self._local, 'writer'):
+            self._local.output = StringIO()
+            self._local.writer = csv.writer(self._local.output, quoting=csv.QUOTE_ALL)
+        return self._local.output, self._local.writer
 
     def format(self, record):
+        output, writer = self._writer()
         time = datetime.datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S.%f')
-        self.writer.writerow([time, record.threadName, record.process, record.levelname, record.filename,
-                              record.lineno, record.funcName, record.msg, record.pathname])
-        data = self.output.getvalue()
-        self.output.truncate(0)
-        self.output.seek(0)
+        writer.writerow([time, record.threadName, record.process, record.levelname, record.filename,
+                         record.lineno, record.funcName, record.msg, record.pathname])
+        data = output.getvalue()
+        output.truncate(0)
+        output.seek(0)
         return data.strip()
 
 
+class BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler for a bounded queue. If the queue is full, a record either waits for room (block) or is
+    dropped and counted in `dropped`. Records are queued unformatted, the handlers of the listener thread
+    format them.
+    """
+
+    def __init__(self, log_queue: queue.Queue, block: bool = True):
+        super().__init__(log_queue)
+        self.block = block
+        self.dropped = 0
+
+    def prepare(self, record):
+        # the listener runs in this process, so unlike QueueHandler.prepare the record needs no pickling and
+        # keeps its msg and args, and the csv lines are the same as without background
+        return copy.copy(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put(record, block=self.block)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _BoundedQueueListener(QueueListener):
+    """ QueueListener that waits for room on a full bounded queue to put its stop sentinel. """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
 def start_file_logging(log_file='logs/pyu.log', level=logging.DEBUG, max_bytes=1000 * 1000 * 1024,
-                          backup_count=3, encoding='utf-8'):
+                          backup_count=3, encoding='utf-8', background=False, queue_size=10000, overflow='block'):
     """
-    Initiate logging to a rotating file. If needed, the log file output can be picked up in a DataFrame:
+    Initiate logging to a rotating file. With background=True, logging threads only put records on a
+    bounded queue and a listener thread formats and writes them. If the queue is full, overflow 'block'
+    waits for room and 'drop' drops the record.
+
+    The log file and its backups can be read back in a DataFrame with `read_log`:
     ```
-    names = ['date', 'thread', 'process', 'level', 'file', 'line', 'function', 'msg', 'path']
-    df = pd.read_csv('logs/pyu.log', header=None, quoting=1, converters={0: pd.to_datetime}, names=names)
+    df = read_log('logs/pyu.log', start='2019-03-01', level='INFO')
     ```
 
     :param log_file: the path or file to write to. Directories will be created.
@@ -111,39 +168,173 @@ def start_file_logging(log_file='logs/pyu.log', level=logging.DEBUG, max_bytes=1
     :param max_bytes: max bytes for roll over
     :param backup_count: how many files are kept
     :param encoding: encoding of the file
+    :param background: format and write records on a listener thread, default False
+    :param queue_size: max number of records waiting for the listener thread
+    :param overflow: 'block' or 'drop', what to do with a record when the queue is full
     :return: None
     """
-    global __FILE_LOG_CHANNEL__
+    global __FILE_LOG_CHANNEL__, __FILE_LOG_LISTENER__
+    if overflow not in ('block', 'drop'):
+        raise ValueError('overflow should be one of {}, not {}'.format(['block', 'drop'], overflow))
     if __FILE_LOG_CHANNEL__ is None:
         path = os.path.dirname(log_file)
         os.makedirs(path, exist_ok=True)
-        __FILE_LOG_CHANNEL__ = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
-                                                   encoding=encoding)
-        __FILE_LOG_CHANNEL__.setFormatter(CsvFormatter())
-        __FILE_LOG_CHANNEL__.setLevel(level)
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding)
+        file_handler.setFormatter(CsvFormatter())
+        file_handler.setLevel(level)
+        if background:
+            __FILE_LOG_CHANNEL__ = BoundedQueueHandler(queue.Queue(queue_size), block=overflow == 'block')
+            __FILE_LOG_CHANNEL__.setLevel(level)
+            __FILE_LOG_LISTENER__ = _BoundedQueueListener(__FILE_LOG_CHANNEL__.queue, file_handler,
+                                                          respect_handler_level=True)
+            __FILE_LOG_LISTENER__.start()
+        else:
+            __FILE_LOG_CHANNEL__ = file_handler
         root = logging.getLogger()
         root.setLevel(logging.DEBUG)
         root.addHandler(__FILE_LOG_CHANNEL__)
-        _log.info('Started file logging to {}'.format(__FILE_LOG_CHANNEL__.baseFilename))
+        _log.info('Started file logging to {}'.format(file_handler.baseFilename))
     else:
         _log.info('Not initiating file logging. Logging to file already established: {}'
-                     .format(__FILE_LOG_CHANNEL__.baseFilename))
+                     .format(_file_log_name()))
+
+
+def _file_log_name() -> str:
+    if __FILE_LOG_LISTENER__ is not None:
+        return __FILE_LOG_LISTENER__.handlers[0].baseFilename
+    return __FILE_LOG_CHANNEL__.baseFilename
 
 
 def end_file_logging():
     """
-    End logging to a rotating file that was started with `initiate_file_logging`.
+    End logging to a rotating file that was started with `initiate_file_logging`. In background mode the
+    records still on the queue are written before this returns.
 
     :return: None
     """
-    global __FILE_LOG_CHANNEL__
+    global __FILE_LOG_CHANNEL__, __FILE_LOG_LISTENER__
     if __FILE_LOG_CHANNEL__ is not None:
-        _log.info('End file logging to {}'.format(__FILE_LOG_CHANNEL__.baseFilename))
+        if __FILE_LOG_LISTENER__ is not None and __FILE_LOG_CHANNEL__.dropped > 0:
+            _log.warning('Dropped {} log records, the queue was full'.format(__FILE_LOG_CHANNEL__.dropped))
+        _log.info('End file logging to {}'.format(_file_log_name()))
         root = logging.getLogger()
         root.removeHandler(__FILE_LOG_CHANNEL__)
+        if __FILE_LOG_LISTENER__ is not None:
+            __FILE_LOG_LISTENER__.stop()
+            for handler in __FILE_LOG_LISTENER__.handlers:
+                handler.close()
+            __FILE_LOG_LISTENER__ = None
+        __FILE_LOG_CHANNEL__.close()
         __FILE_LOG_CHANNEL__ = None
 
 
+LOG_COLUMNS = ['date', 'thread', 'process', 'level', 'file', 'line', 'function', 'msg', 'path']
+""" The columns of the csv log files written by `start_file_logging`. """
+_LOG_CATEGORIES = ['thread', 'level', 'file', 'function', 'path']
+_LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def log_files(log_file='logs/pyu.log') -> [str]:
+    """
+    The log file and its rotated backups, oldest first: log_file.N, ..., log_file.1, log_file.
+    :param log_file: the active log file
+    :return: list of existing files
+    """
+    directory, base = os.path.split(log_file)
+    if not os.path.isdir(directory or '.'):
+        return []
+    backups = []
+    for name in os.listdir(directory or '.'):
+        suffix = name[len(base) + 1:]
+        if name.startswith(base + '.') and suffix.isdigit():
+            backups.append((int(suffix), os.path.join(directory, name)))
+    files = [filename for _, filename in sorted(backups, reverse=True)]
+    return files + [log_file] if os.path.exists(log_file) else files
+
+
+def _first_log_date(filename: str):
+    with open(filename, 'r', encoding='utf-8') as f:
+        line = f.readline()
+    return pd.to_datetime(line[1:27], format=_LOG_DATE_FORMAT, errors='coerce') if line.startswith('"') else pd.NaT
+
+
+def _level_number(level) -> int:
+    number = level if isinstance(level, int) else logging.getLevelName(str(level).upper())
+    if not isinstance(number, int):
+        raise ValueError('Unknown log level: {}'.format(level))
+    return number
+
+
+def iter_log(log_file='logs/pyu.log', start=None, end=None, level=None, chunksize=100000):
+    """
+    Stream the records of the log file and its rotated backups, oldest first, in chunks. Dates are parsed
+    per chunk with a fixed format. Backups that end before start are skipped unread and reading stops at
+    the first chunk after end.
+    :param log_file: the active log file
+    :param start: first date, default no limit
+    :param end: last date, default no limit
+    :param level: minimal level as number or name, like logging.INFO or 'INFO', default all
+    :param chunksize: number of lines per chunk
+    :return: generator of DataFrames with the columns `LOG_COLUMNS`
+    """
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+    min_level = None if level is None else _level_number(level)
+    files = log_files(log_file)
+    firsts = [_first_log_date(filename) for filename in files]
+    for i, filename in enumerate(files):
+        if end is not None and firsts[i] > end:
+            return
+        if start is not None and i + 1 < len(files) and firsts[i + 1] < start:
+            _log.debug('Skipping {}, ends before {}'.format(filename, start))
+            continue
+        with pd.read_csv(filename, header=None, names=LOG_COLUMNS, quoting=csv.QUOTE_ALL, chunksize=chunksize,
+                         encoding='utf-8', dtype={'msg': object}) as reader:
+            for chunk in reader:
+                chunk['date'] = pd.to_datetime(chunk['date'], format=_LOG_DATE_FORMAT)
+                keep = np.ones(len(chunk), dtype=bool)
+                if start is not None:
+                    keep &= (chunk['date'] >= start).to_numpy()
+                if end is not None:
+                    keep &= (chunk['date'] <= end).to_numpy()
+                if min_level is not None:
+                    codes, names = pd.factorize(chunk['level'])
+                    numbers = np.array([logging.getLevelName(name) for name in names], dtype=object)
+                    numbers = np.array([n if isinstance(n, int) else logging.NOTSET for n in numbers])
+                    keep &= numbers[codes] >= min_level
+                if keep.any():
+                    yield chunk[keep]
+                if end is not None and len(chunk) > 0 and chunk['date'].iloc[-1] > end:
+                    return
+
+
+def read_log(log_file='logs/pyu.log', start=None, end=None, level=None, chunksize=100000) -> pd.DataFrame:
+    """
+    Read the log file and its rotated backups into one DataFrame, see `iter_log`. The columns 'thread', 'level',
+    'file', 'function' and 'path' are categorical.
+    ```
+    df = read_log('logs/pyu.log', start='2019-03-01', level='WARNING')
+    ```
+    :param log_file: the active log file
+    :param start: first date, default no limit
+    :param end: last date, default no limit
+    :param level: minimal level as number or name, like logging.INFO or 'INFO', default all
+    :param chunksize: number of lines per chunk
+    :return: DataFrame with the columns `LOG_COLUMNS`
+    """
+    chunks = []
+    for chunk in iter_log(log_file, start, end, level, chunksize):
+        chunks.append(chunk.astype({column: 'category' for column in _LOG_CATEGORIES}))
+    if not chunks:
+        df = pd.DataFrame({column: pd.Series(dtype=object) for column in LOG_COLUMNS})
+        return df.astype({'date': 'datetime64[ns]', 'process': np.int64, 'line': np.int64,
+                          **{column: 'category' for column in _LOG_CATEGORIES}})
+    df = pd.concat([chunk.drop(columns=_LOG_CATEGORIES) for chunk in chunks], ignore_index=True)
+    for column in _LOG_CATEGORIES:
+        df[column] = union_categoricals([chunk[column] for chunk in chunks])
+    return df[LOG_COLUMNS]
+
+
 def color_negative_red(val) -> str:
     """
     Takes a scalar and returns a string with the css property `'color: red'` for negative
@@ -173,6 +364,12 @@ def _eu_format(number_string: str) -> str:
     return number_string.replace(',', 'x').replace('.', ',').replace('x', '.')
 
 
+_EU_TABLE = str.maketrans(',.', '.,')
+# css per cell class of the vectorized stylers, same colors as `color_negative_red` and `highlight_max`
+_CSS_CLASSES = {'nan': 'color: grey;', 'neg': 'color: red;', 'pos': 'color: blue;',
+                'max': 'background-color: yellow;'}
+
+
 def c_format(x, decimals=0) -> str:
     """
     Returns a european style formatted string of x.
@@ -197,28 +394,134 @@ def p_format(x, decimals=2) -> str:
     return _eu_format(f.format(x * 100))
 
 
-def currency(df: pd.DataFrame, decimals=0):
+def _format_column(s: pd.Series, pattern: str, factor: float = 1) -> pd.Series:
+    """
+    Format a numeric column european style, the same strings as `c_format` and `p_format`. The numbers are
+    still formatted one `str.format` call per value; only swapping the separators and the missing values
+    are done on the whole column. numpy string operations on the whole column measured several times slower.
+    :param s: the column
+    :param pattern: format pattern with thousands separator, like '{:,.2f}'
+    :param factor: factor to multiply the values with before formatting
+    :return: Series of formatted strings, '---' for missing values
+    """
+    values = s.astype(float) * factor
+    return values.map(pattern.format).str.translate(_EU_TABLE).where(values.notna(), '---')
+
+
+def _css_classes(values: np.ndarray, highlight_max: bool = False) -> np.ndarray:
+    """
+    The cell classes of the vectorized stylers: 'nan', 'neg' or 'pos' like `color_negative_red` and
+    'max' for the maximum of each row like `highlight_max`.
+    :param values: 2-dimensional float array
+    :param highlight_max: add 'max' to the maximum of each row
+    :return: array of class names with the shape of values
+    """
+    classes = np.where(np.isnan(values), 'nan', np.where(values < 0, 'neg', 'pos')).astype(object)
+    if highlight_max:
+        row_max = pd.DataFrame(values).max(axis=1).to_numpy()
+        classes = np.where(values == row_max[:, None], classes + ' max', classes)
+    return classes
+
+
+def _vectorized_style(df: pd.DataFrame, pattern: str, factor: float = 1, highlight: bool = False):
+    index = df.index.strftime("%Y-%m-%d")
+    text = pd.DataFrame({i: _format_column(df.iloc[:, i], pattern, factor) for i in range(df.shape[1])})
+    text.index, text.columns = index, df.columns
+    classes = pd.DataFrame(_css_classes(df.to_numpy(dtype=float), highlight), index=index, columns=df.columns)
+    return text.style.set_td_classes(classes) \
+        .set_table_styles([{'selector': 'td.{}'.format(name), 'props': props} for name, props in _CSS_CLASSES.items()])
+
+
+def currency(df: pd.DataFrame, decimals=0, vectorized=False):
     """
     Given a DataFrame with datetime index returns a pandas.io.formats.style.Styler object
     with european formatting and y-m-d for datetime index.
+
+    By default every cell is formatted with `c_format` and colored with `color_negative_red`, and the data of
+    the styler stays numeric. The vectorized styler, for large frames, formats the data up front and colors
+    cells with a few css classes instead of css per cell. Its data holds the formatted strings, so it does not
+    chain with numeric Styler methods like `bar` or `highlight_max`.
     :param df: DataFrame to convert
     :param decimals: number of decimals to show
+    :param vectorized: format up front and color with css classes, default False
     :return: new formatted DataFrame
     """
+    if vectorized:
+        return _vectorized_style(df, '{{:,.{0}f}}'.format(decimals))
     return pd.DataFrame(df, index=df.index.strftime("%Y-%m-%d")).style \
         .format(lambda x: c_format(x, decimals)) \
         .applymap(color_negative_red)
 
 
-def percentage(df: pd.DataFrame, decimals=2):
+def percentage(df: pd.DataFrame, decimals=2, vectorized=False):
     """
     Given a DataFrame with datetime index returns a pandas.io.formats.style.Styler object
-    with european formatted percentages and y-m-d for datetime index.
+    with european formatted percentages and y-m-d for datetime index. See `currency` for vectorized.
     :param df: DataFrame to convert
     :param decimals: number of decimals to show
+    :param vectorized: format up front and color with css classes, default False
     :return: new formatted DataFrame
     """
+    if vectorized:
+        return _vectorized_style(df, '{{:,.{0}f}}%'.format(decimals), factor=100, highlight=True)
     return pd.DataFrame(df, index=df.index.strftime("%Y-%m-%d")).style \
         .format(lambda x: p_format(x, decimals)) \
         .applymap(color_negative_red) \
         .apply(highlight_max, axis=1)
+
+
+def display_paged(df: pd.DataFrame, styler=currency, page_size: int = 50, start: int = 0, **kwargs) -> widgets.VBox:
+    """
+    Display a large DataFrame one window of rows at a time. Only the visible rows are styled and sent to the
+    notebook, so showing a window costs the same for a frame of a hundred rows or a million. Scroll through
+    the rows with the slider or page with the buttons.
+    ```
+    display_paged(df, percentage, page_size=100, decimals=1)
+    ```
+    :param df: DataFrame with datetime index
+    :param styler: function that styles the visible rows, default `currency`
+    :param page_size: number of visible rows
+    :param start: first visible row, negative counts from the end
+    :param kwargs: named arguments for styler, like decimals
+    :return: the displayed widget
+    """
+    rows = len(df)
+    last_start = max(0, rows - page_size)
+    start = min(max(0, rows + start if start < 0 else start), last_start)
+    ia_start = widgets.IntSlider(
+        value=start,
+        min=0,
+        max=last_start,
+        step=1,
+        description='Row:',
+        continuous_update=False,
+        readout=True,
+        readout_format='d'
+    )
+    b_first = widgets.Button(description='<<', layout=widgets.Layout(width='40px'))
+    b_previous = widgets.Button(description='<', layout=widgets.Layout(width='40px'))
+    b_next = widgets.Button(description='>', layout=widgets.Layout(width='40px'))
+    b_last = widgets.Button(description='>>', layout=widgets.Layout(width='40px'))
+    label = widgets.Label()
+    out = widgets.Output()
+
+    def show(change=None):
+        first = ia_start.value
+        stop = min(first + page_size, rows)
+        label.value = 'rows {:,}-{:,} of {:,}'.format(min(first + 1, stop), stop, rows)
+        with out:
+            out.clear_output(wait=True)
+            display(styler(df.iloc[first:stop], **kwargs))
+
+    def move(to):
+        ia_start.value = min(max(0, to), last_start)
+
+    b_first.on_click(lambda b: move(0))
+    b_previous.on_click(lambda b: move(ia_start.value - page_size))
+    b_next.on_click(lambda b: move(ia_start.value + page_size))
+    b_last.on_click(lambda b: move(last_start))
+    ia_start.observe(show, names='value')
+    show()
+    ui = widgets.VBox([widgets.HBox([b_first, b_previous, ia_start, b_next, b_last, label]), out])
+    display(ui)
+    return ui
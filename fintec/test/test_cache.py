@@ -0,0 +1,96 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import threading
+import unittest
+import warnings
+
+import pandas as pd
+
+import fintec as ft
+from fintec import cache
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings('ignore', category=PendingDeprecationWarning)
+        warnings.filterwarnings('ignore', category=ImportWarning)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp.name, 'rates.csv')
+        with open(self.filename, 'w') as f:
+            f.write('datum,a,b\n2019-01-03,3.0,30.0\n2019-01-01,1.0,\n2019-01-02,,20.0\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cache_roundtrip(self):
+        df1 = ft.data._read_date_indexed_data(self.filename)
+        self.assertEqual(1, len(os.listdir(os.path.join(self.tmp.name, '.cache'))))
+        df2 = ft.data._read_date_indexed_data(self.filename)
+        pd.testing.assert_frame_equal(df1, df2)
+        df3 = ft.data._read_date_indexed_data(self.filename, cache=False)
+        pd.testing.assert_frame_equal(df3, df2)
+
+    def test_cache_hit(self):
+        key_args = (0, 0, None, None)
+        ft.data._read_date_indexed_data(self.filename)
+        self.assertIsNotNone(cache.load(self.filename, key_args))
+        self.assertIsNone(cache.load(self.filename, (0, 0, {'a': float}, None)))
+
+    def test_cache_window(self):
+        df = ft.data._read_date_indexed_data(self.filename)
+        for start, end, previous in (('2019-01-02', None, False), (None, '2019-01-02', False),
+                                     ('2019-01-02', '2019-01-02', True), ('2019-02-01', None, False)):
+            window = ft.data._window(start, end, previous)
+            expected = df.iloc[window(df.index.asi8)]
+            pd.testing.assert_frame_equal(expected, cache.load(self.filename, (0, 0, None, None), window))
+            pd.testing.assert_frame_equal(expected, ft.data._read_date_indexed_data(self.filename, window=window))
+            pd.testing.assert_frame_equal(expected, ft.data._read_date_indexed_data(self.filename, cache=False,
+                                                                                    window=window))
+        self.assertEqual(2, len(ft.data._read_date_indexed_data(self.filename, window=ft.data._window(
+            '2019-01-01', '2019-01-02'))))
+
+    def test_cache_truncated(self):
+        df = ft.data._read_date_indexed_data(self.filename)
+        cache_file = cache._cache_file(self.filename, (0, 0, None, None))
+        for size in (os.path.getsize(cache_file) // 2, 10, 0):
+            with open(cache_file, 'r+b') as f:
+                f.truncate(size)
+            with self.assertLogs('fintec.cache', level='WARNING'):
+                pd.testing.assert_frame_equal(df, ft.data._read_date_indexed_data(self.filename))
+            pd.testing.assert_frame_equal(df, cache.load(self.filename, (0, 0, None, None)))
+
+    def test_cache_store_threads(self):
+        df = ft.data._read_date_indexed_data(self.filename, cache=False)
+        stamp = cache._source_stamp(self.filename)
+        threads = [threading.Thread(target=cache.store, args=(self.filename, ('threads',), df, stamp))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        pd.testing.assert_frame_equal(df, cache.load(self.filename, ('threads',)))
+        self.assertListEqual([], [f for f in os.listdir(os.path.join(self.tmp.name, '.cache')) if f.endswith('.tmp')])
+
+    def test_cache_invalidated_on_change(self):
+        df1 = ft.data._read_date_indexed_data(self.filename)
+        with open(self.filename, 'a') as f:
+            f.write('2019-01-04,4.0,40.0\n')
+        df2 = ft.data._read_date_indexed_data(self.filename)
+        self.assertEqual(len(df1) + 1, len(df2))
+        self.assertEqual(4.0, df2.a['2019-01-04'])
+
+    def test_cache_disabled(self):
+        os.environ[ft.U_FIN_CACHE] = '0'
+        try:
+            ft.data._read_date_indexed_data(self.filename)
+        finally:
+            del os.environ[ft.U_FIN_CACHE]
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, '.cache')))
+
+    def test_clear_cache(self):
+        ft.data._read_date_indexed_data(self.filename)
+        self.assertEqual(1, ft.clear_cache(self.tmp.name))
+        self.assertEqual(0, ft.clear_cache(self.tmp.name))
@@ -1,8 +1,10 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
+import tempfile
 import unittest
 import warnings
 
+import numpy as np
 import pandas as pd
 
 import fintec as ft
@@ -101,8 +103,202 @@ class TestValueFrame(unittest.TestCase):
         self.assertEqual(df.DOW['2019-01-18'], df.DOW['2019-01-21'])
         # print(df)
 
+    def test_store_backed(self):
+        vf = ft.ValueFrame(ft.df_indices([ft.Idx.AEX, ft.Idx.DOW]))
+        with tempfile.TemporaryDirectory() as tmp:
+            vfs = ft.ValueFrame(ft.df_indices([ft.Idx.AEX, ft.Idx.DOW]), store=tmp)
+            pd.testing.assert_frame_equal(vf.df, vfs.df, check_names=False)
+            self.assertEqual(vf.first_index(), vfs.first_index())
+            self.assertEqual(vf.last_index(), vfs.last_index())
+            pd.testing.assert_frame_equal(vf.rel_change(), vfs.rel_change(), check_names=False)
+            df = vfs.rel_change('2019-02-01', '2019-02-15', columns=['DOW'])
+            pd.testing.assert_frame_equal(vf.rel_change('2019-02-01', '2019-02-15')[['DOW']], df, check_names=False)
+            pd.testing.assert_frame_equal(vf.tail_abs(), vfs.tail_abs(), check_names=False)
+
+    def test_cache(self):
+        vf = ft.ValueFrame(ft.df_indices([ft.Idx.AEX, ft.Idx.DOW]), cache_size=2)
+        df1 = vf.rel_change('2019-01-10')
+        df1.iloc[1] = 42
+        df2 = vf.rel_change(pd.Timestamp('2019-01-10'))
+        self.assertEqual(1, vf.cache.hits)
+        self.assertEqual(1, vf.cache.misses)
+        self.assertNotEqual(42, df2.iloc[1, 0])
+        vf.abs_change('2019-01-10')
+        vf.abs_change('2019-01-11')
+        self.assertEqual(2, len(vf.cache))
+        vf.rel_change('2019-01-10')
+        self.assertDictEqual({'hits': 1, 'misses': 4, 'size': 2, 'maxsize': 2}, vf.cache.info())
+        vf.merge(ft.df_indices(ft.Idx.AEX, col='open').rename(columns={'AEX': 'AEX_open'}))
+        self.assertEqual(0, len(vf.cache))
+        self.assertListEqual(['AEX', 'DOW', 'AEX_open'], list(vf.rel_change('2019-01-10').columns))
+
+    def test_window_changes(self):
+        vf = ft.ValueFrame(ft.df_indices([ft.Idx.AEX, ft.Idx.DOW]))
+        windows = [('2019-01-05', '2019-02-10'), (None, None), ('2019-01-10', '2019-01-21'),
+                   ('2019-01-21', '2019-01-25'), ('2019-02-01', '2019-02-01')]
+        for relative, batch in ((True, vf.rel_change), (False, vf.abs_change)):
+            df = vf.window_changes(windows, relative=relative)
+            self.assertListEqual(['start', 'end'], list(df.index.names))
+            self.assertListEqual(['AEX', 'DOW'], list(df.columns))
+            for i, (start, end) in enumerate(windows):
+                np.testing.assert_allclose(batch(start, end).iloc[-1].values, df.iloc[i].values)
+        df = vf.window_changes(ft.period_windows('2019-03-01', ('1M', 'YTD')), columns=['DOW'])
+        self.assertListEqual(['1M', 'YTD'], list(df.index))
+        self.assertAlmostEqual(vf.rel_change('2019-01-01', '2019-03-01').DOW.iloc[-1], df.DOW['YTD'])
+
+    def test_assign_df(self):
+        vf = ft.ValueFrame(ft.df_indices([ft.Idx.AEX, ft.Idx.DOW]))
+        before = vf.rel_change('2019-01-10')
+        version = vf.version
+        vf.tracker('2019-01-10')
+        vf.df = vf.df[['AEX']] * 2
+        self.assertEqual(version + 1, vf.version)
+        self.assertEqual(0, len(vf.cache))
+        self.assertListEqual(['AEX'], vf.columns)
+        pd.testing.assert_frame_equal(before[['AEX']], vf.rel_change('2019-01-10'))
+        pd.testing.assert_frame_equal(before[['AEX']], vf.tracker('2019-01-10').rel_change(),
+                                      check_freq=False, check_names=False)
+        with tempfile.TemporaryDirectory() as tmp:
+            vfs = ft.ValueFrame(vf.df, store=tmp)
+            with self.assertRaises(AttributeError):
+                vfs.df = vf.df
+
+    def test_window_changes_reversed(self):
+        vf = ft.ValueFrame(ft.df_indices([ft.Idx.AEX, ft.Idx.DOW]))
+        windows = {'reversed': ('2019-02-10', '2019-01-05'), 'month': ('2019-01-10', '2019-02-10')}
+        for relative in (True, False):
+            df = vf.window_changes(windows, relative=relative)
+            self.assertTrue(df.loc['reversed'].isna().all())
+            self.assertTrue(vf.window_changes([('2019-02-10', '2019-01-05')], relative=relative).isna().all(None))
+            np.testing.assert_allclose(vf.rel_change('2019-01-10', '2019-02-10').iloc[-1].values if relative
+                                       else vf.abs_change('2019-01-10', '2019-02-10').iloc[-1].values,
+                                       df.loc['month'].values)
+
+    def test_period_windows(self):
+        windows = ft.period_windows('2019-03-15', ('2W', '1M', 'YTD', '1Y'))
+        self.assertEqual(pd.Timestamp('2019-03-01'), windows['2W'][0])
+        self.assertEqual(pd.Timestamp('2019-02-15'), windows['1M'][0])
+        self.assertEqual(pd.Timestamp('2019-01-01'), windows['YTD'][0])
+        self.assertEqual(pd.Timestamp('2018-03-15'), windows['1Y'][0])
+        with self.assertRaises(ValueError):
+            ft.period_windows(periods=['1Q'])
+
+    def test_figure_rel_change(self):
+        index = pd.bdate_range('1990-01-01', periods=8000, name='Date')
+        rng = np.random.default_rng(3)
+        vf = ft.ValueFrame(pd.DataFrame({'A': 100 + rng.standard_normal(8000).cumsum(),
+                                         'B': 200 + rng.standard_normal(8000).cumsum()}, index=index))
+        for downsampling in ('minmax', 'lttb'):
+            fig = vf.figure_rel_change(start='1990-01-01', width=500, downsampling=downsampling, webgl=True)
+            self.assertEqual(2, len(fig.data))
+            for trace, column in zip(fig.data, ['A', 'B']):
+                self.assertEqual('scattergl', trace.type)
+                self.assertLessEqual(len(trace.y), 1000)
+                if downsampling == 'minmax':
+                    self.assertEqual(vf.rel_change('1990-01-01')[column].max(), max(trace.y))
+        fig = vf.figure_rel_change(start='1990-01-01', downsampling=None)
+        self.assertEqual('scatter', fig.data[0].type)
+        self.assertEqual(8000, len(fig.data[0].y))
+
+    def test_downsample(self):
+        rng = np.random.default_rng(5)
+        s = pd.Series(rng.standard_normal(10000).cumsum(), index=pd.date_range('1980-01-01', periods=10000))
+        s.iloc[100:120] = np.nan
+        for method in ('minmax', 'lttb'):
+            ds = ft.downsample(s, 400, method)
+            self.assertLessEqual(len(ds), 400)
+            self.assertTrue(ds.index.is_monotonic_increasing)
+            self.assertEqual(s.index[0], ds.index[0])
+            self.assertEqual(s.index[-1], ds.index[-1])
+            pd.testing.assert_series_equal(s.dropna().loc[ds.index], ds)
+        ds = ft.downsample(s, 400, 'minmax')
+        self.assertEqual(s.max(), ds.max())
+        self.assertEqual(s.min(), ds.min())
+        pd.testing.assert_series_equal(s.head(50).dropna(), ft.downsample(s.head(50), 400))
+        with self.assertRaises(ValueError):
+            ft.downsample(s, 400, 'every_nth')
+
     def test_display_rel_change(self):
         vf = ft.ValueFrame(ft.df_indices([ft.Idx.AEX, ft.Idx.DOW]))
         vf.display_rel_change()
 
+    def test_display_tail_abs(self):
+        vf = ft.ValueFrame(ft.df_indices([ft.Idx.AEX, ft.Idx.DOW]))
+        vf.display_tail_abs()
+        vf.display_tail_abs(tail=30, page_size=10)
 
+
+class TestChangeTracker(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings('ignore', category=PendingDeprecationWarning)
+        warnings.filterwarnings('ignore', category=ImportWarning)
+
+    @staticmethod
+    def random_frame(rng: np.random.Generator, rows: int) -> pd.DataFrame:
+        dates = pd.bdate_range('2000-01-03', periods=rows)
+        values = 100 + rng.standard_normal((rows, 4)).cumsum(axis=0)
+        values[rng.uniform(size=values.shape) < rng.uniform(0, 0.6)] = np.nan
+        values[:rng.integers(0, rows), 1] = np.nan
+        values[rng.integers(0, rows):, 2] = np.nan
+        return pd.DataFrame(values, index=dates, columns=['a', 'b', 'c', 'd'])
+
+    def assert_same(self, vf: ft.ValueFrame, tracker: ft.ChangeTracker, start):
+        pd.testing.assert_frame_equal(vf.abs_change(start), tracker.abs_change(), check_freq=False, check_exact=True)
+        pd.testing.assert_frame_equal(vf.rel_change(start), tracker.rel_change(), check_freq=False, check_exact=True)
+        pd.testing.assert_frame_equal(vf.abs_daily_change(start), tracker.abs_daily_change(), check_freq=False,
+                                      check_exact=True)
+        pd.testing.assert_frame_equal(vf.rel_daily_change(start), tracker.rel_daily_change(), check_freq=False,
+                                      check_exact=True)
+
+    def test_identical_to_batch(self):
+        rng = np.random.default_rng(20190210)
+        for _ in range(40):
+            df = self.random_frame(rng, int(rng.integers(4, 60)))
+            cuts = sorted(set(rng.integers(1, len(df), size=3)))
+            vf = ft.ValueFrame(df.iloc[:cuts[0]])
+            start = df.index[int(rng.integers(0, cuts[0]))]
+            self.assert_same(vf, vf.tracker(start), start)
+            for begin, end in zip(cuts, cuts[1:] + [len(df)]):
+                vf.append(df.iloc[begin:end])
+                self.assert_same(vf, vf.tracker(start), start)
+            self.assertEqual(1, len(vf._trackers))
+
+    def test_stream_changes(self):
+        rng = np.random.default_rng(20190211)
+        for _ in range(40):
+            df = self.random_frame(rng, int(rng.integers(4, 60)))
+            cuts = [0] + sorted(set(rng.integers(1, len(df), size=3))) + [len(df)]
+            chunks = [df.iloc[begin:end] for begin, end in zip(cuts, cuts[1:])]
+            vf = ft.ValueFrame(df)
+            pd.testing.assert_frame_equal(vf.abs_change(), pd.concat(ft.stream_abs_change(iter(chunks))),
+                                          check_freq=False, check_exact=True)
+            pd.testing.assert_frame_equal(vf.rel_change(), pd.concat(ft.stream_rel_change(iter(chunks))),
+                                          check_freq=False, check_exact=True)
+
+    def test_stream_changes_bounded(self):
+        df = pd.DataFrame({'a': np.arange(1.0, 101.0), 'b': np.arange(1.0, 101.0)},
+                          index=pd.bdate_range('2000-01-03', periods=100))
+        df.iloc[10:40, 1] = np.nan
+        chunks = [df.iloc[i:i + 5] for i in range(0, len(df), 5)]
+        sizes = [len(dfc) for dfc in ft.stream_abs_change(chunks)]
+        self.assertEqual(100, sum(sizes))
+        self.assertEqual(35, max(sizes))
+        dfs = pd.concat(ft.stream_abs_change(chunks, max_pending=10))
+        # the first row and the gap, that is not filled after 10 missing rows
+        self.assertEqual(31, dfs.b.isna().sum())
+        self.assertEqual(99.0, dfs.b.iloc[-1])
+
+    def test_append(self):
+        vf = ft.ValueFrame(ft.df_indices([ft.Idx.AEX, ft.Idx.DOW]))
+        tracker = vf.tracker('2019-02-01')
+        rows = tracker.rows
+        vf.append(pd.DataFrame({'AEX': [540.0]}, index=pd.to_datetime(['2019-03-04'])))
+        self.assertEqual(rows + 1, vf.tracker('2019-02-01').rows)
+        self.assertTrue(np.isnan(vf.df.DOW['2019-03-04']))
+        with self.assertRaises(ValueError):
+            vf.append(pd.DataFrame({'AEX': [540.0]}, index=pd.to_datetime(['2019-03-01'])))
+        with self.assertRaises(ValueError):
+            vf.append(pd.DataFrame({'SPX': [2800.0]}, index=pd.to_datetime(['2019-03-05'])))
+        vf.merge(ft.df_indices(ft.Idx.AEX, col='open').rename(columns={'AEX': 'AEX_open'}))
+        self.assertEqual(0, len(vf._trackers))
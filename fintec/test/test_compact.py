@@ -0,0 +1,59 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import fintec as ft
+
+
+class TestCompact(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings('ignore', category=PendingDeprecationWarning)
+        warnings.filterwarnings('ignore', category=ImportWarning)
+
+    def test_df_index(self):
+        df = ft.df_index(ft.Idx.AEX)
+        dfc = ft.df_index(ft.Idx.AEX, compact=True)
+        self.assertListEqual(['float32'] * 4 + ['int32', 'float64'], [str(dt) for dt in dfc.dtypes])
+        pd.testing.assert_frame_equal(df, ft.dense_frame(dfc), check_exact=True)
+
+    def test_compact_frame(self):
+        dates = pd.bdate_range('2019-01-01', periods=10)
+        df = pd.DataFrame({'price': np.linspace(100, 109.99, 10).round(2), 'volume': np.arange(10.0) * 1e6,
+                           'missing': np.where(np.arange(10) < 8, np.nan, 1.25),
+                           'precise': np.linspace(0, 1, 10)}, index=dates)
+        df.loc[dates[3], 'volume'] = np.nan
+        dfc = ft.compact_frame(df)
+        self.assertListEqual(['float32', 'Int32', 'Sparse[float32, nan]', 'float64'], [str(dt) for dt in dfc.dtypes])
+        pd.testing.assert_frame_equal(df, ft.dense_frame(dfc), check_exact=True, check_freq=False)
+        self.assertEqual('float32', str(ft.compact_frame(df, sparse=0.9).missing.dtype))
+        self.assertIs(df, ft.dense_frame(df))
+
+    def test_memory_report(self):
+        df = ft.df_index(ft.Idx.AEX)
+        report = ft.memory_report(df)
+        self.assertListEqual(['Index'] + list(df.columns) + ['total'], list(report.index))
+        self.assertEqual(df.memory_usage(deep=True).sum(), report.at['total', 'bytes'])
+        self.assertEqual(0.5, report.at['close', 'saving'])
+        self.assertLess(report.at['total', 'compact bytes'], report.at['total', 'bytes'])
+
+    def test_value_frame(self):
+        rng = np.random.default_rng(20190212)
+        df = pd.DataFrame((100 + rng.standard_normal((300, 6)).cumsum(axis=0)).round(2),
+                          index=pd.bdate_range('2018-01-01', periods=300), columns=list('abcdef'))
+        df.iloc[:250, 5] = np.nan
+        vf, vfc = ft.ValueFrame(df), ft.ValueFrame(df, compact=True)
+        self.assertEqual('Sparse[float32, nan]', str(vfc.df.f.dtype))
+        for method in ('abs_change', 'rel_change', 'abs_daily_change', 'rel_daily_change'):
+            pd.testing.assert_frame_equal(getattr(vf, method)('2018-03-01'), getattr(vfc, method)('2018-03-01'),
+                                          check_exact=True)
+        row = pd.DataFrame({'a': [1.5]}, index=[df.index[-1] + pd.Timedelta(days=1)])
+        vf.append(row)
+        vfc.append(row)
+        self.assertEqual('float32', str(vfc.df.a.dtype))
+        pd.testing.assert_frame_equal(vf.df, ft.dense_frame(vfc.df), check_exact=True)
+
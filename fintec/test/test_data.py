@@ -2,7 +2,13 @@
 # -*- coding: utf-8 -*-
 
 import unittest, os, logging, sys
+import shutil
+import tempfile
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
 
 import pandas as pd
 
@@ -33,6 +39,34 @@ class TestData(unittest.TestCase):
         self.assertEqual(5, df.msuaf.isna().sum())
         self.assertEqual(3, df.rgfte.isna().sum())
 
+    def test_df_rates_window(self):
+        df = ft.df_rates()
+        pd.testing.assert_frame_equal(df.loc['2019-01-01':'2019-01-31'],
+                                      ft.df_rates(start='2019-01-01', end='2019-01-31'))
+
+    def test_iter_rates(self):
+        for filename in ('rates.csv', 'fondsen.xlsx'):
+            df = ft.df_rates(filename)
+            chunks = list(ft.iter_rates(filename, chunksize=10))
+            self.assertListEqual([10] * 8 + [6], [len(chunk) for chunk in chunks])
+            dfc = pd.concat(chunks)
+            pd.testing.assert_index_equal(df.index, dfc.index, exact=False)
+            pd.testing.assert_frame_equal(df, dfc.interpolate(method='nearest', axis=0), check_freq=False)
+            dfc = pd.concat(ft.iter_rates(filename, chunksize=10, start='2019-01-10', end='2019-02-01'))
+            pd.testing.assert_index_equal(df.loc['2019-01-10':'2019-02-01'].index, dfc.index, exact=False)
+
+    def test_iter_rates_not_sorted(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, 'rates.csv'), 'w') as f:
+                f.write('datum,a\n2019-01-02,2.0\n2019-01-03,3.0\n2019-01-01,1.0\n')
+            os.environ[ft.U_FIN_DATA_BASE] = tmp
+            try:
+                self.assertEqual(3, len(next(ft.iter_rates('rates.csv', chunksize=3))))
+                with self.assertRaises(ValueError):
+                    list(ft.iter_rates('rates.csv', chunksize=2))
+            finally:
+                del os.environ[ft.U_FIN_DATA_BASE]
+
     def test_df_rates_from_csv(self):
         df = ft.df_rates('rates.csv')
         self.assertIsInstance(df.index, pd.DatetimeIndex)
@@ -40,6 +74,40 @@ class TestData(unittest.TestCase):
         self.assertEqual(2, df.msuaf.isna().sum())
         self.assertEqual(3, df.rgfte.isna().sum())
 
+    def test_read_excel_fast_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'workbook.xlsx')
+            df = pd.DataFrame({'a': [1.5, None, 3.25, 4.0], 'b': [1, 2, 3, 4], 'c': [None, None, 2.5, None]},
+                              index=pd.date_range('2019-01-01', periods=4, name='datum'))
+            with pd.ExcelWriter(filename) as writer:
+                df.to_excel(writer, sheet_name='numbers')
+                df.assign(c=['x', None, 'n/a', 'y']).to_excel(writer, sheet_name='text')
+            for sheet_name in ('numbers', 'text', 1):
+                expected = pd.read_excel(filename, sheet_name=sheet_name, index_col=0)
+                pd.testing.assert_frame_equal(expected, ft.data._read_data(filename, sheet_name=sheet_name))
+            pd.testing.assert_frame_equal(pd.read_excel('data/fondsen.xlsx', sheet_name='koersen', index_col=0),
+                                          ft.data._read_data('data/fondsen.xlsx', sheet_name='koersen'))
+
+    def test_df_rates_sheets(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            shutil.copy(os.path.join('data', 'fondsen.xlsx'), tmp)
+            filename = os.path.join(tmp, 'fondsen.xlsx')
+            rates = pd.read_excel(filename, sheet_name='koersen', index_col=0)
+            with pd.ExcelWriter(filename, mode='a') as writer:
+                (rates * 2).to_excel(writer, sheet_name='dubbel')
+            os.environ[ft.U_FIN_DATA_BASE] = tmp
+            try:
+                sheets = ft.df_rates_sheets()
+                self.assertListEqual(['koersen', 'dubbel'], list(sheets))
+                pd.testing.assert_frame_equal(sheets['koersen'] * 2, sheets['dubbel'])
+                self.assertEqual(2, len(os.listdir(os.path.join(tmp, '.cache'))))
+                pd.testing.assert_frame_equal(sheets['koersen'], ft.df_rates())
+                pd.testing.assert_frame_equal(sheets['dubbel'], ft.df_rates_sheets(sheet_names=['dubbel'])['dubbel'])
+                self.assertEqual(2, len(os.listdir(os.path.join(tmp, '.cache'))))
+                pd.testing.assert_frame_equal(sheets['dubbel'], ft.df_rates_sheets(sheet_names=[1])[1])
+            finally:
+                del os.environ[ft.U_FIN_DATA_BASE]
+
     @unittest.SkipTest
     def test_update_index(self):
         df = ft.update_index(ft.Idx.AEX)
@@ -51,6 +119,46 @@ class TestData(unittest.TestCase):
         ft.initiate_index(ft.Idx.N225)
         self.assertFalse(os.path.exists(ft.Idx.N225.filename()))
 
+    def test_read_html_table(self):
+        page = os.path.join('data', 'pages', 'netherlands-25.html')
+        for table_index in (0, 1):
+            pd.testing.assert_frame_equal(pd.read_html(page, index_col=0)[table_index],
+                                          ft.data._read_html_table(page, table_index))
+        with open(page, encoding='utf-8') as f:
+            text = f.read()
+        pd.testing.assert_frame_equal(pd.read_html(page, index_col=0)[1],
+                                      ft.data._read_html_table(text, table_id='curr_table'))
+        self.assertRaises(ValueError, ft.data._read_html_table, page, 2)
+
+    def test_initiate_indices_processes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, 'html'))
+            os.makedirs(os.path.join(tmp, 'indices'))
+            for idx in (ft.Idx.AEX, ft.Idx.DAX):
+                shutil.copy(os.path.join('data', 'pages', 'netherlands-25.html'),
+                            os.path.join(tmp, 'html', '{}.html'.format(idx.name.lower())))
+            os.environ[ft.U_FIN_DATA_BASE] = tmp
+            try:
+                done = {}
+                ft.initiate_indices([ft.Idx.AEX, ft.Idx.DAX, ft.Idx.N225], table_index=1,
+                                    progress=lambda idx, result: done.update({idx: result}), processes=2)
+                self.assertDictEqual({ft.Idx.AEX: {'status': 'ok', 'rows': 4}, ft.Idx.DAX: {'status': 'ok', 'rows': 4},
+                                      ft.Idx.N225: {'status': 'missing', 'rows': 0}}, done)
+                dfi = pd.read_csv(ft.Idx.DAX.filename(), index_col=0, parse_dates=True)
+                self.assertEqual(pd.Timestamp('2019-03-06'), dfi.index.max())
+                self.assertFalse(os.path.exists(ft.Idx.N225.filename()))
+                # only N225 is left, no pool for a single index
+                done.clear()
+                with mock.patch('fintec.data.ProcessPoolExecutor') as pool:
+                    ft.initiate_indices([ft.Idx.AEX, ft.Idx.DAX, ft.Idx.N225], table_index=1,
+                                        progress=lambda idx, result: done.update({idx: result}), processes=2)
+                pool.assert_not_called()
+                self.assertDictEqual({ft.Idx.AEX: {'status': 'exists', 'rows': 0},
+                                      ft.Idx.DAX: {'status': 'exists', 'rows': 0},
+                                      ft.Idx.N225: {'status': 'missing', 'rows': 0}}, done)
+            finally:
+                del os.environ[ft.U_FIN_DATA_BASE]
+
     def test_df_index(self):
         df = ft.df_index(ft.Idx.AEX)
         self.assertIsInstance(df.index, pd.DatetimeIndex)
@@ -59,12 +167,41 @@ class TestData(unittest.TestCase):
         self.assertEqual(0, df.change.isna().sum())
         self.assertEqual(0, df.volume.isna().sum())
 
+    def test_parse_volume(self):
+        values = ['75.58M', '1.2K', '3B', '-', '12', '0.5M']
+        parsed = ft.data._parse_volume(pd.Series(values))
+        expected = [ft.data.__convert_volume__(v) for v in values]
+        self.assertTrue(parsed.equals(pd.Series(expected)))
+
+    def test_parse_change(self):
+        values = ['-0.27%', '2.41%', '-', '0%']
+        parsed = ft.data._parse_change(pd.Series(values))
+        expected = [ft.data.__convert_change__(v) for v in values]
+        self.assertTrue(parsed.equals(pd.Series(expected)))
+
     def test_indices(self):
         df = ft.df_indices([ft.Idx.AEX, ft.Idx.DOW], col='high')
         self.assertIsInstance(df.index, pd.DatetimeIndex)
         self.assertListEqual(list(df.columns), ['AEX', 'DOW'])
         # print(df)
 
+    def test_merge_frames(self):
+        frames = [ft.df_index(idx)[[col]].rename(columns={col: '{}_{}'.format(idx.name, col)})
+                  for idx in (ft.Idx.AEX, ft.Idx.DOW) for col in ('close', 'volume')]
+        expected = frames[0]
+        for df in frames[1:]:
+            expected = pd.merge(expected, df, how='outer', left_index=True, right_index=True)
+        pd.testing.assert_frame_equal(expected, ft.merge_frames(frames))
+
+    def test_merge_frames_fallback(self):
+        df1 = pd.DataFrame({'a': [1, 2]}, index=pd.to_datetime(['2019-01-02', '2019-01-01']))
+        df2 = pd.DataFrame({'b': ['x', 'y']}, index=pd.to_datetime(['2019-01-03', '2019-01-01']))
+        dfm = ft.merge_frames([df1, df2])
+        self.assertListEqual(list(pd.to_datetime(['2019-01-01', '2019-01-02', '2019-01-03'])), list(dfm.index))
+        self.assertEqual('y', dfm.b['2019-01-01'])
+        dfm = ft.merge_frames([df1, df1])
+        self.assertListEqual(['a_x', 'a_y'], list(dfm.columns))
+
     @unittest.SkipTest
     def test_logging_indices(self):
         ft.debug(ft.df_indices, [ft.Idx.AEX, ft.Idx.DOW], col='high')
@@ -94,4 +231,253 @@ class TestIdx(unittest.TestCase):
         self.assertIsNone(idx)
 
 
+class _StubHandler(BaseHTTPRequestHandler):
+    """ Serves saved investing.com pages from data/pages. The first request for a page fails once with status 503
+    if the page is in failures. """
+    pages = os.path.abspath(os.path.join('data', 'pages'))
+    failures = set()
+
+    def do_GET(self):
+        name = self.path.split('/')[-1].replace('-historical-data', '')
+        filename = os.path.join(self.pages, '{}.html'.format(name))
+        if name in self.failures:
+            self.failures.discard(name)
+            self.send_response(503)
+            self.end_headers()
+        elif os.path.exists(filename):
+            with open(filename, 'rb') as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestUpdateIndices(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), _StubHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        warnings.filterwarnings('ignore', category=PendingDeprecationWarning)
+        self.tmp = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmp.name, 'indices'))
+        for name in ('aex', 'dow'):
+            shutil.copy(os.path.join('data', 'indices', '{}.csv'.format(name)), os.path.join(self.tmp.name, 'indices'))
+        self.environ = dict(os.environ)
+        os.environ[ft.U_FIN_DATA_BASE] = self.tmp.name
+        os.environ[ft.U_FIN_IC_BASE] = 'http://127.0.0.1:{}'.format(self.server.server_port)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.tmp.cleanup()
+
+    def test_update_index(self):
+        df = ft.update_index(ft.Idx.AEX)
+        self.assertEqual(pd.Timestamp('2019-03-06'), df.index.max())
+        self.assertEqual(3, len(df['2019-03-02':]))
+        self.assertEqual(538.59, df.Price['2019-03-01'])
+        self.assertEqual(pd.Timestamp('2019-03-06'), ft.df_index(ft.Idx.AEX).index.max())
+
+    def test_migrate_indices(self):
+        indices = [ft.Idx.AEX, ft.Idx.DOW]
+        expected = {col: ft.df_indices(indices, col=col) for col in ('close', 'volume', 'change')}
+        store = ft.migrate_indices([ft.Idx.AEX, ft.Idx.DOW, ft.Idx.N225])
+        self.assertIn('AEX.close', store.columns)
+        self.assertNotIn('N225.close', store.columns)
+        for col, df in expected.items():
+            pd.testing.assert_frame_equal(df, ft.df_indices(indices, col=col))
+        pd.testing.assert_frame_equal(expected['close'][['AEX']], ft.df_indices(ft.Idx.AEX))
+
+    def test_df_indices_window(self):
+        indices = [ft.Idx.AEX, ft.Idx.DOW]
+        full = ft.df_indices(indices, start=None)
+        for store in (False, True):
+            if store:
+                ft.migrate_indices(indices)
+            pd.testing.assert_frame_equal(full.loc['2019-02-01':'2019-02-15'],
+                                          ft.df_indices(indices, start='2019-02-01', end='2019-02-15'))
+            # nearest to a saturday is the friday before it
+            self.assertEqual(pd.Timestamp('2019-02-22'), ft.df_indices(indices, start='2019-02-23').index[0])
+            self.assertEqual(full.index[-1], ft.df_indices(indices, start='2030-01-01').index[0])
+
+    def test_update_index_writes_store(self):
+        ft.migrate_indices()
+        ft.update_index(ft.Idx.AEX, incremental=True)
+        store = ft.SeriesStore(os.path.join(self.tmp.name, 'indices.store'))
+        self.assertEqual(538.59, store.read(['AEX.close'], start='2019-03-01', end='2019-03-01').iloc[0, 0])
+        self.assertEqual(pd.Timestamp('2019-03-06'), ft.df_indices([ft.Idx.AEX, ft.Idx.DOW]).index.max())
+
+    def test_update_index_touches_only_its_files(self):
+        ft.migrate_indices()
+        directory = os.path.join(self.tmp.name, 'indices.store')
+        files = {name: os.stat(os.path.join(directory, name)) for name in os.listdir(directory)}
+        for incremental in (True, False):
+            ft.update_index(ft.Idx.AEX, incremental=incremental)
+            store = ft.SeriesStore(directory)
+            aex = [store._columns[column][0] for column in store.columns if column.startswith('AEX.')]
+            for name, stat in files.items():
+                if name.endswith('.npy') and name not in aex and not name.startswith('dates'):
+                    self.assertEqual(stat.st_mtime_ns, os.stat(os.path.join(directory, name)).st_mtime_ns)
+                elif name.endswith('.npy'):
+                    # written in place, not replaced
+                    self.assertEqual(stat.st_ino, os.stat(os.path.join(directory, name)).st_ino)
+            expected = ft.df_index(ft.Idx.AEX).rename(columns=lambda col: 'AEX.' + col)
+            pd.testing.assert_frame_equal(expected, store.read(expected.columns).dropna(how='all'),
+                                          check_names=False, check_freq=False)
+            self.assertEqual(pd.Timestamp('2019-03-06'), ft.df_indices([ft.Idx.AEX, ft.Idx.DOW]).index.max())
+
+    def test_index_store_cached(self):
+        ft.migrate_indices()
+        store = ft.data._index_store()
+        ft.df_indices([ft.Idx.AEX, ft.Idx.DOW])
+        self.assertIs(store, ft.data._index_store())
+        # only the series that were read are mapped
+        self.assertSetEqual({'AEX.close', 'DOW.close'}, set(store._maps))
+        ft.update_index(ft.Idx.AEX, incremental=True)
+        self.assertIsNot(store, ft.data._index_store())
+        self.assertEqual(pd.Timestamp('2019-03-06'), ft.df_indices([ft.Idx.AEX, ft.Idx.DOW]).index.max())
+
+    def test_store_stale_within_timestamp(self):
+        ft.migrate_indices()
+        filename = ft.Idx.AEX.filename()
+        stat = os.stat(filename)
+        dfi = pd.read_csv(filename, index_col=0)
+        dfi['Price'] = 1.0
+        dfi.to_csv(filename)
+        # changed within the same timestamp as the store write
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        store = ft.SeriesStore(os.path.join(self.tmp.name, 'indices.store'))
+        self.assertTrue(ft.data._stale(store, ft.Idx.AEX))
+        self.assertFalse(ft.data._stale(store, ft.Idx.DOW))
+        self.assertTrue((ft.df_indices([ft.Idx.AEX, ft.Idx.DOW]).AEX.dropna() == 1.0).all())
+
+    def test_store_follows_csv(self):
+        ft.migrate_indices()
+        manifest = os.path.join(self.tmp.name, 'indices.store', 'columns.json')
+        modified = os.stat(manifest).st_mtime_ns
+        dfi = pd.read_csv(ft.Idx.AEX.filename(), index_col=0)
+        dfi['Price'] = 1.0
+        dfi.to_csv(ft.Idx.AEX.filename())
+        self.assertTrue((ft.df_indices([ft.Idx.AEX, ft.Idx.DOW]).AEX.dropna() == 1.0).all())
+        # read from the csv files, the store is not written by reading
+        self.assertEqual(modified, os.stat(manifest).st_mtime_ns)
+        # the update writes the whole index that was behind
+        ft.update_index(ft.Idx.AEX, incremental=True)
+        store = ft.SeriesStore(os.path.join(self.tmp.name, 'indices.store'))
+        self.assertFalse(ft.data._stale(store, ft.Idx.AEX))
+        self.assertTrue((store.read(['AEX.close'], end='2019-02-28').dropna() == 1.0).all(None))
+        pd.testing.assert_frame_equal(ft.df_index(ft.Idx.AEX).rename(columns=lambda col: 'AEX.' + col),
+                                      store.read().filter(like='AEX.').dropna(how='all'),
+                                      check_names=False, check_freq=False)
+
+    def test_update_index_incremental(self):
+        filename = ft.Idx.AEX.filename()
+        with open(filename, 'rb') as f:
+            original = f.read()
+        df = ft.update_index(ft.Idx.AEX, incremental=True)
+        self.assertEqual(4, len(df))
+        with open(filename, 'rb') as f:
+            incremental = f.read()
+        self.assertTrue(incremental.startswith(original))
+        with open(filename, 'wb') as f:
+            f.write(original)
+        ft.update_index(ft.Idx.AEX)
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), incremental)
+
+    def test_update_index_incremental_correction(self):
+        filename = ft.Idx.AEX.filename()
+        with open(filename, 'rb') as f:
+            original = f.read()
+        with open(filename, 'wb') as f:
+            f.write(original.replace(b'2019-03-01,538.59', b'2019-03-01,538.00'))
+            f.write(b'2019-03-04,541.5')
+        ft.update_index(ft.Idx.AEX, incremental=True)
+        df = ft.df_index(ft.Idx.AEX)
+        self.assertEqual(538.59, df.close['2019-03-01'])
+        self.assertEqual(541.58, df.close['2019-03-04'])
+        self.assertEqual(pd.Timestamp('2019-03-06'), df.index.max())
+        self.assertEqual(len(df), len(df.index.unique()))
+
+    def test_update_index_incremental_interrupted(self):
+        filename = ft.Idx.AEX.filename()
+        with open(filename, 'rb') as f:
+            original = f.read()
+        with open(filename, 'wb') as f:
+            f.write(original.replace(b'2019-03-01,538.59', b'2019-03-01,538.00'))
+        # interrupted after the truncate, before the corrected rows are written
+        with mock.patch('os.fsync', side_effect=OSError('interrupted')):
+            self.assertRaises(OSError, ft.update_index, ft.Idx.AEX, incremental=True)
+        with open(filename, 'rb') as f:
+            self.assertTrue(original.startswith(f.read()))
+        ft.update_index(ft.Idx.AEX, incremental=True)
+        df = ft.df_index(ft.Idx.AEX)
+        self.assertEqual(538.59, df.close['2019-03-01'])
+        self.assertEqual(pd.Timestamp('2019-03-06'), df.index.max())
+
+    def test_update_indices_report(self):
+        _StubHandler.failures.add(ft.Idx.AEX.ic_name)
+        report = ft.update_indices([ft.Idx.AEX, ft.Idx.DOW], max_workers=2, timeout=5, retries=2, backoff=0.01)
+        self.assertListEqual(['AEX', 'DOW'], list(report.index))
+        self.assertEqual('ok', report.status['AEX'])
+        self.assertEqual(pd.Timestamp('2019-03-06'), report['last']['AEX'])
+        self.assertEqual('error', report.status['DOW'])
+        self.assertIn('404', report.error['DOW'])
+
+    def test_update_indices_progress_and_cancel(self):
+        done = []
+        cancel = threading.Event()
+
+        def progress(idx, result):
+            done.append((idx, result['status']))
+            cancel.set()
+
+        report = ft.update_indices([ft.Idx.AEX, ft.Idx.DOW], max_workers=1, progress=progress, cancel=cancel)
+        self.assertListEqual([(ft.Idx.AEX, 'ok'), (ft.Idx.DOW, 'cancelled')], done)
+        self.assertListEqual(['ok', 'cancelled'], list(report.status))
+
+    def test_display_update_indices(self):
+        job = ft.display_update_indices([ft.Idx.AEX, ft.Idx.DOW], max_workers=2, backoff=0.01)
+        self.assertFalse(job.running())
+        report = job.start().result(timeout=60)
+        self.assertListEqual(['ok', 'error'], list(report.status))
+        self.assertEqual(2, job.progress.value)
+        self.assertEqual('done 2/2', job.label.value)
+        self.assertFalse(job.b_start.disabled)
+        logged = ''.join(output['text'] for output in job.out.outputs)
+        self.assertIn('Updated (\'AEX\'', logged)
+        self.assertIn('Could not update (\'DOW\'', logged)
+
+    def test_background_job_progress_threads(self):
+        def func(indices, progress, cancel):
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                for idx in indices:
+                    pool.submit(progress, idx, {'status': 'ok'})
+
+        job = ft.data.BackgroundJob(func, [ft.Idx.AEX] * 400, 'Run')
+        job.start().result(timeout=60)
+        self.assertEqual(400, job.progress.value)
+        self.assertEqual('done 400/400', job.label.value)
 
+    def test_update_index_retries_exhausted(self):
+        _StubHandler.failures.add(ft.Idx.AEX.ic_name)
+        with self.assertRaises(Exception) as context:
+            ft.update_index(ft.Idx.AEX, retries=0)
+        self.assertIn('503', str(context.exception))
@@ -0,0 +1,36 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import unittest
+
+import pandas as pd
+
+import fintec as ft
+
+
+class TestDateLookup(unittest.TestCase):
+
+    def setUp(self):
+        self.index = pd.to_datetime(['2019-01-01', '2019-01-03', '2019-01-05'])
+        self.lookup = ft.DateLookup(self.index)
+
+    def test_nearest(self):
+        for date in ['2018-01-01', '2019-01-02', '2019-01-03', '2019-01-04 01:00', '2020-01-01']:
+            expected = self.index.get_indexer([pd.Timestamp(date)], method='nearest')[0]
+            self.assertEqual(expected, self.lookup.position(date))
+
+    def test_before_after(self):
+        self.assertEqual(-1, self.lookup.position('2018-12-31', ft.DateLookup.BEFORE))
+        self.assertEqual(1, self.lookup.position('2019-01-04', ft.DateLookup.BEFORE))
+        self.assertEqual(1, self.lookup.position('2019-01-03', ft.DateLookup.AFTER))
+        self.assertEqual(3, self.lookup.position('2019-01-06', ft.DateLookup.AFTER))
+
+    def test_positions(self):
+        positions = self.lookup.positions(['2019-01-02', pd.Timestamp('2019-01-05')])
+        self.assertListEqual([1, 2], list(positions))
+        self.assertEqual(pd.Timestamp('2019-01-05'), self.lookup[-1])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            self.lookup.position('2019-01-01', 'somewhere')
+        with self.assertRaises(KeyError):
+            ft.DateLookup(pd.DatetimeIndex([])).position('2019-01-01')
@@ -0,0 +1,32 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+import unittest
+
+from fintec._lazy import lazy_module
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestLazy(unittest.TestCase):
+
+    def test_import_fintec_loads_core_only(self):
+        code = 'import sys, fintec; ' \
+               'print(",".join(m for m in ("plotly", "ipywidgets", "IPython", "requests", "lxml") if m in sys.modules))'
+        env = dict(os.environ, PYTHONPATH=_ROOT)
+        loaded = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+        self.assertEqual('', loaded.stdout.strip())
+
+    def test_lazy_module(self):
+        json = lazy_module('json')
+        self.assertIn('not loaded', repr(json))
+        self.assertEqual('[1]', json.dumps([1]))
+        self.assertIn(' loaded', repr(json))
+
+    def test_missing_module(self):
+        missing = lazy_module('fintec_missing_dependency.sub')
+        with self.assertRaises(ImportError) as context:
+            missing.anything
+        self.assertIn('pip install fintec_missing_dependency', str(context.exception))
@@ -0,0 +1,112 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import fintec as ft
+
+
+class TestSeriesStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.df1 = pd.DataFrame({'a': [1.0, 2.0, 3.0], 'b': [10.0, np.nan, 30.0]},
+                                index=pd.to_datetime(['2019-01-01', '2019-01-02', '2019-01-04']))
+        self.df2 = pd.DataFrame({'c': [200.0, 300.0]}, index=pd.to_datetime(['2019-01-03', '2019-01-02']))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_read(self):
+        store = ft.SeriesStore(self.tmp.name)
+        store.write(self.df1)
+        self.assertListEqual(['a', 'b'], store.columns)
+        self.assertEqual(3, len(store))
+        pd.testing.assert_frame_equal(self.df1, store.read(), check_names=False, check_freq=False)
+
+    def test_reopen_and_extend(self):
+        ft.SeriesStore(self.tmp.name).write(self.df1)
+        store = ft.SeriesStore(self.tmp.name)
+        store.write(self.df2)
+        self.assertListEqual(['a', 'b', 'c'], store.columns)
+        expected = ft.merge_frames([self.df1, self.df2])
+        pd.testing.assert_frame_equal(expected, ft.SeriesStore(self.tmp.name).read(), check_names=False)
+
+    def test_read_window(self):
+        store = ft.SeriesStore(self.tmp.name)
+        store.write(self.df1)
+        df = store.read(['b'], '2019-01-02', '2019-01-03')
+        self.assertListEqual(['b'], list(df.columns))
+        self.assertListEqual([pd.Timestamp('2019-01-02')], list(df.index))
+        self.assertEqual(2, len(store.tail(2)))
+        self.assertEqual(0, len(store.read(start='2020-01-01')))
+
+    def test_update_in_place(self):
+        store = ft.SeriesStore(self.tmp.name)
+        store.write(self.df1)
+        files = {column: os.path.join(self.tmp.name, store._columns[column][0]) for column in store.columns}
+        b = os.stat(files['b'])
+        inode = os.stat(files['a']).st_ino
+        # the stored row of 2019-01-04 is unchanged, only the new rows are appended in place
+        store.update(pd.DataFrame({'a': [3.0, 5.0, 6.0]}, index=pd.to_datetime(['2019-01-04', '2019-01-07',
+                                                                                   '2019-01-08'])))
+        self.assertEqual(inode, os.stat(files['a']).st_ino)
+        self.assertEqual(b.st_mtime_ns, os.stat(files['b']).st_mtime_ns)
+        # a changed row is written to a new file, an interrupted correction leaves the stored rows as they were
+        correction = pd.DataFrame({'a': [3.5]}, index=pd.to_datetime(['2019-01-04']))
+        with mock.patch('fintec.store.json.dump', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                store.update(correction)
+        self.assertEqual(3.0, ft.SeriesStore(self.tmp.name).read(['a'], '2019-01-04', '2019-01-04').iloc[0, 0])
+        store = ft.SeriesStore(self.tmp.name)
+        store.update(correction)
+        self.assertNotEqual(files['a'], os.path.join(self.tmp.name, store._columns['a'][0]))
+        self.assertFalse(os.path.exists(files['a']))
+        expected = pd.DataFrame({'a': [1.0, 2.0, 3.5, 5.0, 6.0], 'b': [10.0, np.nan, 30.0, np.nan, np.nan]},
+                                index=pd.to_datetime(['2019-01-01', '2019-01-02', '2019-01-04', '2019-01-07',
+                                                      '2019-01-08']))
+        pd.testing.assert_frame_equal(expected, store.read(), check_names=False, check_freq=False)
+        store = ft.SeriesStore(self.tmp.name)
+        pd.testing.assert_frame_equal(expected, store.read(), check_names=False, check_freq=False)
+        store.update(pd.DataFrame({'b': [40.0]}, index=pd.to_datetime(['2019-01-08'])))
+        np.testing.assert_array_equal([30.0, np.nan, 40.0], store.tail(3)['b'].to_numpy())
+        # a date before the last one that is not on the date axis
+        store.update(pd.DataFrame({'b': [20.0]}, index=pd.to_datetime(['2019-01-03'])))
+        df = ft.SeriesStore(self.tmp.name).read()
+        self.assertEqual(6, len(df))
+        self.assertListEqual([10.0, 20.0, 30.0, 40.0], df.b.dropna().tolist())
+        self.assertListEqual([1.0, 2.0, 3.5, 5.0, 6.0], df.a.dropna().tolist())
+        with self.assertRaises(ValueError):
+            store.update(pd.DataFrame({'x': [1.0]}, index=pd.to_datetime(['2019-01-09'])))
+
+    def test_interrupted_extend(self):
+        ft.SeriesStore(self.tmp.name).write(self.df1)
+        store = ft.SeriesStore(self.tmp.name)
+        with mock.patch('fintec.store.json.dump', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                store.write(self.df2)
+        store = ft.SeriesStore(self.tmp.name)
+        self.assertListEqual(['a', 'b'], store.columns)
+        pd.testing.assert_frame_equal(self.df1, store.read(), check_names=False, check_freq=False)
+        store.write(self.df2)
+        self.assertEqual(4, len(ft.SeriesStore(self.tmp.name).read()))
+        self.assertEqual(5, len(os.listdir(self.tmp.name)))
+
+    def test_short_series(self):
+        ft.SeriesStore(self.tmp.name).write(self.df1)
+        with open(os.path.join(self.tmp.name, 'columns.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+        files = {entry[0]: entry[1] for entry in manifest['columns']}
+        np.save(os.path.join(self.tmp.name, files['b']), np.array([1.0]))
+        store = ft.SeriesStore(self.tmp.name)
+        with self.assertLogs('fintec.store', 'WARNING'):
+            df = store.read()
+        self.assertEqual(3, df.b.isna().sum())
+        self.assertListEqual(['a'], store.columns)
+        self.assertEqual(3, len(store.read()))
@@ -1,9 +1,14 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
 import logging
+import os
+import queue
+import tempfile
+import threading
 
 import fintec as ft
 import unittest
+import numpy as np
 import pandas as pd
 
 _log = logging.getLogger(__name__)
@@ -39,6 +44,172 @@ class TestStyling(unittest.TestCase):
         self.assertTrue('>2019-02-10</th>' in rendered)
         self.assertTrue('>1</td>' in rendered)
 
+    def test_vectorized_matches_per_cell(self):
+        values = np.random.default_rng(7).standard_normal((30, 3)) * 1e5
+        values[::4, 1] = np.nan
+        values[2] = [-0.0, -0.001, 1e-7]
+        values[3] = [0.125, 2.675, -999.995]
+        values[4] = [1234567.891, -1e12, 0.5]
+        df = pd.DataFrame(values, index=pd.date_range('2019-01-01', periods=30), columns=['A', 'B', 'C'])
+        for styler, func, decimals in ((ft.currency, ft.c_format, 0), (ft.currency, ft.c_format, 2),
+                                       (ft.percentage, ft.p_format, 2)):
+            dfs = styler(df, decimals, vectorized=True)
+            expected = [[func(v, decimals) for v in row] for row in values]
+            self.assertListEqual(expected, dfs.data.values.tolist())
+            self.assertListEqual(list(df.index.strftime('%Y-%m-%d')), list(dfs.data.index))
+        classes = ft.styling._css_classes(values, highlight_max=True)
+        colors = {'color: grey': 'nan', 'color: red': 'neg', 'color: blue': 'pos'}
+        for r, row in enumerate(values):
+            for c, v in enumerate(row):
+                self.assertTrue(classes[r, c].startswith(colors[ft.color_negative_red(v)]))
+                self.assertEqual(v == np.nanmax(row), classes[r, c].endswith(' max'))
+
+    def test_chained_styler(self):
+        df = pd.DataFrame(index=pd.to_datetime(['2019/02/10', '2019/02/11']), data={'A': [1.2, -3.4]})
+        for styler in (ft.currency, ft.percentage):
+            dfs = styler(df)
+            self.assertListEqual([1.2, -3.4], dfs.data.A.tolist())
+            self.assertIn('linear-gradient', dfs.bar(subset=['A']).to_html())
+        self.assertListEqual(['---'], ft.styling._format_column(pd.Series([np.nan]), '{:,.2f}').tolist())
+
+    def test_percentage(self):
+        df = pd.DataFrame(index=pd.to_datetime(['2019/02/10', '2019/02/11']),
+                          data={'A': [0.012, -0.5], 'B': [0.02, None]})
+        for vectorized in (True, False):
+            rendered = ft.percentage(df, vectorized=vectorized).render()
+            self.assertTrue('>2019-02-11</th>' in rendered)
+            self.assertTrue('>1,20%</td>' in rendered)
+            self.assertTrue('>-50,00%</td>' in rendered)
+            self.assertTrue('>---</td>' in rendered)
+
+    def test_display_paged(self):
+        df = pd.DataFrame({'A': np.arange(1000.0)}, index=pd.date_range('2019-01-01', periods=1000))
+        styled = []
+
+        def styler(dfp, decimals):
+            styled.append((len(dfp), dfp.A.iloc[0], decimals))
+            return ft.currency(dfp, decimals)
+
+        ui = ft.display_paged(df, styler, page_size=100, start=-100, decimals=1)
+        b_first, b_previous, ia_start, b_next, b_last, label = ui.children[0].children
+        self.assertEqual((100, 900.0, 1), styled[-1])
+        self.assertEqual('rows 901-1,000 of 1,000', label.value)
+        b_previous.click()
+        self.assertEqual((100, 800.0, 1), styled[-1])
+        b_first.click()
+        b_previous.click()
+        self.assertEqual(0, ia_start.value)
+        ia_start.value = 250
+        self.assertEqual((100, 250.0, 1), styled[-1])
+        b_last.click()
+        b_next.click()
+        self.assertEqual(900, ia_start.value)
+        self.assertEqual(5, len(styled))
+
+        ui = ft.display_paged(df.head(10), page_size=100)
+        self.assertEqual('rows 1-10 of 10', ui.children[0].children[-1].value)
+
     def test_start_file_logging(self):
         ft.start_file_logging('../../logs/fintec.log')
         _log.debug('A new line')
+
+    def test_background_file_logging(self):
+        ft.end_file_logging()
+        with tempfile.TemporaryDirectory() as tmp:
+            log_file = os.path.join(tmp, 'fintec.log')
+            ft.start_file_logging(log_file, level=logging.INFO, background=True, queue_size=2)
+
+            def log_lines(n):
+                for i in range(100):
+                    _log.info('line {} {}'.format(n, i))
+                    _log.debug('not logged')
+
+            threads = [threading.Thread(target=log_lines, args=(n,)) for n in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            ft.end_file_logging()
+            names = ['date', 'thread', 'process', 'level', 'file', 'line', 'function', 'msg', 'path']
+            df = pd.read_csv(log_file, header=None, quoting=1, names=names)
+            lines = df.msg[df.msg.str.startswith('line')]
+            self.assertEqual(400, len(lines))
+            self.assertEqual(400, len(lines.unique()))
+            self.assertSetEqual({'INFO'}, set(df.level))
+
+    def test_background_file_logging_same_lines(self):
+        names = ['date', 'thread', 'process', 'level', 'file', 'line', 'function', 'msg', 'path']
+        frames = []
+        for background in (False, True):
+            ft.end_file_logging()
+            with tempfile.TemporaryDirectory() as tmp:
+                log_file = os.path.join(tmp, 'fintec.log')
+                ft.start_file_logging(log_file, level=logging.INFO, background=background)
+                _log.info('args %s and %d', 'text', 2)
+                try:
+                    raise ValueError('failed')
+                except ValueError:
+                    _log.exception('exception %s', 'raised')
+                ft.end_file_logging()
+                frames.append(pd.read_csv(log_file, header=None, quoting=1, names=names))
+        columns = ['process', 'level', 'file', 'function', 'msg', 'path']
+        pd.testing.assert_frame_equal(frames[0][columns][1:3], frames[1][columns][1:3])
+        self.assertListEqual(['args %s and %d', 'exception %s'], list(frames[1].msg[1:3]))
+
+    def test_bounded_queue_handler(self):
+        handler = ft.styling.BoundedQueueHandler(queue.Queue(2), block=False)
+        for i in range(5):
+            handler.handle(logging.makeLogRecord({'msg': 'record %s', 'args': (i,)}))
+        self.assertEqual(3, handler.dropped)
+        record = handler.queue.get()
+        self.assertEqual('record %s', record.msg)
+        self.assertEqual('record 0', record.getMessage())
+        with self.assertRaises(ValueError):
+            ft.start_file_logging(overflow='wait')
+
+    def test_csv_formatter_threads(self):
+        formatter = ft.styling.CsvFormatter()
+        lines = []
+
+        def format_records(n):
+            for i in range(200):
+                lines.append(formatter.format(logging.makeLogRecord({'msg': 'thread {} record {}'.format(n, i)})))
+
+        threads = [threading.Thread(target=format_records, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(800, len(lines))
+        self.assertTrue(all(line.count('\n') == 0 and line.count('"thread ') == 1 for line in lines))
+
+    def test_read_log(self):
+        ft.end_file_logging()
+        with tempfile.TemporaryDirectory() as tmp:
+            log_file = os.path.join(tmp, 'fintec.log')
+            ft.start_file_logging(log_file, max_bytes=20000, backup_count=10)
+            for i in range(300):
+                (_log.warning if i % 3 == 0 else _log.info)('record "{}", of 300'.format(i))
+            ft.end_file_logging()
+            files = ft.log_files(log_file)
+            self.assertGreater(len(files), 2)
+            self.assertEqual(log_file, files[-1])
+            self.assertTrue(files[0].endswith('.{}'.format(len(files) - 1)))
+
+            df = ft.read_log(log_file, chunksize=50)
+            self.assertListEqual(ft.LOG_COLUMNS, list(df.columns))
+            self.assertEqual('datetime64[ns]', str(df.date.dtype))
+            self.assertEqual('category', str(df.level.dtype))
+            records = df.msg[df.msg.str.startswith('record')]
+            self.assertListEqual(['record "{}", of 300'.format(i) for i in range(300)], list(records))
+            self.assertTrue(df.date.is_monotonic_increasing)
+
+            self.assertEqual(100, len(ft.read_log(log_file, level='WARNING')))
+            self.assertEqual(100, len(ft.read_log(log_file, level=logging.WARNING, chunksize=7)))
+            middle = df.date[records.index[150]]
+            self.assertEqual(df.date.ge(middle).sum(), len(ft.read_log(log_file, start=middle)))
+            after = ft.read_log(log_file, end=middle, chunksize=10)
+            self.assertEqual(df.date.le(middle).sum(), len(after))
+            self.assertEqual(0, len(ft.read_log(os.path.join(tmp, 'missing', 'fintec.log'))))
+            with self.assertRaises(ValueError):
+                ft.read_log(log_file, level='LOUD')
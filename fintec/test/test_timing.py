@@ -0,0 +1,74 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import unittest
+import warnings
+from unittest import mock
+
+import fintec as ft
+
+
+class TestTiming(unittest.TestCase):
+
+    def setUp(self):
+        warnings.filterwarnings('ignore', category=PendingDeprecationWarning)
+        warnings.filterwarnings('ignore', category=ImportWarning)
+        ft.reset_timings()
+
+    def tearDown(self):
+        ft.disable_timing()
+        ft.reset_timings()
+
+    def test_timed(self):
+        @ft.timed('squares', nbytes=lambda n: 8 * n)
+        def squares(n):
+            return [i * i for i in range(n)]
+
+        squares(10)
+        self.assertEqual(0, len(ft.timings()))
+        ft.enable_timing()
+        squares(10)
+        squares(5)
+        df = ft.timings()
+        self.assertListEqual(['calls', 'seconds', 'mean', 'rows', 'bytes'], list(df.columns))
+        self.assertEqual(2, df.calls['squares'])
+        self.assertEqual(15, df.rows['squares'])
+        self.assertEqual(120, df.bytes['squares'])
+        self.assertAlmostEqual(df.seconds['squares'] / 2, df['mean']['squares'])
+
+    def test_timer(self):
+        ft.enable_timing()
+        with ft.timer('block') as t:
+            t.rows = 3
+        with self.assertRaises(KeyError):
+            with ft.timer('failing'):
+                raise KeyError('x')
+        df = ft.timings()
+        self.assertListEqual(['block'], list(df.index))
+        self.assertEqual(3, df.rows['block'])
+
+    def test_log(self):
+        ft.enable_timing(log=True)
+        with self.assertLogs('fintec.timing', level='DEBUG') as logs:
+            with ft.timer('logged'):
+                pass
+        self.assertIn('logged seconds=', logs.output[0])
+
+    @mock.patch.dict(os.environ, {ft.U_FIN_CACHE: '0'})
+    def test_data_and_calc(self):
+        ft.enable_timing()
+        filename = os.path.join('data', 'indices', 'aex.csv')
+        ft.data._read_date_indexed_data(filename, cache=False)
+        vf = ft.ValueFrame(ft.df_indices([ft.Idx.AEX, ft.Idx.DOW]))
+        vf.rel_change('2019-01-10')
+        df = ft.timings()
+        # without the cache df_indices reads both csv files as well
+        self.assertEqual(3, df.calls['fintec.data._read_data'])
+        self.assertEqual(2 * os.path.getsize(filename) + os.path.getsize(os.path.join('data', 'indices', 'dow.csv')),
+                         df.bytes['fintec.data._read_data'])
+        self.assertNotIn('fintec.data._window', df.index)
+        self.assertEqual(3, df.calls['fintec.data._read_date_indexed_data'])
+        for name in ('fintec.data.df_indices', 'fintec.calc.ValueFrame.merge', 'fintec.calc.ValueFrame.slice',
+                     'fintec.calc.ValueFrame.rel_change'):
+            self.assertEqual(1, df.calls[name])
+        self.assertEqual(len(vf.rel_change('2019-01-10')), df.rows['fintec.calc.ValueFrame.slice'])
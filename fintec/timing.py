@@ -0,0 +1,136 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" Opt-in timing of fintec functions into an in-process registry. """
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+import pandas as pd
+
+__all__ = ['timed', 'timer', 'enable_timing', 'disable_timing', 'timings', 'reset_timings']
+
+_log = logging.getLogger(__name__)
+_ENABLED = False
+_LOG_CALLS = False
+_LOCK = threading.Lock()
+_REGISTRY = {}
+_COLUMNS = ['calls', 'seconds', 'rows', 'bytes']
+
+
+def enable_timing(log: bool = False) -> None:
+    """
+    Start recording the timed functions. With log=True every call is also logged on debug level by the logger
+    'fintec.timing', so it ends up in the csv file log of `start_file_logging`.
+    :param log: log every call
+    :return: None
+    """
+    global _ENABLED, _LOG_CALLS
+    _ENABLED, _LOG_CALLS = True, log
+
+
+def disable_timing() -> None:
+    """
+    Stop recording the timed functions. The registry is kept, see `reset_timings`.
+    :return: None
+    """
+    global _ENABLED, _LOG_CALLS
+    _ENABLED, _LOG_CALLS = False, False
+
+
+def reset_timings() -> None:
+    """
+    Empty the registry.
+    :return: None
+    """
+    with _LOCK:
+        _REGISTRY.clear()
+
+
+def _record(name: str, seconds: float, rows: int = None, nbytes: int = None) -> None:
+    with _LOCK:
+        entry = _REGISTRY.setdefault(name, [0, 0.0, 0, 0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] += rows or 0
+        entry[3] += nbytes or 0
+    if _LOG_CALLS:
+        _log.debug('{} seconds={:.6f} rows={} bytes={}'.format(name, seconds, rows, nbytes))
+
+
+def timings() -> pd.DataFrame:
+    """
+    The registry as a DataFrame, slowest first.
+    :return: DataFrame with index 'name' and columns 'calls', 'seconds', 'mean', 'rows' and 'bytes'
+    """
+    with _LOCK:
+        records = {name: list(entry) for name, entry in _REGISTRY.items()}
+    df = pd.DataFrame.from_dict(records, orient='index', columns=_COLUMNS)
+    df.index.name = 'name'
+    df.insert(2, 'mean', df.seconds / df.calls)
+    return df.sort_values('seconds', ascending=False)
+
+
+class _Timer(object):
+    """ Rows and bytes of a `timer` block, set by the code inside the block. """
+
+    def __init__(self) -> None:
+        self.rows = None
+        self.bytes = None
+
+
+@contextmanager
+def timer(name: str):
+    """
+    Time a block of code under name, when timing is enabled. A block that raises is not recorded.
+    The block can set rows and bytes:
+    ```
+    with timer('load prices') as t:
+        df = pd.read_csv(filename)
+        t.rows = len(df)
+    ```
+    :param name: name in the registry
+    :return: context manager
+    """
+    t = _Timer()
+    if not _ENABLED:
+        yield t
+        return
+    t0 = time.perf_counter()
+    yield t
+    _record(name, time.perf_counter() - t0, t.rows, t.bytes)
+
+
+def _length(result) -> int:
+    return len(result) if hasattr(result, '__len__') else None
+
+
+def timed(name: str = None, rows: Callable = _length, nbytes: Callable = None):
+    """
+    Decorator that times every call of a function, when timing is enabled. When disabled the cost is one
+    check of a flag. Calls that raise are not recorded.
+    :param name: name in the registry, default the qualified name of the function
+    :param rows: function of the return value that gives the rows processed, default its length
+    :param nbytes: function of the arguments of the call that gives the bytes read, default None
+    :return: decorator
+    """
+    def decorator(func):
+        key = name or '{}.{}'.format(func.__module__, func.__qualname__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _ENABLED:
+                return func(*args, **kwargs)
+            t0 = time.perf_counter()
+            result = func(*args, **kwargs)
+            seconds = time.perf_counter() - t0
+            _record(key, seconds, None if rows is None else rows(result),
+                    None if nbytes is None else nbytes(*args, **kwargs))
+            return result
+
+        return wrapper
+
+    return decorator